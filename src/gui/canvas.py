@@ -1,129 +1,493 @@
-from PyQt6.QtWidgets import QWidget
-from PyQt6.QtCore import Qt, QPoint, QSize
-from PyQt6.QtGui import QPainter, QImage, QPen, QColor
-from utils.history_manager import HistoryManager
+from PyQt6.QtWidgets import QWidget, QApplication
+from PyQt6.QtCore import Qt, QPoint, QSize, QRect, QEvent, pyqtSignal
+from PyQt6.QtGui import QPainter, QImage, QPen, QColor, QPixmap
+from utils.history_manager import HistoryManager, RegionPatch, ImageOperation
+from utils.image_ops import resize_canvas, to_canvas_format, to_document_format
+from utils.pixel_format import PIXEL_FORMATS, pixel_format, painting, is_document_format
+from utils.image_loader import ImageLoadThread, decode
+from utils.dirty_region import DirtyRegion
+from utils.render_worker import RenderWorker, StrokeSegment, StrokeFinish
+from utils.quality import QualityPolicy
+from utils.motion_predictor import MotionPredictor
+from utils.perf import measure
+from utils.document_memory import SuspendedDocument
+from utils.raw_io import is_raw_file, open_raw, save_raw
+from utils.image_array import image_view
+from utils.idle_scheduler import IdleScheduler, HIGH, LOW
+from tools.brush import BrushTool
 from tools.line import LineTool
+from tools.selection import SelectionTool
+from tools.gradient import GradientTool
+from tools.text import TextTool
+import copy
+import os
+import threading
+import time
+import numpy as np
 import logging
 
 logger = logging.getLogger(__name__)
 
 logger = logging.getLogger(__name__)
 
+# Автосохранение - не раньше чем через столько секунд после первой несохраненной правки
+AUTOSAVE_DELAY = 30.0
+
 class Canvas(QWidget):
+    # Изменена область: прямоугольник и его содержимое до изменения
+    region_changed = pyqtSignal(QRect, QImage)
+    # Изображение заменено целиком (загрузка, размер, отмена снимка)
+    image_reset = pyqtSignal()
+
     def __init__(self):
         super().__init__()
         self.color = QColor(Qt.GlobalColor.black)
         self.brush_size = 3
         self.history = HistoryManager()
         self.current_tool = None  # Добавляем инструмент прямо в Canvas
+        self.clipboard_image = None  # Последний скопированный фрагмент
+        self.dirty = DirtyRegion()  # Область, измененная текущим штрихом
+        self.stroke_points = []  # Точки текущего штриха
+        self.quality = QualityPolicy()
+        # Предсказанный кончик штриха: (последняя точка, ожидаемая точка)
+        self.predictor = MotionPredictor()
+        self.prediction = None
+        self.suspended = None  # Упакованный документ (вкладка неактивна)
+        self.diff = None       # Результат сравнения с другим изображением (наложение)
+        # Копирование плиток истории, их объединение, обновление панелей
+        # и автосохранение выполняются порциями между событиями ввода
+        self.idle = IdleScheduler(self)
+        self.autosave_path = None  # Файл автосохранения (.npy), None - отключено
+        self.autosave_thread = None
+        self.load_thread = None
+        # Наложение сравнения относится к прежней геометрии изображения
+        self.image_reset.connect(lambda: self.show_diff(None))
         self.initUI()
         
     def initUI(self):
         """Инициализация холста"""
         size = QSize(800, 600)  # Начальный размер холста
-        self.image = QImage(size, QImage.Format.Format_RGB32)
-        self.image.fill(Qt.GlobalColor.white)
+        image = QImage(size, QImage.Format.Format_RGB32)
+        image.fill(Qt.GlobalColor.white)
+        
+        # Рабочим изображением владеет поток растеризации, а холст
+        # показывает копию в формате экрана (QPixmap), обновляемую по готовым областям
+        self.renderer = RenderWorker(image)
+        self.renderer.regions_ready.connect(self.on_regions_ready)
+        self.backing = QPixmap.fromImage(image)
         self.setFixedSize(size)
         self.drawing = False
         self.lastPoint = QPoint()
-        self.history.push_state(self.image)
+        self.save_state()
         self.setFocusPolicy(Qt.FocusPolicy.StrongFocus)
         logger.info(f"Холст инициализирован с размером {size}")
 
+    @property
+    def image(self):
+        """Рабочее изображение. Перед доступом дожидаемся завершения растеризации"""
+        self.renderer.sync()
+        return self.renderer.image
+
+    @image.setter
+    def image(self, image):
+        self.flush_pending()
+        self.renderer.sync()
+        self.renderer.image = image
+        self.renderer.discard_published()
+        with measure("canvas.backing_rebuild"):
+            self.backing = QPixmap.fromImage(image)
+
+    def on_regions_ready(self):
+        """
+        Перенести готовые области рабочего изображения на экранную копию.
+        Преобразование в формат экрана выполняется здесь один раз на область,
+        а не при каждой перерисовке
+        """
+        regions = self.renderer.take_published()
+        if not regions:
+            return
+        with measure("canvas.backing_upload"):
+            painter = QPainter(self.backing)
+            painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_Source)
+            for rect, region in regions:
+                painter.drawImage(rect.topLeft(), region)
+                self.update(rect)
+            painter.end()
+
+    def refresh_display(self, rect):
+        """Сразу показать область, измененную в потоке интерфейса"""
+        self.renderer.publish(rect)
+        self.on_regions_ready()
+
+    def memory_bytes(self) -> int:
+        """Память пикселей документа: изображение, экранная копия и история"""
+        if self.suspended is not None:
+            return self.suspended.nbytes()
+        image = self.renderer.image
+        return image.sizeInBytes() * 2 + self.history.memory_bytes()
+
+    def is_suspended(self) -> bool:
+        return self.suspended is not None
+
+    def suspend(self):
+        """Упаковать изображение и историю неактивного документа"""
+        if self.suspended is not None:
+            return
+        self.commit_selection()
+        self.flush_pending()
+        self.idle.cancel()
+        self.suspended = SuspendedDocument(self.image, self.history)
+        self.history.undo_stack = []
+        self.history.redo_stack = []
+        placeholder = QImage(1, 1, QImage.Format.Format_RGB32)
+        placeholder.fill(Qt.GlobalColor.white)
+        self.renderer.image = placeholder
+        self.backing = QPixmap()
+
+    def resume(self):
+        """Распаковать документ перед активацией"""
+        if self.suspended is None:
+            return
+        suspended, self.suspended = self.suspended, None
+        self.image = suspended.restore(self.history)
+        self.idle.schedule("compact", self.compact_history, LOW)
+        self.update()
+
+    def shutdown(self):
+        """Остановить поток растеризации"""
+        self.renderer.stop()
+
     def change_size(self, width, height):
         """
         Изменить размер холста
         """
-        # Копируем текущую историю
-        old_states = self.history.undo_stack.copy()
-        
-        # Создаем новые состояния с новым размером
-        new_states = []
-        for old_image in old_states:
-            new_image = QImage(QSize(width, height), QImage.Format.Format_RGB32)
-            new_image.fill(Qt.GlobalColor.white)
-            painter = QPainter(new_image)
-            painter.drawImage(0, 0, old_image)
-            painter.end()
-            new_states.append(new_image)
+        self.commit_selection()
         
         # Обновляем размер текущего изображения
-        new_image = QImage(QSize(width, height), QImage.Format.Format_RGB32)
-        new_image.fill(Qt.GlobalColor.white)
-        painter = QPainter(new_image)
-        painter.drawImage(0, 0, self.image)
-        painter.end()
-        self.image = new_image
+        self.image = resize_canvas(self.image, width, height)
         
         # Обновляем виджет
         self.setFixedSize(width, height)
         
         # Обновляем историю с новыми размерами
-        self.history.undo_stack = new_states
-        self.history.redo_stack.clear()
+        self.history.resize_states(width, height)
+        self.idle.schedule("compact", self.compact_history, LOW)
         self.update()
+        self.image_reset.emit()
         
         logger.debug(f"Изменен размер холста на {width}x{height}")
 
+    def set_image(self, image, keep_format=True):
+        """
+        Заменить изображение целиком (например, после масштабирования).
+        keep_format - привести новое изображение к формату пикселей документа.
+        Замена записывается в историю одним шагом
+        """
+        if keep_format:
+            current = self.image
+            image = to_document_format(image, current.format(), current.colorTable())
+        self.image = image
+        self.setFixedSize(image.size())
+        self.save_state()
+        self.update()
+        self.image_reset.emit()
+        logger.debug(f"Изображение заменено, размер {image.width()}x{image.height()}")
+
+    @property
+    def pixel_format(self) -> str:
+        """Формат пикселей документа: rgb32, gray8 или indexed8"""
+        return pixel_format(self.renderer.image)
+
+    def set_pixel_format(self, name, color_table=None):
+        """
+        Перевести документ в другой формат пикселей одним шагом истории.
+        Для палитры без color_table она строится по изображению
+        """
+        self.commit_selection()
+        self.flush_pending()
+        image = to_document_format(self.image, PIXEL_FORMATS[name][0], color_table)
+        self.set_image(image, keep_format=False)
+        logger.info(f"Формат пикселей документа: {name}")
+
+    def transform(self, name):
+        """
+        Отразить, повернуть или инвертировать изображение.
+        В историю записывается только имя преобразования
+        """
+        self.commit_selection()
+        self.flush_pending()
+        operation = ImageOperation(name)
+        image = operation.apply(self.image)
+        self.image = image
+        self.setFixedSize(image.size())
+        self.history.push_operation(operation)
+        self.history_changed()
+        self.update()
+        self.image_reset.emit()
+        logger.debug(f"Выполнено преобразование {name}")
+
     def paintEvent(self, event):
         """Обработчик события перерисовки"""
-        painter = QPainter(self)
-        painter.drawImage(0, 0, self.image)
+        with measure("canvas.paint"):
+            painter = QPainter(self)
+            rect = event.rect()
+            painter.drawPixmap(rect, self.backing, rect)
+            if self.diff is not None:
+                # Палитровая маска переводится в цвет только для видимой области
+                painter.drawImage(rect, self.diff.overlay(), rect)
+                painter.setPen(QPen(QColor(Qt.GlobalColor.red), 1, Qt.PenStyle.DashLine))
+                for box in self.diff.boxes:
+                    if box.intersects(rect):
+                        painter.drawRect(box.adjusted(-1, -1, 0, 0))
+            if self.current_tool:
+                self.current_tool.paint_overlay(painter)
+            if self.prediction is not None:
+                # Временный кончик штриха, заменяется настоящими точками
+                painter.setPen(self.current_tool.make_pen(painter))
+                painter.drawLine(*self.prediction)
+            painter.end()
     
     def mousePressEvent(self, event):
         """Обработчик нажатия кнопки мыши"""
         if event.button() == Qt.MouseButton.LeftButton:
+            # Отложенная работа по прошлому штриху должна видеть изображение до этого
+            self.flush_pending()
             self.drawing = True
             self.lastPoint = event.pos()
+            if isinstance(self.current_tool, SelectionTool):
+                self.current_tool.press(self, event.pos())
+                self.update()
+                return
+            if isinstance(self.current_tool, GradientTool):
+                self.current_tool.color = self.color
+                self.update(self.current_tool.press(self, event.pos()))
+                return
+            if isinstance(self.current_tool, TextTool):
+                self.current_tool.set_color(self.color)
+                self.update(self.current_tool.press(self, event.pos()))
+                self.setFocus()
+                return
             if isinstance(self.current_tool, LineTool):
-                self.temp_image = self.image.copy()  # Сохраняем копию для предпросмотра
+                self.current_tool.start_point = event.pos()  # Линия начинается в точке нажатия
+            if self.current_tool:
+                # Крупные кисти и большие холсты при движении рисуются упрощенно
+                self.current_tool.fast = self.quality.fast_preview(self.brush_size, self.size())
+                self.current_tool.smooth = self.quality.smooth_strokes
+            self.stroke_points = [event.pos()]
+            self.predictor.reset()
+            self.predictor.add(event.pos(), time.perf_counter())
             logger.debug(f"Нажатие мыши в позиции {event.pos()}")
     
     def mouseMoveEvent(self, event):
         """Обработчик движения мыши"""
         if event.buttons() & Qt.MouseButton.LeftButton and self.drawing:
-            if isinstance(self.current_tool, LineTool):
-                # Для линии - рисуем временное изображение
-                self.image = self.temp_image.copy()
+            if isinstance(self.current_tool, SelectionTool):
+                # Перерисовывается только область выделения, изображение не меняется
+                self.update(self.current_tool.move(self, event.pos()))
+                return
+            if isinstance(self.current_tool, GradientTool):
+                # Пересчитывается только уменьшенный предпросмотр
+                self.update(self.current_tool.move(self, event.pos()))
+                return
+            if isinstance(self.current_tool, TextTool):
+                self.update(self.current_tool.move(self, event.pos()))
+                return
             
-            painter = QPainter(self.image)
             if self.current_tool:
                 self.current_tool.size = self.brush_size
                 self.current_tool.color = self.color
-                self.current_tool.draw(self, event.pos(), painter)
-            painter.end()
+                # Рисование выполняет поток растеризации, здесь только команда.
+                # Предпросмотр линии перерисовывается от исходного состояния
+                self.renderer.submit(StrokeSegment(
+                    copy.copy(self.current_tool), self.lastPoint, event.pos(), self.size(),
+                    self.dirty, preview=isinstance(self.current_tool, LineTool)
+                ))
             
             self.lastPoint = event.pos()
-            self.update()
+            self.stroke_points.append(event.pos())
+            self.predictor.add(event.pos(), time.perf_counter())
+            if self.quality.predict_strokes and isinstance(self.current_tool, BrushTool):
+                self.show_prediction(self.predictor.predict())
             logger.debug(f"Рисование до позиции {event.pos()}")
     
     def mouseReleaseEvent(self, event):
         """Обработчик отпускания кнопки мыши"""
         if event.button() == Qt.MouseButton.LeftButton:
             self.drawing = False
+            self.show_prediction(None)
+            
+            if isinstance(self.current_tool, SelectionTool):
+                self.current_tool.release(self, event.pos())
+                return
+            if isinstance(self.current_tool, (GradientTool, TextTool)):
+                self.current_tool.release(self, event.pos())
+                return
+            
+            tool = self.current_tool
+            if tool and tool.fast and len(self.stroke_points) > 1:
+                # Перерисовываем штрих в полном качестве
+                final = copy.copy(tool)
+                final.fast = False
+                self.renderer.submit(StrokeFinish(final, self.stroke_points, self.size(), self.dirty))
+            self.stroke_points = []
             
             if isinstance(self.current_tool, LineTool):
                 self.current_tool.start_point = None  # Сбрасываем начальную точку
                 
-            self.history.push_state(self.image)
+            # Область штриха известна только после окончания растеризации.
+            # Плитки снимка копируются в простое, до следующей правки
+            self.renderer.sync()
+            self.save_state(self.dirty.rect, deferred=True)
+            self.finish_stroke()
             logger.debug("Кнопка мыши отпущена")
 
+    def show_diff(self, result):
+        """Показать отличия от другого изображения (None - убрать наложение)"""
+        self.diff = result
+        self.update()
+
+    def show_prediction(self, point):
+        """Заменить предсказанный кончик штриха (None - убрать)"""
+        old = self.prediction
+        self.prediction = (QPoint(self.lastPoint), point) if point is not None else None
+        segments = [segment for segment in (old, self.prediction) if segment is not None]
+        if not segments:
+            return
+        # Кончик рисуется пером инструмента, поэтому и запас берется у него
+        margin = self.current_tool.pen_margin()
+        for segment in segments:
+            self.update(QRect(*segment).normalized().adjusted(-margin, -margin, margin, margin))
+
+    def save_state(self, changed=None, deferred=False):
+        """
+        Записать текущее изображение в историю полным снимком.
+        deferred - скопировать плитки снимка в простое
+        """
+        self.history.push_state(self.image, changed, deferred)
+        if deferred:
+            self.idle.schedule("history", self.finalize_history, HIGH)
+        self.history_changed()
+
+    def history_changed(self):
+        """Запланировать фоновую работу после нового шага истории"""
+        self.idle.schedule("compact", self.compact_history, LOW)
+        if self.autosave_path and not self.idle.is_pending("autosave"):
+            self.idle.schedule("autosave", self.autosave, LOW, delay=AUTOSAVE_DELAY)
+
+    def flush_pending(self):
+        """Завершить отложенную работу, зависящую от текущего изображения (перед правкой)"""
+        self.idle.finish(priority=HIGH)
+
+    @staticmethod
+    def time_left(deadline):
+        return max(0.0, deadline - time.perf_counter()) if deadline is not None else None
+
+    def finalize_history(self, deadline=None) -> bool:
+        """Порция копирования плиток отложенных снимков"""
+        return self.history.finalize(self.time_left(deadline))
+
+    def compact_history(self, deadline=None) -> bool:
+        """Порция объединения плиток истории"""
+        return self.history.compact(self.time_left(deadline))
+
+    def autosave(self, deadline=None) -> bool:
+        """
+        Записать изображение в файл автосохранения (без сжатия - быстро).
+        Файл пишется в фоновом потоке из неявно разделяемой копии изображения,
+        поэтому порция простоя не ждет диска. Без deadline - дождаться записи
+        """
+        if self.autosave_thread is not None and self.autosave_thread.is_alive():
+            if deadline is not None:
+                # Прошлая запись еще идет - повторим позже
+                self.idle.schedule("autosave", self.autosave, LOW, delay=1.0)
+                return False
+            self.autosave_thread.join()
+        self.autosave_thread = threading.Thread(target=self.write_autosave, args=(QImage(self.image), self.autosave_path),
+                                                name="autosave", daemon=True)
+        self.autosave_thread.start()
+        if deadline is None:
+            self.autosave_thread.join()
+        return False
+
+    @staticmethod
+    def write_autosave(image, path):
+        """Запись файла автосохранения (в потоке автосохранения)"""
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temporary = path + ".tmp.npy"
+            with measure("canvas.autosave"):
+                save_raw(image, temporary)
+            os.replace(temporary, path)
+            logger.debug(f"Автосохранение: {path}")
+        except OSError as e:
+            logger.error(f"Ошибка автосохранения: {str(e)}")
+
+    def discard_autosave(self):
+        """Удалить файл автосохранения (документ закрыт)"""
+        self.idle.cancel("autosave")
+        if self.autosave_thread is not None:
+            self.autosave_thread.join()
+        if self.autosave_path and os.path.exists(self.autosave_path):
+            os.remove(self.autosave_path)
+
+    def finish_stroke(self):
+        """Сообщить об области, измененной штрихом"""
+        if not self.dirty.is_empty() and self.receivers(self.region_changed) > 0:
+            self.region_changed.emit(QRect(self.dirty.rect), self.dirty.before_image(self.image))
+        self.dirty.reset()
+
     def undo(self):
         """Отмена последнего действия"""
-        new_state = self.history.undo()
+        self.commit_selection()
+        self.flush_pending()
+        entry = self.history.undo_stack[-1]
+        new_state = self.history.undo(self.image)
         if new_state:
-            self.image = new_state
-            self.update()
+            self.restore_state(new_state, entry, reverted=True)
             logger.debug("Отмена действия применена")
     
     def redo(self):
         """Повтор отмененного действия"""
-        new_state = self.history.redo()
+        self.commit_selection()
+        self.flush_pending()
+        entry = self.history.redo_stack[-1] if self.history.can_redo() else None
+        new_state = self.history.redo(self.image)
         if new_state:
-            self.image = new_state
-            self.update()
+            self.restore_state(new_state, entry, reverted=False)
             logger.debug("Повтор действия применен")
 
+    def restore_state(self, image, entry, reverted):
+        """Показать состояние, полученное отменой или повтором шага entry"""
+        if isinstance(entry, RegionPatch):
+            # Изменение областей отменено прямо в self.image
+            bounds = entry.bounding_rect()
+            before = entry.content_after(image) if reverted else entry.content_before(image)
+            self.refresh_display(bounds)
+            self.region_changed.emit(bounds, before)
+            return
+        self.image = image
+        self.setFixedSize(image.size())
+        self.update()
+        self.image_reset.emit()
+
+    def event(self, event):
+        # Пока набирается текст, буквы - это ввод, а не сочетания клавиш окна
+        if event.type() == QEvent.Type.ShortcutOverride and self.is_typing(event):
+            event.accept()
+            return True
+        return super().event(event)
+
+    def is_typing(self, event) -> bool:
+        """Клавиша относится к набору текста"""
+        tool = self.current_tool
+        if not isinstance(tool, TextTool) or not tool.editing:
+            return False
+        if event.modifiers() & (Qt.KeyboardModifier.ControlModifier | Qt.KeyboardModifier.AltModifier):
+            return False
+        return bool(event.text()) or event.key() in (Qt.Key.Key_Backspace, Qt.Key.Key_Delete)
+
     def keyPressEvent(self, event):
         """Обработка нажатий клавиш"""
         if event.key() == Qt.Key.Key_Z and event.modifiers() == Qt.KeyboardModifier.ControlModifier:
@@ -138,31 +502,286 @@ class Canvas(QWidget):
             self.redo()
             event.accept()
             return
+        elif isinstance(self.current_tool, SelectionTool):
+            if event.key() in (Qt.Key.Key_Return, Qt.Key.Key_Enter):
+                self.commit_selection()
+                event.accept()
+                return
+            elif event.key() == Qt.Key.Key_Escape:
+                self.cancel_selection()
+                event.accept()
+                return
+        elif isinstance(self.current_tool, TextTool) and self.current_tool.editing:
+            tool = self.current_tool
+            control = event.modifiers() & Qt.KeyboardModifier.ControlModifier
+            if event.key() == Qt.Key.Key_Escape:
+                self.update(tool.overlay_rect())
+                tool.clear()
+            elif event.key() in (Qt.Key.Key_Return, Qt.Key.Key_Enter):
+                # Ctrl+Enter фиксирует блок, Enter начинает новую строку
+                if control:
+                    self.commit_text()
+                else:
+                    self.update(tool.insert("\n"))
+            elif event.key() == Qt.Key.Key_Backspace:
+                self.update(tool.backspace())
+            elif event.text() and event.text().isprintable() and not control:
+                self.update(tool.insert(event.text()))
+            else:
+                super().keyPressEvent(event)
+                return
+            event.accept()
+            return
         super().keyPressEvent(event)
+
+    def edit_regions(self, rects, paint):
+        """
+        Изменить изображение в пределах прямоугольников.
+        paint(painter) рисует изменение; в историю попадает только
+        содержимое этих областей до и после
+        """
+        self.flush_pending()
+        patch = RegionPatch(self.image, rects)
+        with painting(self.image, patch.bounding_rect()) as painter:
+            paint(painter)
+        self.history.push_patch(patch.finish(self.image))
+        self.history_changed()
+        self.refresh_display(patch.bounding_rect())
+        self.region_changed.emit(patch.bounding_rect(), patch.content_before(self.image))
+        return patch
+
+    def pixels(self, rect=None):
+        """
+        Массив NumPy поверх текущего изображения без копирования (только чтение).
+        Для Format_RGB32 форма (высота, ширина, 4) и порядок каналов B, G, R, A;
+        для оттенков серого и палитры - (высота, ширина), у палитры это номера цветов.
+        Массив отражает изображение на момент вызова: после правки холста он
+        остается действительным, но устаревает; для изменений нужна копия и commit_array
+        """
+        # Неявно разделяемая копия держит буфер: правка холста отсоединит свой
+        view = image_view(QImage(self.image))
+        view.flags.writeable = False
+        if rect is not None:
+            rect = rect.intersected(self.image.rect())
+            view = view[rect.top():rect.bottom() + 1, rect.left():rect.right() + 1]
+        return view
+
+    def commit_array(self, array, origin=QPoint(0, 0)):
+        """
+        Записать массив в изображение одним шагом истории.
+        array - пиксели в раскладке pixels(), origin - положение его левого верхнего угла.
+        В историю попадает только прямоугольник, где пиксели действительно изменились.
+        Возвращает RegionPatch или None, если изменений нет
+        """
+        current = self.pixels(QRect(origin, QSize(array.shape[1], array.shape[0])))
+        if array.shape != current.shape or array.dtype != current.dtype:
+            raise ValueError(f"Ожидается массив {current.shape} {current.dtype}, получен {array.shape} {array.dtype}")
+        changed = array != current
+        if changed.ndim == 3:
+            changed = changed.any(axis=2)
+        rows = np.flatnonzero(changed.any(axis=1))
+        if rows.size == 0:
+            return None
+        cols = np.flatnonzero(changed.any(axis=0))
+        top, bottom, left, right = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+
+        image_format = self.image.format()
+        block = np.ascontiguousarray(array[top:bottom, left:right])
+        if image_format == QImage.Format.Format_RGB32:
+            block[..., 3] = 255  # Непрозрачный формат: альфа всегда 0xff
+        region = QImage(block, block.shape[1], block.shape[0], block.strides[0], image_format)
+        region.setColorTable(self.image.colorTable())
+        rect = QRect(origin.x() + int(left), origin.y() + int(top), region.width(), region.height())
+
+        def paint(painter):
+            painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_Source)
+            painter.drawImage(rect.topLeft(), region)
+
+        return self.edit_regions([rect], paint)
+
+    def commit_selection(self):
+        """Зафиксировать плавающий фрагмент (или набираемый текст) одним шагом истории"""
+        tool = self.current_tool
+        if isinstance(tool, TextTool):
+            self.commit_text()
+            return
+        if not isinstance(tool, SelectionTool) or tool.floating is None:
+            return
+        floating, source_rect, target = tool.floating, QRect(tool.source_rect), QRect(tool.rect)
+        tool.floating = None
+        tool.source_rect = QRect()
+
+        def paint(painter):
+            if not source_rect.isEmpty():
+                painter.fillRect(source_rect, Qt.GlobalColor.white)
+            painter.drawImage(target.topLeft(), floating)
+
+        self.edit_regions([source_rect, target], paint)
+        self.update(target.united(source_rect).adjusted(-2, -2, 2, 2))
+        logger.debug(f"Фрагмент зафиксирован в {target}")
+
+    def commit_text(self):
+        """Записать набираемый текст в изображение одним шагом истории"""
+        tool = self.current_tool
+        if not isinstance(tool, TextTool) or not tool.editing:
+            return
+        overlay = tool.overlay_rect()
+        rect = tool.block_rect().intersected(self.image.rect())
+        if tool.text.strip() and not rect.isEmpty():
+            self.edit_regions([rect], tool.paint_text)
+            logger.debug(f"Текст зафиксирован в {rect}")
+        tool.clear()
+        self.update(overlay)
+
+    def cancel_selection(self):
+        """Отменить перемещение фрагмента и снять выделение"""
+        tool = self.current_tool
+        if isinstance(tool, SelectionTool):
+            self.update(tool.overlay_rect())
+            tool.clear()
+
+    def selected_image(self):
+        """Выделенный фрагмент (копия одной области, а не всего изображения)"""
+        tool = self.current_tool
+        if not isinstance(tool, SelectionTool) or not tool.has_selection():
+            return None
+        if tool.floating is not None:
+            return tool.floating
+        return self.image.copy(tool.rect)
+
+    def copy_selection(self):
+        """Копировать выделение в буфер обмена"""
+        fragment = self.selected_image()
+        if fragment is None:
+            return False
+        self.clipboard_image = fragment
+        QApplication.clipboard().setImage(fragment)
+        logger.debug(f"Скопирован фрагмент {fragment.width()}x{fragment.height()}")
+        return True
+
+    def delete_selection(self):
+        """Залить выделение белым одним шагом истории"""
+        tool = self.current_tool
+        if not isinstance(tool, SelectionTool) or not tool.has_selection():
+            return
+        if tool.floating is not None:
+            # Поднятый фрагмент просто удаляется, исходная область очищается
+            tool.floating = QImage(tool.rect.size(), QImage.Format.Format_RGB32)
+            tool.floating.fill(Qt.GlobalColor.white)
+            self.commit_selection()
+            return
+        rect = QRect(tool.rect)
+        self.edit_regions([rect], lambda painter: painter.fillRect(rect, Qt.GlobalColor.white))
+
+    def cut_selection(self):
+        """Вырезать выделение"""
+        if self.copy_selection():
+            self.delete_selection()
+
+    def paste(self, pos=None):
+        """Вставить фрагмент из буфера обмена как плавающий"""
+        if not isinstance(self.current_tool, SelectionTool):
+            return False
+        image = QApplication.clipboard().image()
+        if image.isNull():
+            image = self.clipboard_image
+        if image is None or image.isNull():
+            return False
+        self.commit_selection()
+        self.current_tool.start_floating(image, pos or QPoint(0, 0))
+        self.update(self.current_tool.overlay_rect())
+        logger.debug(f"Вставлен фрагмент {image.width()}x{image.height()}")
+        return True
     
     def save_image(self, filename):
         """Сохранение изображения"""
-        self.image.save(filename)
+        self.commit_selection()
+        if is_raw_file(filename):
+            save_raw(self.image, filename)
+        else:
+            self.image.save(filename)
 
-    def load_image(self, filename):
-        """Загрузка изображения"""
-        loaded_image = QImage(filename)
-        
-        # Создаем новый холст с размером загруженного изображения
-        new_image = QImage(loaded_image.size(), QImage.Format.Format_RGB32)
-        new_image.fill(Qt.GlobalColor.white)
-        
-        # Рисуем загруженное изображение
-        painter = QPainter(new_image)
-        painter.drawImage(0, 0, loaded_image)
+    def load_image(self, filename, **raw_geometry):
+        """
+        Загрузка изображения.
+        Несжатые форматы отображаются в память без декодирования
+        (пиксели RGB888/RGBA8888 копируются в формат холста);
+        raw_geometry - размер и раскладка для .raw без заголовка
+        """
+        if is_raw_file(filename):
+            image = open_raw(filename, **raw_geometry)
+            if is_document_format(image):
+                self.set_loaded_image(image, shared=True)
+            else:
+                # RGB888/RGBA8888 (PPM, PAM) - копия в формате холста
+                self.set_loaded_image(to_canvas_format(image))
+        else:
+            self.set_loaded_image(decode(filename))
+
+    def is_busy(self) -> bool:
+        """Холст занят фоновой загрузкой или масштабированием и не принимает правки"""
+        return not self.isEnabled()
+
+    def start_loading(self, filename, visible_rect=QRect()):
+        """
+        Поэтапная загрузка в фоновом потоке. Пока файл читается,
+        холст показывает эскиз и не принимает правки
+        """
+        if self.is_busy():
+            raise RuntimeError("Холст занят: дождитесь окончания загрузки или масштабирования")
+        self.commit_selection()
+        self.flush_pending()
+        self.setEnabled(False)
+        self.load_thread = ImageLoadThread(filename, visible_rect)
+        self.load_thread.preview_ready.connect(self.show_load_preview)
+        self.load_thread.region_ready.connect(self.show_load_region)
+        self.load_thread.finished_image.connect(self.set_loaded_image)
+        self.load_thread.failed.connect(self.on_load_failed)
+        self.load_thread.start()
+        return self.load_thread
+
+    def show_load_preview(self, preview, size):
+        """Показать растянутый эскиз вместо еще не прочитанного изображения"""
+        self.backing = QPixmap(size)
+        painter = QPainter(self.backing)
+        painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+        painter.drawImage(QRect(QPoint(0, 0), size), preview)
         painter.end()
-        
-        # Обновляем изображение и размер
-        self.image = new_image
-        self.setFixedSize(loaded_image.size())
+        self.setFixedSize(size)
+        self.update()
+
+    def show_load_region(self, rect, region):
+        """Показать видимую область в полном разрешении"""
+        painter = QPainter(self.backing)
+        painter.drawImage(rect.topLeft(), region)
+        painter.end()
+        self.update(rect)
+
+    def on_load_failed(self, message):
+        """Вернуть показ текущего изображения после неудачной загрузки"""
+        self.image = self.image
+        self.setFixedSize(self.image.size())
+        self.setEnabled(True)
+        self.update()
+
+    def set_loaded_image(self, image, shared=False):
+        """
+        Сделать загруженное изображение рабочим и начать историю заново.
+        shared - изображение поверх внешнего буфера, история не копирует его пиксели
+        """
+        self.image = image
+        self.setFixedSize(image.size())
         
         # Обновляем историю
+        if isinstance(self.current_tool, SelectionTool):
+            self.current_tool.clear()
         self.history.undo_stack.clear()
-        self.history.push_state(self.image)
+        self.history.redo_stack.clear()
+        if shared:
+            self.history.push_shared(self.image)
+        else:
+            self.save_state()
         
-        self.update()
\ No newline at end of file
+        self.setEnabled(True)
+        self.update()
+        self.image_reset.emit()
@@ -1,19 +1,49 @@
 from PyQt6.QtWidgets import (QMainWindow, QToolBar, QStatusBar, QSizePolicy, 
                              QPushButton, QMenu, QDialog, QVBoxLayout, QHBoxLayout,
                              QLabel, QScrollArea, QWidget, QSlider, QDialogButtonBox, 
-                             QSpinBox, QColorDialog, QFileDialog, QSystemTrayIcon)
-from PyQt6.QtCore import Qt
+                             QSpinBox, QColorDialog, QFileDialog, QSystemTrayIcon,
+                             QComboBox, QCheckBox, QDockWidget, QMessageBox,
+                             QTableWidget, QTableWidgetItem, QLineEdit, QTabWidget,
+                             QFontDialog, QInputDialog)
+from PyQt6.QtCore import Qt, QPoint, QRect
 from PyQt6.QtGui import QAction, QColor, QPixmap, QIcon
 from .canvas import Canvas
+from .stats_panel import StatsPanel
+from .navigator import Navigator
+from .recent_panel import RecentPanel
 from tools.brush import BrushTool
 from tools.eraser import EraserTool
 from tools.line import LineTool
 from tools.fill import FillTool
+from tools.selection import SelectionTool
+from tools.gradient import GradientTool
+from tools.text import TextTool
+from utils.resample import ResampleThread, FILTER_NAMES
+from utils import perf
+from utils.export import ExportTarget, ExportThread, EXPORT_FORMATS, default_profile
+from utils.document_memory import DocumentMemory
+from utils.raw_io import is_raw_file, RAW_FORMATS
+from utils.gradient import MODES as GRADIENT_MODES, parse_stops, format_stops
+from utils.recent_files import RecentFiles, ThumbnailCache, ThumbnailThread
+from utils.image_diff import CompareThread
+from utils.watchdog import StallWatchdog
+from utils.timelapse import TimelapseRecorder
+from utils.pixel_format import PIXEL_FORMATS
+import itertools
 import logging
 import os
+import tempfile
 
 logger = logging.getLogger(__name__)
 
+# Файлы автосохранения открытых документов
+AUTOSAVE_DIR = os.path.join(tempfile.gettempdir(), "rastro-autosave")
+# Сколько секунд без оборота цикла событий считается зависанием
+STALL_THRESHOLD = float(os.environ.get("RASTRO_STALL_THRESHOLD", "0.5"))
+
+IMAGE_FILTER = ("Изображения (*.png *.jpg *.bmp);;"
+                "Без сжатия (*.ppm *.pgm *.pam *.npy *.raw)")
+
 class ColorButton(QPushButton):
     def __init__(self, initial_color=QColor(0, 0, 0), parent=None):
         super().__init__(parent)
@@ -79,6 +109,326 @@ class ResizeDialog(QDialog):
     def get_size(self):
         return self.width_spin.value(), self.height_spin.value()
 
+class ScaleDialog(QDialog):
+    def __init__(self, current_width, current_height, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Масштаб изображения")
+        self.aspect = current_width / current_height
+        
+        layout = QVBoxLayout()
+        
+        size_layout = QHBoxLayout()
+        
+        width_layout = QVBoxLayout()
+        width_layout.addWidget(QLabel("Ширина:"))
+        self.width_spin = QSpinBox()
+        self.width_spin.setRange(1, 30000)
+        self.width_spin.setValue(current_width)
+        width_layout.addWidget(self.width_spin)
+        
+        height_layout = QVBoxLayout()
+        height_layout.addWidget(QLabel("Высота:"))
+        self.height_spin = QSpinBox()
+        self.height_spin.setRange(1, 30000)
+        self.height_spin.setValue(current_height)
+        height_layout.addWidget(self.height_spin)
+        
+        size_layout.addLayout(width_layout)
+        size_layout.addLayout(height_layout)
+        layout.addLayout(size_layout)
+        
+        self.keep_aspect = QCheckBox("Сохранять пропорции")
+        self.keep_aspect.setChecked(True)
+        layout.addWidget(self.keep_aspect)
+        self.width_spin.valueChanged.connect(self.on_width_changed)
+        
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(QLabel("Фильтр:"))
+        self.filter_combo = QComboBox()
+        for method, name in FILTER_NAMES.items():
+            self.filter_combo.addItem(name, method)
+        self.filter_combo.setCurrentIndex(self.filter_combo.findData("bicubic"))
+        filter_layout.addWidget(self.filter_combo)
+        layout.addLayout(filter_layout)
+        
+        button_box = QDialogButtonBox(
+            QDialogButtonBox.StandardButton.Ok | 
+            QDialogButtonBox.StandardButton.Cancel
+        )
+        button_box.accepted.connect(self.accept)
+        button_box.rejected.connect(self.reject)
+        layout.addWidget(button_box)
+        
+        self.setLayout(layout)
+    
+    def on_width_changed(self, value):
+        if self.keep_aspect.isChecked():
+            self.height_spin.setValue(max(1, round(value / self.aspect)))
+    
+    def get_size(self):
+        return self.width_spin.value(), self.height_spin.value()
+    
+    def get_method(self):
+        return self.filter_combo.currentData()
+
+class QualityDialog(QDialog):
+    def __init__(self, policy, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Качество отрисовки")
+        
+        layout = QVBoxLayout()
+        
+        self.enabled_check = QCheckBox("Упрощенная отрисовка при перетаскивании")
+        self.enabled_check.setChecked(policy.enabled)
+        layout.addWidget(self.enabled_check)
+        
+        self.predict_check = QCheckBox("Предсказывать кончик штриха (меньше отставание от курсора)")
+        self.predict_check.setChecked(policy.predict_strokes)
+        layout.addWidget(self.predict_check)
+        
+        self.smooth_check = QCheckBox("Сглаживание и скругленные концы штриха")
+        self.smooth_check.setChecked(policy.smooth_strokes)
+        layout.addWidget(self.smooth_check)
+        
+        brush_layout = QHBoxLayout()
+        brush_layout.addWidget(QLabel("Начиная с размера кисти:"))
+        self.brush_spin = QSpinBox()
+        self.brush_spin.setRange(1, 200)
+        self.brush_spin.setValue(policy.min_brush_size)
+        brush_layout.addWidget(self.brush_spin)
+        layout.addLayout(brush_layout)
+        
+        canvas_layout = QHBoxLayout()
+        canvas_layout.addWidget(QLabel("Начиная с размера холста (Мпикс):"))
+        self.canvas_spin = QSpinBox()
+        self.canvas_spin.setRange(1, 1000)
+        self.canvas_spin.setValue(max(1, policy.min_canvas_pixels // 1_000_000))
+        canvas_layout.addWidget(self.canvas_spin)
+        layout.addLayout(canvas_layout)
+        
+        button_box = QDialogButtonBox(
+            QDialogButtonBox.StandardButton.Ok | 
+            QDialogButtonBox.StandardButton.Cancel
+        )
+        button_box.accepted.connect(self.accept)
+        button_box.rejected.connect(self.reject)
+        layout.addWidget(button_box)
+        
+        self.setLayout(layout)
+    
+    def apply_to(self, policy):
+        policy.enabled = self.enabled_check.isChecked()
+        policy.predict_strokes = self.predict_check.isChecked()
+        policy.smooth_strokes = self.smooth_check.isChecked()
+        policy.min_brush_size = self.brush_spin.value()
+        policy.min_canvas_pixels = self.canvas_spin.value() * 1_000_000
+
+class GradientDialog(QDialog):
+    """Настройка градиента: тип, опорные цвета и сглаживание"""
+    def __init__(self, tool, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Градиент")
+        
+        layout = QVBoxLayout()
+        
+        mode_layout = QHBoxLayout()
+        mode_layout.addWidget(QLabel("Тип:"))
+        self.mode_combo = QComboBox()
+        for mode, label in GRADIENT_MODES.items():
+            self.mode_combo.addItem(label, mode)
+        self.mode_combo.setCurrentIndex(list(GRADIENT_MODES).index(tool.mode))
+        mode_layout.addWidget(self.mode_combo)
+        layout.addLayout(mode_layout)
+        
+        # Пустая строка - от цвета кисти к белому
+        layout.addWidget(QLabel("Опорные цвета (положение:цвет, через запятую):"))
+        self.stops_edit = QLineEdit(format_stops(tool.stops) if tool.stops else "")
+        self.stops_edit.setPlaceholderText("0:#000000, 0.5:#ff0000, 1:#ffffff")
+        layout.addWidget(self.stops_edit)
+        
+        self.dither_check = QCheckBox("Сглаживание (без полос)")
+        self.dither_check.setChecked(tool.dither)
+        layout.addWidget(self.dither_check)
+        
+        button_box = QDialogButtonBox(
+            QDialogButtonBox.StandardButton.Ok | 
+            QDialogButtonBox.StandardButton.Cancel
+        )
+        button_box.accepted.connect(self.accept)
+        button_box.rejected.connect(self.reject)
+        layout.addWidget(button_box)
+        
+        self.setLayout(layout)
+    
+    def apply_to(self, tool):
+        """Записать настройки в инструмент. ValueError - неверные опорные цвета"""
+        text = self.stops_edit.text().strip()
+        tool.stops = parse_stops(text) if text else None
+        tool.mode = self.mode_combo.currentData()
+        tool.dither = self.dither_check.isChecked()
+
+class RawGeometryDialog(QDialog):
+    """Размер и раскладка пикселей файла .raw без заголовка"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Параметры файла .raw")
+        
+        layout = QVBoxLayout()
+        
+        size_layout = QHBoxLayout()
+        size_layout.addWidget(QLabel("Ширина:"))
+        self.width_spin = QSpinBox()
+        self.width_spin.setRange(1, 100000)
+        self.width_spin.setValue(800)
+        size_layout.addWidget(self.width_spin)
+        size_layout.addWidget(QLabel("Высота:"))
+        self.height_spin = QSpinBox()
+        self.height_spin.setRange(1, 100000)
+        self.height_spin.setValue(600)
+        size_layout.addWidget(self.height_spin)
+        layout.addLayout(size_layout)
+        
+        format_layout = QHBoxLayout()
+        format_layout.addWidget(QLabel("Раскладка:"))
+        self.format_combo = QComboBox()
+        self.format_combo.addItems(RAW_FORMATS)
+        format_layout.addWidget(self.format_combo)
+        format_layout.addWidget(QLabel("Длина строки (0 - без выравнивания):"))
+        self.stride_spin = QSpinBox()
+        self.stride_spin.setRange(0, 1000000)
+        format_layout.addWidget(self.stride_spin)
+        layout.addLayout(format_layout)
+        
+        button_box = QDialogButtonBox(
+            QDialogButtonBox.StandardButton.Ok | 
+            QDialogButtonBox.StandardButton.Cancel
+        )
+        button_box.accepted.connect(self.accept)
+        button_box.rejected.connect(self.reject)
+        layout.addWidget(button_box)
+        
+        self.setLayout(layout)
+    
+    def get_geometry(self):
+        return {
+            "width": self.width_spin.value(),
+            "height": self.height_spin.value(),
+            "raw_format": self.format_combo.currentText(),
+            "stride": self.stride_spin.value() or None,
+        }
+
+class ExportDialog(QDialog):
+    """Настройка профиля экспорта: папка, имя и список целей"""
+    COLUMNS = ("Суффикс", "Макс. сторона", "Формат", "Качество", "Сжатие", "Цветов", "Сглаживание")
+
+    def __init__(self, targets, directory="", stem="image", parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Экспорт")
+        
+        layout = QVBoxLayout()
+        
+        path_layout = QHBoxLayout()
+        path_layout.addWidget(QLabel("Папка:"))
+        self.directory_edit = QLineEdit(directory)
+        path_layout.addWidget(self.directory_edit)
+        browse_button = QPushButton("...")
+        browse_button.clicked.connect(self.browse)
+        path_layout.addWidget(browse_button)
+        path_layout.addWidget(QLabel("Имя:"))
+        self.stem_edit = QLineEdit(stem)
+        path_layout.addWidget(self.stem_edit)
+        layout.addLayout(path_layout)
+        
+        # Макс. сторона 0 - исходный размер, качество и сжатие -1 - по умолчанию,
+        # цветов 0 - без палитры
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        for target in targets:
+            self.add_row(target)
+        layout.addWidget(self.table)
+        
+        rows_layout = QHBoxLayout()
+        add_button = QPushButton("Добавить")
+        add_button.clicked.connect(lambda: self.add_row(ExportTarget("new", 1024, "jpg", quality=85)))
+        rows_layout.addWidget(add_button)
+        remove_button = QPushButton("Удалить")
+        remove_button.clicked.connect(lambda: self.table.removeRow(self.table.currentRow()))
+        rows_layout.addWidget(remove_button)
+        rows_layout.addStretch()
+        layout.addLayout(rows_layout)
+        
+        button_box = QDialogButtonBox(
+            QDialogButtonBox.StandardButton.Ok | 
+            QDialogButtonBox.StandardButton.Cancel
+        )
+        button_box.accepted.connect(self.accept)
+        button_box.rejected.connect(self.reject)
+        layout.addWidget(button_box)
+        
+        self.setLayout(layout)
+        self.resize(720, 300)
+    
+    def add_row(self, target):
+        row = self.table.rowCount()
+        self.table.insertRow(row)
+        self.table.setItem(row, 0, QTableWidgetItem(target.suffix))
+        
+        side_spin = QSpinBox()
+        side_spin.setRange(0, 30000)
+        side_spin.setValue(target.max_side or 0)
+        self.table.setCellWidget(row, 1, side_spin)
+        
+        format_combo = QComboBox()
+        format_combo.addItems(EXPORT_FORMATS)
+        format_combo.setCurrentText(target.image_format)
+        self.table.setCellWidget(row, 2, format_combo)
+        
+        quality_spin = QSpinBox()
+        quality_spin.setRange(-1, 100)
+        quality_spin.setValue(target.quality)
+        self.table.setCellWidget(row, 3, quality_spin)
+        
+        compression_spin = QSpinBox()
+        compression_spin.setRange(-1, 9)
+        compression_spin.setValue(target.compression)
+        self.table.setCellWidget(row, 4, compression_spin)
+        
+        colors_spin = QSpinBox()
+        colors_spin.setRange(0, 256)
+        colors_spin.setValue(target.colors)
+        self.table.setCellWidget(row, 5, colors_spin)
+        
+        dither_check = QCheckBox()
+        dither_check.setChecked(target.dither)
+        self.table.setCellWidget(row, 6, dither_check)
+    
+    def browse(self):
+        directory = QFileDialog.getExistingDirectory(self, "Папка экспорта", self.directory_edit.text())
+        if directory:
+            self.directory_edit.setText(directory)
+    
+    def get_targets(self):
+        """Цели из таблицы; строки с тем же суффиксом и форматом (тот же файл) пропускаются"""
+        targets = []
+        names = set()
+        for row in range(self.table.rowCount()):
+            suffix = self.table.item(row, 0).text() if self.table.item(row, 0) else ""
+            image_format = self.table.cellWidget(row, 2).currentText()
+            if (suffix, image_format) in names:
+                logger.warning(f"Цель экспорта '{suffix}' ({image_format}) повторяется, строка {row + 1} пропущена")
+                continue
+            names.add((suffix, image_format))
+            targets.append(ExportTarget(
+                suffix,
+                self.table.cellWidget(row, 1).value() or None,
+                image_format,
+                self.table.cellWidget(row, 3).value(),
+                self.table.cellWidget(row, 4).value(),
+                self.table.cellWidget(row, 5).value(),
+                self.table.cellWidget(row, 6).isChecked(),
+            ))
+        return targets
+
 class MainWindow(QMainWindow):\
     
     def __init__(self):
@@ -101,16 +451,36 @@ class MainWindow(QMainWindow):\
 
         # Создаём меню
         menubar = self.menuBar()
+        # Правки документа; недоступны, пока холст занят загрузкой или масштабированием
+        self.document_actions = []
         
         # Меню файла
         file_menu = menubar.addMenu('Файл')
         
         # Действия для меню файла
+        new_action = QAction('Новый', self)
+        new_action.setShortcut('Ctrl+N')
+        new_action.triggered.connect(lambda: self.new_document())
+        file_menu.addAction(new_action)
+        
+        close_action = QAction('Закрыть', self)
+        close_action.setShortcut('Ctrl+W')
+        close_action.triggered.connect(lambda: self.close_document(self.tabs.currentIndex()))
+        file_menu.addAction(close_action)
+        
         open_action = QAction('Открыть...', self)
         open_action.setShortcut('Ctrl+O')
         open_action.triggered.connect(self.load_file)
         file_menu.addAction(open_action)
         
+        # Недавние файлы: меню собирается при открытии, миниатюры - из кэша
+        self.recent = RecentFiles()
+        self.thumbnails = ThumbnailCache()
+        self.thumbnail_thread = None
+        self.recent_stale = False
+        self.recent_menu = file_menu.addMenu('Недавние файлы')
+        self.recent_menu.aboutToShow.connect(self.rebuild_recent_menu)
+        
         save_action = QAction('Сохранить', self)
         save_action.setShortcut('Ctrl+S')
         save_action.triggered.connect(self.save_file)
@@ -121,35 +491,172 @@ class MainWindow(QMainWindow):\
         save_as_action.triggered.connect(self.save_file_as)
         file_menu.addAction(save_as_action)
         
+        export_action = QAction('Экспорт...', self)
+        export_action.setShortcut('Ctrl+E')
+        export_action.triggered.connect(self.show_export_dialog)
+        file_menu.addAction(export_action)
+        self.export_thread = None
+        
+        self.timelapse_action = QAction('Записать таймлапс...', self)
+        self.timelapse_action.triggered.connect(self.toggle_timelapse)
+        file_menu.addAction(self.timelapse_action)
+        self.timelapse = None
+        self.export_targets = default_profile()
+        self.export_directory = ""
+        self.export_stem = "image"
+        
+        # Меню правки
+        edit_menu = menubar.addMenu('Правка')
+        
+        copy_action = QAction('Копировать', self)
+        copy_action.setShortcut('Ctrl+C')
+        copy_action.triggered.connect(self.canvas_copy)
+        edit_menu.addAction(copy_action)
+        
+        cut_action = QAction('Вырезать', self)
+        cut_action.setShortcut('Ctrl+X')
+        cut_action.triggered.connect(self.canvas_cut)
+        edit_menu.addAction(cut_action)
+        self.document_actions.append(cut_action)
+        
+        paste_action = QAction('Вставить', self)
+        paste_action.setShortcut('Ctrl+V')
+        paste_action.triggered.connect(self.canvas_paste)
+        edit_menu.addAction(paste_action)
+        self.document_actions.append(paste_action)
+        
+        delete_action = QAction('Удалить', self)
+        delete_action.setShortcut('Delete')
+        delete_action.triggered.connect(self.canvas_delete)
+        edit_menu.addAction(delete_action)
+        self.document_actions.append(delete_action)
+        
         # Меню изображения
         image_menu = menubar.addMenu('Вид')
         resize_action = QAction('Размер холста...', self)
         resize_action.setShortcut('Ctrl+R')
         resize_action.triggered.connect(self.show_resize_dialog)
         image_menu.addAction(resize_action)
+        self.document_actions.append(resize_action)
+        
+        scale_action = QAction('Масштаб изображения...', self)
+        scale_action.setShortcut('Ctrl+Alt+R')
+        scale_action.triggered.connect(self.show_scale_dialog)
+        image_menu.addAction(scale_action)
+        self.document_actions.append(scale_action)
+        self.scale_thread = None
+        
+        # Обратимые преобразования: в истории хранится только операция
+        image_menu.addSeparator()
+        transforms = [
+            ('Отразить по горизонтали', "flip_horizontal", None),
+            ('Отразить по вертикали', "flip_vertical", None),
+            ('Повернуть на 90° по часовой', "rotate_cw", 'Ctrl+]'),
+            ('Повернуть на 90° против часовой', "rotate_ccw", 'Ctrl+['),
+            ('Повернуть на 180°', "rotate_180", None),
+            ('Инвертировать цвета', "invert", 'Ctrl+I'),
+        ]
+        for title, name, shortcut in transforms:
+            action = QAction(title, self)
+            if shortcut:
+                action.setShortcut(shortcut)
+            action.triggered.connect(lambda checked, name=name: self.canvas.transform(name))
+            image_menu.addAction(action)
+            self.document_actions.append(action)
+        
+        # Формат пикселей документа; отметка обновляется при открытии меню
+        self.format_menu = image_menu.addMenu('Формат пикселей')
+        self.format_actions = {}
+        for name, (_, title) in PIXEL_FORMATS.items():
+            action = self.format_menu.addAction(title)
+            action.setCheckable(True)
+            action.triggered.connect(lambda checked, name=name: self.set_pixel_format(name))
+            self.format_actions[name] = action
+        self.format_menu.aboutToShow.connect(self.update_format_menu)
+        self.document_actions.append(self.format_menu)
+        image_menu.addSeparator()
+        
+        quality_action = QAction('Качество отрисовки...', self)
+        quality_action.triggered.connect(self.show_quality_dialog)
+        image_menu.addAction(quality_action)
+        
+        gradient_action = QAction('Градиент...', self)
+        gradient_action.triggered.connect(self.show_gradient_dialog)
+        image_menu.addAction(gradient_action)
+        
+        font_action = QAction('Шрифт...', self)
+        font_action.triggered.connect(self.show_font_dialog)
+        image_menu.addAction(font_action)
+        
+        compare_action = QAction('Сравнить с файлом...', self)
+        compare_action.triggered.connect(self.compare_with_file)
+        image_menu.addAction(compare_action)
+        self.compare_thread = None
+        
+        hide_compare_action = QAction('Скрыть сравнение', self)
+        hide_compare_action.triggered.connect(lambda: self.canvas.show_diff(None))
+        image_menu.addAction(hide_compare_action)
+        
+        perf_action = QAction('Производительность...', self)
+        perf_action.triggered.connect(self.show_perf_report)
+        image_menu.addAction(perf_action)
 
-        # Инициализация холста
-        self.canvas = Canvas()
+        # Документы открываются во вкладках с общим бюджетом памяти
+        self.memory = DocumentMemory()
+        self.active_canvas = None
+        self.tool_name = "brush"
+        self.gradient_tool = GradientTool()
+        self.text_tool = TextTool()
+        # Сторож зависаний запускается вместе с циклом событий (main.py)
+        self.watchdog = StallWatchdog(self, threshold=STALL_THRESHOLD)
+        self.document_numbers = itertools.count(1)
+        self.tabs = QTabWidget()
+        self.tabs.setTabsClosable(True)
+        self.tabs.setDocumentMode(True)
+        self.tabs.tabCloseRequested.connect(self.close_document)
+        self.setCentralWidget(self.tabs)
         
-        # Создаем область прокрутки для холста
-        scroll_area = QScrollArea()
-        scroll_area.setWidget(self.canvas)
-        scroll_area.setWidgetResizable(False)
-        scroll_area.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
-        scroll_area.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
+        # Панель статистики (по умолчанию скрыта)
+        self.stats_panel = StatsPanel()
+        stats_dock = QDockWidget("Статистика", self)
+        stats_dock.setWidget(self.stats_panel)
+        self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, stats_dock)
+        stats_dock.hide()
+        image_menu.addAction(stats_dock.toggleViewAction())
+        
+        # Навигатор по большому холсту
+        self.navigator = Navigator()
+        navigator_dock = QDockWidget("Навигатор", self)
+        navigator_dock.setWidget(self.navigator)
+        self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, navigator_dock)
+        navigator_dock.hide()
+        image_menu.addAction(navigator_dock.toggleViewAction())
         
-        self.setCentralWidget(scroll_area)
+        # Стартовая панель недавних файлов
+        self.recent_panel = RecentPanel()
+        self.recent_panel.file_activated.connect(self.open_file)
+        self.recent_dock = QDockWidget("Недавние файлы", self)
+        self.recent_dock.setWidget(self.recent_panel)
+        self.addDockWidget(Qt.DockWidgetArea.LeftDockWidgetArea, self.recent_dock)
+        self.recent_dock.setVisible(bool(self.recent.existing()))
+        image_menu.addAction(self.recent_dock.toggleViewAction())
+        self.refresh_recent()
         
         # Настройка статус-бара
         self.statusBar = QStatusBar()
         self.tool_label = QLabel("Инструмент: Кисть")
-        self.size_label = QLabel(f"Размер холста: {self.canvas.width()}x{self.canvas.height()}")
+        self.size_label = QLabel()
         self.statusBar.addPermanentWidget(self.tool_label)
         self.statusBar.addPermanentWidget(self.size_label)
         self.setStatusBar(self.statusBar)
         
+        # Первый документ; панели подключаются к холсту активной вкладки
+        self.tabs.currentChanged.connect(self.on_tab_changed)
+        self.new_document()
+        
         # Создание панели инструментов
         self.createToolBar()
+        self.update_document_actions()
 
         # Добавление системного трея
         if QSystemTrayIcon.isSystemTrayAvailable():
@@ -170,6 +677,95 @@ class MainWindow(QMainWindow):\
         logger.info("Главное окно инициализировано")
 
 
+    def closeEvent(self, event):
+        """Остановка фоновых потоков при закрытии окна"""
+        self.watchdog.stop()
+        self.stop_timelapse()
+        if self.thumbnail_thread is not None:
+            self.thumbnail_thread.wait()
+        for thread in (self.scale_thread, self.compare_thread, self.export_thread):
+            if thread is not None:
+                thread.wait()
+        for index in range(self.tabs.count()):
+            canvas = self.tabs.widget(index).widget()
+            canvas.shutdown()
+            canvas.discard_autosave()
+        super().closeEvent(event)
+
+    @property
+    def canvas(self):
+        """Холст активной вкладки"""
+        scroll_area = self.tabs.currentWidget()
+        return scroll_area.widget() if scroll_area is not None else None
+
+    def new_document(self, title=None):
+        """Открыть пустой документ в новой вкладке"""
+        canvas = Canvas()
+        if self.active_canvas is not None:
+            canvas.quality = self.active_canvas.quality
+        canvas.autosave_path = os.path.join(AUTOSAVE_DIR, f"{os.getpid()}-{next(self.document_numbers)}.npy")
+        
+        # Создаем область прокрутки для холста
+        scroll_area = QScrollArea()
+        scroll_area.setWidget(canvas)
+        scroll_area.setWidgetResizable(False)
+        scroll_area.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
+        scroll_area.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
+        
+        self.memory.add(canvas)
+        index = self.tabs.addTab(scroll_area, title or self.UNTITLED)
+        self.tabs.setCurrentIndex(index)
+        logger.info(f"Открыт документ: {self.tabs.tabText(index)}")
+        return canvas
+
+    def close_document(self, index):
+        """Закрыть вкладку; последняя вкладка заменяется пустым документом"""
+        scroll_area = self.tabs.widget(index)
+        if scroll_area is None:
+            return
+        canvas = scroll_area.widget()
+        if canvas is self.active_canvas:
+            canvas.commit_selection()
+        if self.timelapse is not None and self.timelapse.canvas is canvas:
+            self.stop_timelapse()
+        self.tabs.removeTab(index)
+        if self.tabs.count() == 0:
+            self.new_document()
+        self.memory.remove(canvas)
+        canvas.shutdown()
+        canvas.discard_autosave()
+        scroll_area.deleteLater()
+
+    def on_tab_changed(self, index):
+        """Переключение документа: восстановить его и перенести настройки инструмента"""
+        canvas = self.canvas
+        if canvas is None:
+            return
+        previous = self.active_canvas
+        if previous is not None and previous is not canvas and previous in self.memory.documents:
+            previous.commit_selection()
+            canvas.color = previous.color
+            canvas.brush_size = previous.brush_size
+        self.active_canvas = canvas
+        self.memory.activate(canvas)
+        
+        if not self.has_tool(canvas):
+            self.select_tool(self.tool_name)
+        self.stats_panel.attach(canvas)
+        self.navigator.attach(canvas, self.tabs.currentWidget())
+        self.size_label.setText(f"Размер холста: {canvas.width()}x{canvas.height()}")
+        self.update_document_actions()
+
+    def update_document_actions(self):
+        """Правки доступны, только пока холст активной вкладки не занят"""
+        enabled = self.canvas is not None and not self.canvas.is_busy()
+        for action in self.document_actions:
+            action.setEnabled(enabled)
+
+    def has_tool(self, canvas):
+        """Выбран ли на холсте текущий инструмент окна"""
+        return type(canvas.current_tool) is self.TOOL_CLASSES.get(self.tool_name)
+
     def createToolBar(self):
         """Создание панели инструментов"""
         toolbar = QToolBar()
@@ -201,13 +797,15 @@ class MainWindow(QMainWindow):\
         # Кнопки отмены/повтора (маленькие)
         undo_btn = QPushButton("↶")
         undo_btn.setMaximumWidth(30)
-        undo_btn.clicked.connect(self.canvas.undo)
+        undo_btn.clicked.connect(lambda: self.canvas.undo())
         toolbar.addWidget(undo_btn)
+        self.document_actions.append(undo_btn)
 
         redo_btn = QPushButton("↷")
         redo_btn.setMaximumWidth(30)
-        redo_btn.clicked.connect(self.canvas.redo)
+        redo_btn.clicked.connect(lambda: self.canvas.redo())
         toolbar.addWidget(redo_btn)
+        self.document_actions.append(redo_btn)
 
         toolbar.addSeparator()
 
@@ -216,7 +814,10 @@ class MainWindow(QMainWindow):\
             ("Заливка", lambda: self.select_tool("fill")),
             ("Кисть", lambda: self.select_tool("brush")),
             ("Линия", lambda: self.select_tool("line")),
-            ("Ластик", lambda: self.select_tool("eraser"))
+            ("Ластик", lambda: self.select_tool("eraser")),
+            ("Выделение", lambda: self.select_tool("select")),
+            ("Градиент", lambda: self.select_tool("gradient")),
+            ("Текст", lambda: self.select_tool("text"))
         ]
 
         for name, action in tools:
@@ -252,6 +853,21 @@ class MainWindow(QMainWindow):\
         eraser_action.triggered.connect(lambda: self.select_tool("eraser"))
         self.addAction(eraser_action)
 
+        select_action = QAction('Выделение', self)
+        select_action.setShortcut('M')
+        select_action.triggered.connect(lambda: self.select_tool("select"))
+        self.addAction(select_action)
+
+        gradient_action = QAction('Градиент', self)
+        gradient_action.setShortcut('G')
+        gradient_action.triggered.connect(lambda: self.select_tool("gradient"))
+        self.addAction(gradient_action)
+
+        text_action = QAction('Текст', self)
+        text_action.setShortcut('T')
+        text_action.triggered.connect(lambda: self.select_tool("text"))
+        self.addAction(text_action)
+
         # Новые хоткеи для сохранения и открытия
         save_action = QAction('Сохранить', self)
         save_action.setShortcut('Ctrl+S')
@@ -263,7 +879,22 @@ class MainWindow(QMainWindow):\
         open_action.triggered.connect(self.load_file)
         self.addAction(open_action)
 
+    UNTITLED = "Без имени"
+    TOOL_CLASSES = {
+        "brush": BrushTool,
+        "line": LineTool,
+        "eraser": EraserTool,
+        "fill": FillTool,
+        "select": SelectionTool,
+        "gradient": GradientTool,
+        "text": TextTool,
+    }
+
     def select_tool(self, tool_name):
+        self.tool_name = tool_name
+        # Плавающий фрагмент фиксируется при смене инструмента
+        self.canvas.commit_selection()
+        self.canvas.cancel_selection()
         if tool_name == "brush":
             self.canvas.current_tool = BrushTool()
             self.tool_label.setText("Инструмент: Кисть")
@@ -280,6 +911,39 @@ class MainWindow(QMainWindow):\
             self.canvas.current_tool = FillTool()
             self.tool_label.setText("Инструмент: Заливка")
             logger.info("Выбран инструмент: Заливка")
+        elif tool_name == "select":
+            self.canvas.current_tool = SelectionTool()
+            self.tool_label.setText("Инструмент: Выделение")
+            logger.info("Выбран инструмент: Выделение")
+        elif tool_name == "gradient":
+            # Настройки градиента общие для всех вкладок
+            self.canvas.current_tool = self.gradient_tool
+            self.tool_label.setText("Инструмент: Градиент")
+            logger.info("Выбран инструмент: Градиент")
+        elif tool_name == "text":
+            # Шрифт и кэш растров общие для всех вкладок
+            self.canvas.current_tool = self.text_tool
+            self.tool_label.setText("Инструмент: Текст")
+            logger.info("Выбран инструмент: Текст")
+
+    def canvas_copy(self):
+        if self.canvas.copy_selection():
+            self.statusBar.showMessage("Фрагмент скопирован", 2000)
+
+    def canvas_cut(self):
+        self.canvas.cut_selection()
+
+    def canvas_paste(self):
+        if not isinstance(self.canvas.current_tool, SelectionTool):
+            self.select_tool("select")
+        # Вставляем в левый верхний угол видимой области
+        scroll_area = self.tabs.currentWidget()
+        pos = QPoint(scroll_area.horizontalScrollBar().value(), scroll_area.verticalScrollBar().value())
+        if not self.canvas.paste(pos):
+            self.statusBar.showMessage("Буфер обмена пуст", 2000)
+
+    def canvas_delete(self):
+        self.canvas.delete_selection()
 
     def show_resize_dialog(self):
         dialog = ResizeDialog(self.canvas.width(), self.canvas.height(), self)
@@ -289,6 +953,171 @@ class MainWindow(QMainWindow):\
             self.size_label.setText(f"Размер холста: {width}x{height}")
             logger.info(f"Изменен размер холста на {width}x{height}")
 
+    def show_scale_dialog(self):
+        dialog = ScaleDialog(self.canvas.width(), self.canvas.height(), self)
+        if dialog.exec() != QDialog.DialogCode.Accepted:
+            return
+        width, height = dialog.get_size()
+        # Одновременно выполняется одно масштабирование
+        if self.canvas.is_busy() or (self.scale_thread is not None and self.scale_thread.isRunning()):
+            self.statusBar.showMessage("Дождитесь окончания текущего масштабирования", 5000)
+            return
+        
+        # Масштабирование идет в фоне, холст на это время недоступен
+        canvas = self.canvas
+        canvas.setEnabled(False)
+        self.update_document_actions()
+        self.statusBar.showMessage("Масштабирование...")
+        self.scale_thread = ResampleThread(canvas.image, width, height, dialog.get_method())
+        # Результат относится к холсту, с которого масштабирование запущено
+        self.scale_thread.finished_image.connect(lambda image: self.on_scale_finished(canvas, image))
+        self.scale_thread.failed.connect(lambda message: self.on_scale_failed(canvas, message))
+        self.scale_thread.start()
+        logger.info(f"Запущено масштабирование до {width}x{height} ({dialog.get_method()})")
+    
+    def on_scale_finished(self, canvas, image):
+        canvas.setEnabled(True)
+        canvas.set_image(image)
+        self.update_document_actions()
+        if canvas is self.canvas:
+            self.size_label.setText(f"Размер холста: {image.width()}x{image.height()}")
+        self.memory.enforce()
+        self.statusBar.showMessage("Масштабирование завершено", 2000)
+        logger.info(f"Изображение масштабировано до {image.width()}x{image.height()}")
+    
+    def on_scale_failed(self, canvas, message):
+        canvas.setEnabled(True)
+        self.update_document_actions()
+        self.statusBar.showMessage(f"Ошибка масштабирования: {message}", 5000)
+
+    def show_export_dialog(self):
+        if self.export_thread is not None and self.export_thread.isRunning():
+            self.statusBar.showMessage("Дождитесь окончания текущего экспорта", 5000)
+            return
+        dialog = ExportDialog(self.export_targets, self.export_directory, self.export_stem, self)
+        if dialog.exec() != QDialog.DialogCode.Accepted:
+            return
+        self.export_targets = dialog.get_targets()
+        self.export_directory = dialog.directory_edit.text()
+        self.export_stem = dialog.stem_edit.text() or "image"
+        if not self.export_targets or not self.export_directory:
+            self.statusBar.showMessage("Экспорт: не заданы папка или цели", 5000)
+            return
+        
+        self.canvas.commit_selection()
+        self.statusBar.showMessage(f"Экспорт ({len(self.export_targets)} целей)...")
+        self.export_thread = ExportThread(self.canvas.image, self.export_directory,
+                                          self.export_stem, self.export_targets)
+        self.export_thread.finished_export.connect(self.on_export_finished)
+        self.export_thread.failed.connect(lambda message: self.statusBar.showMessage(
+            f"Ошибка экспорта: {message}", 5000))
+        self.export_thread.start()
+    
+    def on_export_finished(self, results):
+        errors = [path for path, error in results if error]
+        if errors:
+            self.statusBar.showMessage(f"Экспорт: не удалось записать {', '.join(errors)}", 5000)
+        else:
+            self.statusBar.showMessage(f"Экспортировано файлов: {len(results)}", 2000)
+
+    def toggle_timelapse(self):
+        """Начать или остановить запись таймлапса текущего документа"""
+        if self.timelapse is not None:
+            self.stop_timelapse()
+            return
+        interval, accepted = QInputDialog.getDouble(
+            self, "Таймлапс", "Интервал между кадрами, с:", 1.0, 0.1, 600.0, 1)
+        if not accepted:
+            return
+        directory = QFileDialog.getExistingDirectory(self, "Папка для кадров таймлапса")
+        if not directory:
+            return
+        self.timelapse = TimelapseRecorder(self.canvas, directory, interval, parent=self)
+        try:
+            self.timelapse.start()
+        except OSError as e:
+            self.timelapse = None
+            QMessageBox.warning(self, "Таймлапс", str(e))
+            return
+        self.timelapse_action.setText('Остановить таймлапс')
+        self.statusBar.showMessage(f"Запись таймлапса в {directory}", 2000)
+
+    def stop_timelapse(self):
+        if self.timelapse is None:
+            return
+        recorder, self.timelapse = self.timelapse, None
+        frames = recorder.stop()
+        self.timelapse_action.setText('Записать таймлапс...')
+        if recorder.error:
+            self.statusBar.showMessage(f"Ошибка записи таймлапса: {recorder.error}", 5000)
+        else:
+            self.statusBar.showMessage(f"Таймлапс записан: {frames} кадров", 5000)
+
+    def show_quality_dialog(self):
+        dialog = QualityDialog(self.canvas.quality, self)
+        if dialog.exec() == QDialog.DialogCode.Accepted:
+            dialog.apply_to(self.canvas.quality)
+            logger.info(f"Порог упрощенной отрисовки: кисть {self.canvas.quality.min_brush_size}, "
+                        f"холст {self.canvas.quality.min_canvas_pixels} пикс.")
+
+    def show_gradient_dialog(self):
+        dialog = GradientDialog(self.gradient_tool, self)
+        if dialog.exec() == QDialog.DialogCode.Accepted:
+            try:
+                dialog.apply_to(self.gradient_tool)
+            except ValueError as e:
+                QMessageBox.warning(self, "Градиент", str(e))
+                return
+            self.select_tool("gradient")
+
+    def show_font_dialog(self):
+        font, accepted = QFontDialog.getFont(self.text_tool.font, self, "Шрифт текста")
+        if accepted:
+            self.text_tool.set_font(font)
+            self.select_tool("text")
+            logger.info(f"Шрифт текста: {font.family()}, {font.pointSize()} пт")
+
+    def compare_with_file(self):
+        """Сравнить документ с другой версией изображения"""
+        if self.compare_thread is not None and self.compare_thread.isRunning():
+            self.statusBar.showMessage("Дождитесь окончания текущего сравнения", 5000)
+            return
+        filename, _ = QFileDialog.getOpenFileName(self, "Сравнить с изображением", "", IMAGE_FILTER)
+        if not filename:
+            return
+        canvas = self.canvas
+        self.statusBar.showMessage("Сравнение...")
+        self.compare_thread = CompareThread(canvas.image, filename)
+        self.compare_thread.finished_result.connect(lambda result: self.on_compare_finished(canvas, filename, result))
+        self.compare_thread.failed.connect(lambda message: self.statusBar.showMessage(f"Ошибка сравнения: {message}", 5000))
+        self.compare_thread.start()
+        logger.info(f"Запущено сравнение с {filename}")
+
+    def on_compare_finished(self, canvas, filename, result):
+        if result.mask.shape != (canvas.image.height(), canvas.image.width()):
+            # Размер изображения изменился, пока шло сравнение
+            self.statusBar.showMessage("Сравнение устарело: размер изображения изменился", 5000)
+            return
+        canvas.show_diff(result)
+        self.statusBar.showMessage(f"Отличающихся пикселей: {result.changed}", 5000)
+        QMessageBox.information(self, "Сравнение", f"{os.path.basename(filename)}\n\n{result.summary()}")
+
+    def show_perf_report(self):
+        """Показать счетчики времени вывода и сравнение способов отрисовки кадра"""
+        image_cost, pixmap_cost = perf.blit_cost(self.canvas.image)
+        predictor = self.canvas.predictor
+        text = (f"{perf.report()}\n\n"
+                f"Кадр из QImage: {image_cost:.3f} мс\n"
+                f"Кадр из QPixmap: {pixmap_cost:.3f} мс\n"
+                f"Предсказание штриха: скрыто в среднем "
+                f"{perf.counter('predictor.hidden_latency').average_ms:.1f} мс задержки, "
+                f"ошибка {predictor.mean_error:.1f} пикс.\n"
+                f"Кэш растров текста: {TextTool.cache.hits} попаданий, "
+                f"{TextTool.cache.misses} растрирований, {TextTool.cache.nbytes // 1024} КБ\n"
+                f"Зависания интерфейса (дольше {self.watchdog.threshold:.1f} с): {self.watchdog.stalls}, "
+                f"самое долгое {perf.counter('watchdog.stall').max:.2f} с")
+        QMessageBox.information(self, "Производительность", text)
+
     def show_size_dialog(self):
         dialog = QDialog(self)
         dialog.setWindowTitle("Размер инструмента")
@@ -301,7 +1130,7 @@ class MainWindow(QMainWindow):\
         
         size_slider = QSlider(Qt.Orientation.Horizontal)
         size_slider.setMinimum(1)
-        size_slider.setMaximum(50)
+        size_slider.setMaximum(200)
         size_slider.setValue(self.canvas.brush_size)
         size_layout.addWidget(size_slider)
         
@@ -348,10 +1177,11 @@ class MainWindow(QMainWindow):\
             self, 
             "Сохранить изображение", 
             "", 
-            "Изображения (*.png *.jpg *.bmp)"
+            IMAGE_FILTER
         )
         if filename:
             self.canvas.save_image(filename)
+            self.add_recent(filename)
             logger.info(f"Изображение сохранено: {filename}")
             self.statusBar.showMessage(f"Сохранено в {filename}", 2000)
 
@@ -360,21 +1190,124 @@ class MainWindow(QMainWindow):\
             self, 
             "Открыть изображение", 
             "", 
-            "Изображения (*.png *.jpg *.bmp)"
+            IMAGE_FILTER
         )
         if filename:
-            self.canvas.load_image(filename)
-            logger.info(f"Изображение загружено: {filename}")
-            self.statusBar.showMessage(f"Загружено из {filename}", 2000)
+            self.open_file(filename)
+
+    def open_file(self, filename):
+        """Открыть файл во вкладке (из диалога, меню или панели недавних файлов)"""
+        if not os.path.isfile(filename):
+            self.recent.remove(filename)
+            self.refresh_recent()
+            self.statusBar.showMessage(f"Файл не найден: {filename}", 5000)
+            return
+        raw_geometry = {}
+        if filename.lower().endswith(".raw"):
+            dialog = RawGeometryDialog(self)
+            if dialog.exec() != QDialog.DialogCode.Accepted:
+                return
+            raw_geometry = dialog.get_geometry()
+        
+        if self.canvas.history.can_undo() or self.tabs.tabText(self.tabs.currentIndex()) != self.UNTITLED:
+            self.new_document()
+        canvas = self.canvas
+        self.tabs.setTabText(self.tabs.currentIndex(), os.path.basename(filename))
+        
+        if is_raw_file(filename):
+            # Несжатые файлы отображаются в память сразу, без фоновой загрузки
+            try:
+                canvas.load_image(filename, **raw_geometry)
+            except (OSError, ValueError) as e:
+                logger.error(f"Ошибка загрузки: {str(e)}")
+                self.on_load_failed(str(e))
+                return
+            self.on_load_finished(canvas, filename, canvas.image)
+            return
+        
+        # Видимая часть холста декодируется в полном разрешении в первую очередь
+        scroll_area = self.tabs.currentWidget()
+        visible = QRect(QPoint(scroll_area.horizontalScrollBar().value(),
+                               scroll_area.verticalScrollBar().value()),
+                        scroll_area.viewport().size())
+        self.statusBar.showMessage(f"Загрузка {filename}...")
+        thread = canvas.start_loading(filename, visible)
+        thread.finished_image.connect(lambda image: self.on_load_finished(canvas, filename, image))
+        thread.failed.connect(self.on_load_failed)
+        self.update_document_actions()
+
+    def add_recent(self, filename):
+        self.recent.add(filename)
+        self.refresh_recent()
+
+    def refresh_recent(self):
+        """Обновить панель недавних файлов и построить недостающие миниатюры в фоне"""
+        files = self.recent.existing()
+        # Состояние меню задается здесь: отключенное подменю не получает aboutToShow
+        self.recent_menu.setEnabled(bool(files))
+        missing = self.recent_panel.set_files(files, self.thumbnails)
+        if not missing:
+            return
+        if self.thumbnail_thread is not None and self.thumbnail_thread.isRunning():
+            # Список изменился во время построения - повторим после него
+            self.recent_stale = True
+            return
+        self.recent_stale = False
+        self.thumbnail_thread = ThumbnailThread(self.thumbnails, missing, self)
+        self.thumbnail_thread.thumbnail_ready.connect(self.recent_panel.set_thumbnail)
+        self.thumbnail_thread.finished.connect(self.on_thumbnails_finished)
+        self.thumbnail_thread.start()
+
+    def on_thumbnails_finished(self):
+        if self.recent_stale:
+            self.refresh_recent()
+
+    def update_format_menu(self):
+        current = self.canvas.pixel_format
+        for name, action in self.format_actions.items():
+            action.setChecked(name == current)
+
+    def set_pixel_format(self, name):
+        if name == self.canvas.pixel_format:
+            return
+        self.canvas.set_pixel_format(name)
+        self.memory.enforce()
+        self.statusBar.showMessage(f"Формат пикселей: {PIXEL_FORMATS[name][1]}", 2000)
+
+    def rebuild_recent_menu(self):
+        """Меню недавних файлов; миниатюры только из кэша, без декодирования"""
+        self.recent_menu.clear()
+        files = self.recent.existing()
+        for filename in files:
+            action = self.recent_menu.addAction(os.path.basename(filename))
+            action.setToolTip(filename)
+            thumbnail = self.thumbnails.get(filename)
+            if thumbnail is not None:
+                action.setIcon(QIcon(QPixmap.fromImage(thumbnail)))
+            action.triggered.connect(lambda checked, name=filename: self.open_file(name))
+
+    def on_load_finished(self, canvas, filename, image):
+        if canvas is self.canvas:
+            self.size_label.setText(f"Размер холста: {image.width()}x{image.height()}")
+        self.memory.enforce()
+        self.add_recent(filename)
+        self.update_document_actions()
+        logger.info(f"Изображение загружено: {filename}")
+        self.statusBar.showMessage(f"Загружено из {filename}", 2000)
+
+    def on_load_failed(self, message):
+        self.update_document_actions()
+        self.statusBar.showMessage(f"Ошибка загрузки: {message}", 5000)
 
     def save_file_as(self):
         filename, _ = QFileDialog.getSaveFileName(
             self, 
             "Сохранить изображение как", 
             "", 
-            "Изображения (*.png *.jpg *.bmp)"
+            IMAGE_FILTER
         )
         if filename:
             self.canvas.save_image(filename)
+            self.add_recent(filename)
             logger.info(f"Изображение сохранено как: {filename}")
             self.statusBar.showMessage(f"Сохранено как {filename}", 2000)
\ No newline at end of file
@@ -0,0 +1,124 @@
+from PyQt6.QtWidgets import QWidget
+from PyQt6.QtCore import Qt, QRect, QRectF, QSize, QPoint
+from PyQt6.QtGui import QPainter, QImage, QColor, QPen
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Navigator(QWidget):
+    """
+    Миникарта холста с рамкой видимой области.
+    Миниатюра хранится отдельным маленьким буфером; после правок
+    пересчитываются только ее пиксели под измененными областями
+    """
+    def __init__(self, max_size=200, parent=None):
+        super().__init__(parent)
+        self.max_size = max_size
+        self.canvas = None
+        self.scroll_area = None
+        self.thumbnail = QImage()
+        self.scale = 1.0
+        self.setFixedSize(max_size, max_size)
+        self.setCursor(Qt.CursorShape.PointingHandCursor)
+
+    def attach(self, canvas, scroll_area):
+        """Подключить навигатор к холсту и области прокрутки"""
+        if self.canvas is not None:
+            self.canvas.region_changed.disconnect(self.on_region_changed)
+            self.canvas.image_reset.disconnect(self.rebuild)
+            for bar in (self.scroll_area.horizontalScrollBar(), self.scroll_area.verticalScrollBar()):
+                bar.valueChanged.disconnect(self.on_view_changed)
+                bar.rangeChanged.disconnect(self.on_view_changed)
+        self.canvas = canvas
+        self.scroll_area = scroll_area
+        canvas.region_changed.connect(self.on_region_changed)
+        canvas.image_reset.connect(self.rebuild)
+        for bar in (scroll_area.horizontalScrollBar(), scroll_area.verticalScrollBar()):
+            bar.valueChanged.connect(self.on_view_changed)
+            bar.rangeChanged.connect(self.on_view_changed)
+        self.rebuild()
+
+    def on_view_changed(self, *args):
+        """Прокрутка или изменение размера области просмотра"""
+        self.update()
+
+    def rebuild(self):
+        """Построить миниатюру заново (загрузка, смена размера)"""
+        image = self.canvas.image
+        self.scale = min(self.max_size / image.width(), self.max_size / image.height(), 1.0)
+        size = QSize(max(1, round(image.width() * self.scale)), max(1, round(image.height() * self.scale)))
+        # Без уменьшения scaled() сохраняет формат документа, а в палитровое
+        # изображение QPainter рисовать не умеет - миниатюра всегда RGB32
+        self.thumbnail = image.scaled(size, Qt.AspectRatioMode.IgnoreAspectRatio,
+                                      Qt.TransformationMode.SmoothTransformation
+                                      ).convertToFormat(QImage.Format.Format_RGB32)
+        self.update()
+        logger.debug(f"Миниатюра навигатора построена: {size.width()}x{size.height()}")
+
+    def on_region_changed(self, rect, before):
+        """Пересчитать пиксели миниатюры под измененной областью"""
+        image = self.canvas.image
+        if self.thumbnail.isNull():
+            return
+        scale_x = self.thumbnail.width() / image.width()
+        scale_y = self.thumbnail.height() / image.height()
+
+        # Целые пиксели миниатюры, покрывающие область
+        left = int(rect.left() * scale_x)
+        top = int(rect.top() * scale_y)
+        right = min(self.thumbnail.width(), int((rect.right() + 1) * scale_x) + 1)
+        bottom = min(self.thumbnail.height(), int((rect.bottom() + 1) * scale_y) + 1)
+        target = QRect(left, top, right - left, bottom - top)
+        if target.isEmpty():
+            return
+
+        # Соответствующая область исходного изображения
+        source = QRectF(left / scale_x, top / scale_y, target.width() / scale_x, target.height() / scale_y)
+        source_rect = source.toAlignedRect().intersected(image.rect())
+        patch = image.copy(source_rect).scaled(target.size(), Qt.AspectRatioMode.IgnoreAspectRatio,
+                                               Qt.TransformationMode.SmoothTransformation)
+        painter = QPainter(self.thumbnail)
+        painter.drawImage(target.topLeft(), patch)
+        painter.end()
+        self.update(target.translated(self.offset()))
+
+    def offset(self) -> QPoint:
+        """Смещение миниатюры для центрирования в виджете"""
+        return QPoint((self.width() - self.thumbnail.width()) // 2,
+                      (self.height() - self.thumbnail.height()) // 2)
+
+    def viewport_rect(self) -> QRect:
+        """Видимая часть холста в координатах виджета навигатора"""
+        viewport = self.scroll_area.viewport()
+        x = self.scroll_area.horizontalScrollBar().value()
+        y = self.scroll_area.verticalScrollBar().value()
+        scale_x = self.thumbnail.width() / self.canvas.image.width()
+        scale_y = self.thumbnail.height() / self.canvas.image.height()
+        rect = QRectF(x * scale_x, y * scale_y, viewport.width() * scale_x, viewport.height() * scale_y)
+        return rect.toRect().intersected(self.thumbnail.rect()).translated(self.offset())
+
+    def paintEvent(self, event):
+        if self.thumbnail.isNull() or self.canvas is None:
+            return
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), self.palette().window())
+        painter.drawImage(self.offset(), self.thumbnail)
+        painter.setPen(QPen(QColor(220, 40, 40), 1))
+        painter.drawRect(self.viewport_rect().adjusted(0, 0, -1, -1))
+
+    def scroll_to(self, pos):
+        """Прокрутить холст так, чтобы точка pos навигатора оказалась в центре"""
+        point = pos - self.offset()
+        scale_x = self.thumbnail.width() / self.canvas.image.width()
+        scale_y = self.thumbnail.height() / self.canvas.image.height()
+        viewport = self.scroll_area.viewport()
+        self.scroll_area.horizontalScrollBar().setValue(int(point.x() / scale_x - viewport.width() / 2))
+        self.scroll_area.verticalScrollBar().setValue(int(point.y() / scale_y - viewport.height() / 2))
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.MouseButton.LeftButton and self.canvas is not None:
+            self.scroll_to(event.pos())
+
+    def mouseMoveEvent(self, event):
+        if event.buttons() & Qt.MouseButton.LeftButton and self.canvas is not None:
+            self.scroll_to(event.pos())
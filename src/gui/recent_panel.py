@@ -0,0 +1,50 @@
+from PyQt6.QtWidgets import QListWidget, QListWidgetItem
+from PyQt6.QtCore import Qt, QSize, pyqtSignal
+from PyQt6.QtGui import QIcon, QPixmap, QColor
+from utils.recent_files import THUMBNAIL_SIZE
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+class RecentPanel(QListWidget):
+    """
+    Стартовая панель с миниатюрами недавних файлов.
+    Миниатюры берутся только из кэша; недостающие строятся в фоне
+    и подставляются по мере готовности (set_thumbnail)
+    """
+    file_activated = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setViewMode(QListWidget.ViewMode.IconMode)
+        self.setIconSize(QSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        self.setResizeMode(QListWidget.ResizeMode.Adjust)
+        self.setMovement(QListWidget.Movement.Static)
+        self.setWordWrap(True)
+        self.items = {}  # путь -> элемент списка
+        self.placeholder = QPixmap(THUMBNAIL_SIZE, THUMBNAIL_SIZE)
+        self.placeholder.fill(QColor(230, 230, 230))
+        self.itemActivated.connect(lambda item: self.file_activated.emit(item.data(Qt.ItemDataRole.UserRole)))
+
+    def set_files(self, filenames, cache):
+        """Показать файлы. Возвращает те, для которых в кэше нет миниатюры"""
+        self.clear()
+        self.items = {}
+        missing = []
+        for filename in filenames:
+            thumbnail = cache.get(filename)
+            if thumbnail is None:
+                missing.append(filename)
+            icon = QIcon(QPixmap.fromImage(thumbnail) if thumbnail is not None else self.placeholder)
+            item = QListWidgetItem(icon, os.path.basename(filename))
+            item.setToolTip(filename)
+            item.setData(Qt.ItemDataRole.UserRole, filename)
+            self.addItem(item)
+            self.items[filename] = item
+        return missing
+
+    def set_thumbnail(self, filename, thumbnail):
+        item = self.items.get(filename)
+        if item is not None:
+            item.setIcon(QIcon(QPixmap.fromImage(thumbnail)))
@@ -0,0 +1,94 @@
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QLabel
+from PyQt6.QtCore import Qt, QSize, QPointF
+from PyQt6.QtGui import QPainter, QColor, QPen, QPolygonF
+from utils.image_stats import ImageStats
+from utils.idle_scheduler import HIGH
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class HistogramWidget(QWidget):
+    """График гистограмм каналов R, G, B"""
+    CHANNEL_COLORS = (QColor(220, 40, 40), QColor(40, 160, 40), QColor(40, 40, 220))
+
+    def __init__(self, stats, parent=None):
+        super().__init__(parent)
+        self.stats = stats
+        self.setMinimumSize(QSize(256, 120))
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor(Qt.GlobalColor.white))
+        peak = self.stats.channels.max()
+        if not peak:
+            return
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        width, height = self.width(), self.height()
+        for channel, color in enumerate(self.CHANNEL_COLORS):
+            points = QPolygonF([
+                QPointF(level * width / 255, height - count * (height - 2) / peak)
+                for level, count in enumerate(self.stats.channels[channel])
+            ])
+            painter.setPen(QPen(color, 1))
+            painter.drawPolyline(points)
+
+class StatsPanel(QWidget):
+    """
+    Панель статистики изображения.
+    Подписывается на сигналы холста и обновляет статистику по измененным областям.
+    Области пересчитываются в простое (до следующей правки холста)
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.stats = ImageStats()
+        self.canvas = None
+        self.pending = []  # (область, содержимое до изменения), еще не учтенные
+
+        layout = QVBoxLayout(self)
+        self.histogram = HistogramWidget(self.stats)
+        layout.addWidget(self.histogram)
+        self.colors_label = QLabel()
+        self.mean_label = QLabel()
+        layout.addWidget(self.colors_label)
+        layout.addWidget(self.mean_label)
+        layout.addStretch()
+
+    def attach(self, canvas):
+        """Подключить панель к холсту"""
+        if self.canvas is not None:
+            self.canvas.region_changed.disconnect(self.on_region_changed)
+            self.canvas.image_reset.disconnect(self.on_image_reset)
+            self.canvas.idle.cancel("stats")
+        self.canvas = canvas
+        canvas.region_changed.connect(self.on_region_changed)
+        canvas.image_reset.connect(self.on_image_reset)
+        self.on_image_reset()
+
+    def on_image_reset(self):
+        self.pending = []
+        self.canvas.idle.cancel("stats")
+        self.stats.rescan(self.canvas.image)
+        self.refresh()
+
+    def on_region_changed(self, rect, before):
+        self.pending.append((rect, before))
+        self.canvas.idle.schedule("stats", self.update_pending, HIGH)
+
+    def update_pending(self, deadline=None) -> bool:
+        """Учесть накопленные области. Возвращает True, если до deadline учтены не все"""
+        image = self.canvas.image
+        while self.pending:
+            if deadline is not None and time.perf_counter() > deadline:
+                return True
+            rect, before = self.pending.pop(0)
+            self.stats.update_region(rect, before, image)
+        self.refresh()
+        return False
+
+    def refresh(self):
+        """Обновить подписи и график"""
+        red, green, blue = self.stats.mean
+        self.colors_label.setText(f"Уникальных цветов: {self.stats.unique_colors}")
+        self.mean_label.setText(f"Средний цвет: R {red:.1f}, G {green:.1f}, B {blue:.1f}")
+        self.histogram.update()
@@ -10,15 +10,21 @@ if str(current_dir) not in sys.path:
 from PyQt6.QtWidgets import QApplication
 from gui.main_window import MainWindow
 from utils.logger import setup_logger
+from utils.batch import main as batch_main
 
 def main():
     # Настраиваем логирование
     setup_logger()
     
+    # Пакетный режим без графического интерфейса
+    if len(sys.argv) > 1 and sys.argv[1] == "--batch":
+        sys.exit(batch_main(sys.argv[2:]))
+    
     try:
         app = QApplication(sys.argv)
         window = MainWindow()
         window.show()
+        window.watchdog.start()
         sys.exit(app.exec())
     except Exception as e:
         print(f"Ошибка: {str(e)}")
@@ -1,11 +1,14 @@
+import math
 from abc import ABC, abstractmethod
-from PyQt6.QtCore import QPoint
-from PyQt6.QtGui import QPainter
+from PyQt6.QtCore import Qt, QPoint, QRect
+from PyQt6.QtGui import QPainter, QPen
 
 class BaseTool(ABC):
     def __init__(self):
         self.color = None
         self.size = 1
+        self.fast = False  # Упрощенная отрисовка при перетаскивании
+        self.smooth = False  # Сглаживание и скругления в полном качестве
 
     @abstractmethod
     def draw(self, canvas, pos: QPoint, painter: QPainter):
@@ -15,4 +18,62 @@ class BaseTool(ABC):
         :param pos: Позиция курсора
         :param painter: Объект QPainter
         """
+        pass
+
+    def draw_stroke(self, canvas, points, painter: QPainter):
+        """
+        Нарисовать штрих целиком по всем точкам.
+        Используется для финального прохода в полном качестве
+        :param points: Точки штриха, начиная с точки нажатия
+        """
+        for previous, pos in zip(points, points[1:]):
+            canvas.lastPoint = previous
+            self.draw(canvas, pos, painter)
+
+    def base_pen(self) -> QPen:
+        """Собственное перо инструмента (полное качество без сглаживания)"""
+        return QPen(self.color, self.size, Qt.PenStyle.SolidLine)
+
+    def make_pen(self, painter: QPainter) -> QPen:
+        """
+        Перо инструмента с учетом режима качества.
+        В быстром режиме без сглаживания и скругленных концов,
+        со сглаживанием - только если оно включено (smooth)
+        """
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing, self.smooth and not self.fast)
+        if self.fast:
+            pen = QPen(self.color, self.size, Qt.PenStyle.SolidLine)
+            pen.setCapStyle(Qt.PenCapStyle.SquareCap)
+            pen.setJoinStyle(Qt.PenJoinStyle.BevelJoin)
+            return pen
+        pen = self.base_pen()
+        if self.smooth:
+            pen.setCapStyle(Qt.PenCapStyle.RoundCap)
+            pen.setJoinStyle(Qt.PenJoinStyle.RoundJoin)
+        return pen
+
+    def pen_margin(self) -> int:
+        """
+        На сколько пикселей штрих выходит за концы отрезка.
+        Квадратный конец на диагонали выступает на size/√2
+        """
+        square = self.fast or (not self.smooth and self.base_pen().capStyle() == Qt.PenCapStyle.SquareCap)
+        if square:
+            return math.ceil(self.size / math.sqrt(2)) + 2
+        return self.size // 2 + 2
+
+    def dirty_rect(self, canvas, pos: QPoint) -> QRect:
+        """
+        Область изображения, которую изменит draw() для данной позиции.
+        По умолчанию - отрезок от canvas.lastPoint до pos с учетом толщины
+        """
+        margin = self.pen_margin()
+        return QRect(canvas.lastPoint, pos).normalized().adjusted(-margin, -margin, margin, margin)
+
+    def paint_overlay(self, painter: QPainter):
+        """
+        Наложение поверх изображения при отрисовке холста
+        (предпросмотр, рамки и т.п.). По умолчанию ничего не рисует
+        :param painter: Объект QPainter виджета холста
+        """
         pass
\ No newline at end of file
@@ -1,8 +1,15 @@
 from .base_tool import BaseTool
-from PyQt6.QtGui import QPen
-from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QPolygon
 
 class BrushTool(BaseTool):
     def draw(self, canvas, pos, painter):
-        painter.setPen(QPen(self.color, self.size, Qt.PenStyle.SolidLine))
-        painter.drawLine(canvas.lastPoint, pos)
\ No newline at end of file
+        painter.setPen(self.make_pen(painter))
+        painter.drawLine(canvas.lastPoint, pos)
+
+    def draw_stroke(self, canvas, points, painter):
+        if not self.smooth:
+            # Без сглаживания - те же отрезки, что и при перетаскивании
+            return super().draw_stroke(canvas, points, painter)
+        # Одна ломаная вместо отдельных отрезков - без наложения концов
+        painter.setPen(self.make_pen(painter))
+        painter.drawPolyline(QPolygon(points))
\ No newline at end of file
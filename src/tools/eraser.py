@@ -1,10 +1,10 @@
 # tools/eraser.py
 
-from .base_tool import BaseTool
-from PyQt6.QtGui import QPen, QColor
+from .brush import BrushTool
+from PyQt6.QtGui import QColor
 from PyQt6.QtCore import Qt
 
-class EraserTool(BaseTool):
+class EraserTool(BrushTool):
     def __init__(self):
         super().__init__()
         # Явно инициализируем белый цвет
@@ -17,8 +17,4 @@ class EraserTool(BaseTool):
     @color.setter
     def color(self, value):
         # Всегда устанавливаем белый, игнорируя входящий цвет
-        self._color = QColor(Qt.GlobalColor.white)
-
-    def draw(self, canvas, pos, painter):
-        painter.setPen(QPen(self.color, self.size, Qt.PenStyle.SolidLine))
-        painter.drawLine(canvas.lastPoint, pos)
\ No newline at end of file
+        self._color = QColor(Qt.GlobalColor.white)
\ No newline at end of file
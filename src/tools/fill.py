@@ -1,10 +1,17 @@
 from .base_tool import BaseTool
 from PyQt6.QtGui import QPen, QBrush
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QRect
 
 class FillTool(BaseTool):
     def draw(self, canvas, pos, painter):
         # Получаем текущий цвет
         painter.setBrush(QBrush(self.color))
         painter.setPen(QPen(self.color, 1, Qt.PenStyle.NoPen))
-        painter.drawRect(0, 0, canvas.width(), canvas.height())
\ No newline at end of file
+        painter.drawRect(0, 0, canvas.width(), canvas.height())
+
+    def dirty_rect(self, canvas, pos):
+        return QRect(0, 0, canvas.width(), canvas.height())
+
+    def draw_stroke(self, canvas, points, painter):
+        # Заливка не зависит от траектории
+        self.draw(canvas, points[-1], painter)
\ No newline at end of file
@@ -0,0 +1,79 @@
+from .base_tool import BaseTool
+from PyQt6.QtGui import QPainter, QColor, QPen
+from PyQt6.QtCore import Qt, QPoint, QRect
+from utils.gradient import render_gradient
+from utils.perf import measure
+
+class GradientTool(BaseTool):
+    """
+    Заливка холста градиентом.
+    Во время перетаскивания показывается уменьшенный предпросмотр поверх
+    холста, в изображение градиент попадает один раз - при отпускании
+    """
+    # Наибольшая сторона предпросмотра при перетаскивании
+    PREVIEW_SIDE = 512
+
+    def __init__(self):
+        super().__init__()
+        self.mode = "linear"
+        self.stops = None  # Опорные цвета; по умолчанию от цвета кисти к белому
+        self.dither = True
+        self.start_point = None
+        self.end_point = None
+        self.preview = None
+        self.target_rect = QRect()
+
+    def draw(self, canvas, pos, painter):
+        # Градиент не рисует в изображение при движении мыши
+        pass
+
+    def color_stops(self):
+        return self.stops or [(0.0, QColor(self.color)), (1.0, QColor(Qt.GlobalColor.white))]
+
+    def press(self, canvas, pos: QPoint):
+        """Начало градиента"""
+        self.start_point = QPoint(pos)
+        self.target_rect = canvas.image.rect()
+        return self.move(canvas, pos)
+
+    def move(self, canvas, pos: QPoint) -> QRect:
+        """Пересчитать предпросмотр. Возвращает область, требующую перерисовки"""
+        self.end_point = QPoint(pos)
+        size = self.target_rect.size()
+        scale = max(1.0, max(size.width(), size.height()) / self.PREVIEW_SIDE)
+        with measure("gradient.preview"):
+            self.preview = render_gradient(
+                max(1, round(size.width() / scale)), max(1, round(size.height() / scale)),
+                self.points()[0], self.points()[1], self.color_stops(), self.mode,
+                dither=False, scale=scale
+            )
+        return self.target_rect
+
+    def release(self, canvas, pos: QPoint):
+        """Построить градиент в полном разрешении и записать в холст одним шагом истории"""
+        self.end_point = QPoint(pos)
+        size = self.target_rect.size()
+        with measure("gradient.render"):
+            image = render_gradient(size.width(), size.height(), *self.points(),
+                                    self.color_stops(), self.mode, dither=self.dither)
+        self.clear()
+        canvas.set_image(image)
+
+    def points(self):
+        """Начальная и конечная точки в виде кортежей координат"""
+        return ((self.start_point.x(), self.start_point.y()),
+                (self.end_point.x(), self.end_point.y()))
+
+    def clear(self):
+        self.start_point = None
+        self.end_point = None
+        self.preview = None
+
+    def paint_overlay(self, painter: QPainter):
+        """Уменьшенный предпросмотр, растянутый на весь холст, и направляющая"""
+        if self.preview is None:
+            return
+        painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+        painter.drawImage(self.target_rect, self.preview)
+        painter.setPen(QPen(QColor(Qt.GlobalColor.black), 1, Qt.PenStyle.DashLine))
+        painter.drawLine(self.start_point, self.end_point)
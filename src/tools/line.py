@@ -1,12 +1,17 @@
 from .base_tool import BaseTool
 from PyQt6.QtGui import QPen, QPainter
-from PyQt6.QtCore import Qt, QPoint
+from PyQt6.QtCore import Qt, QPoint, QRect
 
 class LineTool(BaseTool):
     def __init__(self):
         super().__init__()
         self.start_point = None
 
+    def base_pen(self):
+        pen = super().base_pen()
+        pen.setCapStyle(Qt.PenCapStyle.RoundCap)
+        return pen
+
     def draw(self, canvas, pos, painter):
         """
         Рисование линии от начальной точки до текущей позиции
@@ -15,7 +20,14 @@ class LineTool(BaseTool):
             self.start_point = pos
             return
             
-        pen = QPen(self.color, self.size, Qt.PenStyle.SolidLine)
-        pen.setCapStyle(Qt.PenCapStyle.RoundCap)
-        painter.setPen(pen)
-        painter.drawLine(self.start_point, pos)
\ No newline at end of file
+        painter.setPen(self.make_pen(painter))
+        painter.drawLine(self.start_point, pos)
+
+    def draw_stroke(self, canvas, points, painter):
+        # Линия зависит только от начальной и последней точки
+        self.draw(canvas, points[-1], painter)
+
+    def dirty_rect(self, canvas, pos):
+        start = self.start_point or pos
+        margin = self.pen_margin()
+        return QRect(start, pos).normalized().adjusted(-margin, -margin, margin, margin)
\ No newline at end of file
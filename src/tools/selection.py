@@ -0,0 +1,83 @@
+from .base_tool import BaseTool
+from PyQt6.QtGui import QPen, QColor
+from PyQt6.QtCore import Qt, QRect, QPoint
+
+class SelectionTool(BaseTool):
+    """
+    Прямоугольное выделение.
+    Перемещаемый фрагмент хранится отдельным буфером и накладывается
+    при отрисовке, а в изображение попадает только при фиксации
+    """
+    def __init__(self):
+        super().__init__()
+        self.rect = QRect()          # Выделенная область
+        self.floating = None         # Плавающий фрагмент
+        self.source_rect = QRect()   # Откуда поднят фрагмент (пусто для вставки)
+        self.anchor = None           # Точка начала перетаскивания
+        self.moving = False
+
+    def draw(self, canvas, pos, painter):
+        # Выделение не рисует в изображение при движении мыши
+        pass
+
+    def has_selection(self) -> bool:
+        return not self.rect.isEmpty()
+
+    def press(self, canvas, pos: QPoint):
+        """Начало выделения или перетаскивания"""
+        self.anchor = pos
+        if self.rect.contains(pos):
+            if self.floating is None:
+                # Поднимаем фрагмент: одна копия области, исходник не трогаем
+                self.floating = canvas.image.copy(self.rect)
+                self.source_rect = QRect(self.rect)
+            self.moving = True
+        else:
+            canvas.commit_selection()
+            self.rect = QRect(pos, pos)
+            self.moving = False
+
+    def move(self, canvas, pos: QPoint) -> QRect:
+        """Перетаскивание. Возвращает область, требующую перерисовки"""
+        old_rect = QRect(self.rect)
+        if self.moving:
+            self.rect.translate(pos - self.anchor)
+            self.anchor = pos
+        else:
+            self.rect = QRect(self.anchor, pos).normalized().intersected(canvas.image.rect())
+        return old_rect.united(self.rect).adjusted(-2, -2, 2, 2)
+
+    def release(self, canvas, pos: QPoint):
+        """Окончание выделения или перетаскивания"""
+        self.moving = False
+        self.anchor = None
+
+    def start_floating(self, image, pos: QPoint):
+        """Начать перемещение вставленного фрагмента"""
+        self.floating = image
+        self.source_rect = QRect()
+        self.rect = QRect(pos, image.size())
+
+    def clear(self):
+        """Сбросить выделение и плавающий фрагмент"""
+        self.rect = QRect()
+        self.floating = None
+        self.source_rect = QRect()
+        self.moving = False
+
+    def overlay_rect(self) -> QRect:
+        """Область, которую занимает наложение выделения"""
+        return self.rect.united(self.source_rect).adjusted(-2, -2, 2, 2)
+
+    def paint_overlay(self, painter):
+        """Наложение плавающего фрагмента и рамки выделения"""
+        if self.floating is not None:
+            if not self.source_rect.isEmpty():
+                painter.fillRect(self.source_rect, Qt.GlobalColor.white)
+            painter.drawImage(self.rect.topLeft(), self.floating)
+
+        if self.has_selection():
+            painter.setPen(QPen(QColor(Qt.GlobalColor.white), 1, Qt.PenStyle.SolidLine))
+            painter.drawRect(self.rect.adjusted(0, 0, -1, -1))
+            painter.setPen(QPen(QColor(Qt.GlobalColor.black), 1, Qt.PenStyle.DashLine))
+            painter.drawRect(self.rect.adjusted(0, 0, -1, -1))
@@ -0,0 +1,136 @@
+from .base_tool import BaseTool
+from PyQt6.QtGui import QPainter, QPen, QColor, QFont, QFontMetricsF
+from PyQt6.QtCore import Qt, QPoint, QPointF, QRect, QRectF
+from utils.glyph_cache import GlyphRunCache, split_runs
+from utils.perf import measure
+
+class TextTool(BaseTool):
+    """
+    Текст выбранным шрифтом.
+    Набираемый блок показывается наложением и попадает в изображение
+    только при фиксации. Растры слов берутся из общего кэша, поэтому
+    нажатие клавиши растрирует одно изменяемое слово, а перемещение
+    блока не растрирует ничего
+    """
+    # Растры слов общие для всех вкладок
+    cache = GlyphRunCache()
+
+    def __init__(self):
+        super().__init__()
+        self.font = QFont()
+        self.font.setPointSize(24)
+        self.color = QColor(Qt.GlobalColor.black)
+        self.origin = None     # Левый верхний угол блока; None - блока нет
+        self.text = ""
+        self.placements = []   # (смещение от origin, GlyphRun)
+        self.bounds = QRect()  # Область растров относительно origin
+        self.caret = QRectF()  # Курсор относительно origin
+        self.anchor = None     # Точка начала перетаскивания блока
+
+    def draw(self, canvas, pos, painter):
+        # Текст не рисует в изображение при движении мыши
+        pass
+
+    @property
+    def editing(self) -> bool:
+        return self.origin is not None
+
+    def set_font(self, font: QFont):
+        self.font = QFont(font)
+        self.layout()
+
+    def set_color(self, color):
+        if QColor(color) != self.color:
+            self.color = QColor(color)
+            self.layout()
+
+    def press(self, canvas, pos: QPoint) -> QRect:
+        """Начать блок в точке нажатия или взять текущий для перетаскивания"""
+        if self.editing and self.block_rect().contains(pos):
+            self.anchor = QPoint(pos)
+            return QRect()
+        canvas.commit_text()
+        self.origin = QPoint(pos)
+        self.text = ""
+        self.layout()
+        return self.overlay_rect()
+
+    def move(self, canvas, pos: QPoint) -> QRect:
+        """Перетаскивание блока: растры остаются прежними, меняется только origin"""
+        if self.anchor is None:
+            return QRect()
+        old_rect = self.overlay_rect()
+        self.origin += pos - self.anchor
+        self.anchor = QPoint(pos)
+        return old_rect.united(self.overlay_rect())
+
+    def release(self, canvas, pos: QPoint):
+        self.anchor = None
+
+    def insert(self, text: str) -> QRect:
+        """Добавить набранный текст. Возвращает область, требующую перерисовки"""
+        return self.set_text(self.text + text)
+
+    def backspace(self) -> QRect:
+        return self.set_text(self.text[:-1])
+
+    def set_text(self, text: str) -> QRect:
+        old_rect = self.overlay_rect()
+        self.text = text
+        self.layout()
+        return old_rect.united(self.overlay_rect())
+
+    def layout(self):
+        """
+        Разместить растры слов по строкам.
+        Смещения округляются до целых пикселей, чтобы наложение и
+        зафиксированный текст совпадали попиксельно
+        """
+        self.placements = []
+        self.bounds = QRect()
+        self.caret = QRectF()
+        if not self.editing:
+            return
+        metrics = QFontMetricsF(self.font)
+        with measure("text.layout"):
+            for number, line in enumerate(self.text.split("\n")):
+                baseline = metrics.ascent() + number * metrics.lineSpacing()
+                x = 0.0
+                for run_text in split_runs(line):
+                    run = self.cache.get(self.font, self.color, run_text)
+                    offset = QPoint(round(x + run.offset.x()), round(baseline + run.offset.y()))
+                    self.placements.append((offset, run))
+                    self.bounds = self.bounds.united(QRect(offset, run.image.size()))
+                    x += run.advance
+        # Курсор - в конце последней строки
+        self.caret = QRectF(x, number * metrics.lineSpacing(), 1, metrics.height())
+
+    def block_rect(self) -> QRect:
+        """Область блока на холсте (с пустой строкой для курсора)"""
+        if not self.editing:
+            return QRect()
+        rect = self.bounds.united(self.caret.toAlignedRect())
+        return rect.translated(self.origin)
+
+    def overlay_rect(self) -> QRect:
+        return self.block_rect().adjusted(-2, -2, 2, 2)
+
+    def paint_text(self, painter: QPainter):
+        """Нарисовать блок из кэшированных растров"""
+        for offset, run in self.placements:
+            painter.drawImage(self.origin + offset, run.image)
+
+    def clear(self):
+        self.origin = None
+        self.text = ""
+        self.anchor = None
+        self.layout()
+
+    def paint_overlay(self, painter: QPainter):
+        """Набираемый текст, рамка блока и курсор"""
+        if not self.editing:
+            return
+        self.paint_text(painter)
+        painter.setPen(QPen(QColor(Qt.GlobalColor.gray), 1, Qt.PenStyle.DashLine))
+        painter.drawRect(self.block_rect())
+        painter.fillRect(self.caret.translated(QPointF(self.origin)), self.color)
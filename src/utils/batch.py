@@ -0,0 +1,170 @@
+import argparse
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from PyQt6.QtGui import QImage
+from utils.image_ops import resize_canvas, to_canvas_format, apply_filters, FILTERS
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Расширения, которые подбираются при обработке директории
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".bmp"}
+
+class BatchJob:
+    """Параметры пакетной обработки, передаваемые в рабочие процессы"""
+    def __init__(self, output_dir, size=None, image_format=None, filters=(), quality=-1):
+        self.output_dir = str(output_dir)
+        self.size = size  # (ширина, высота) или None
+        self.image_format = image_format  # None - сохранить исходный формат
+        self.filters = tuple(filters)
+        self.quality = quality
+
+    def output_path(self, path: str, number: int = 1) -> str:
+        """
+        Путь выходного файла для входного.
+        number > 1 - номер файла среди входных с тем же именем результата
+        """
+        source = Path(path)
+        suffix = f".{self.image_format}" if self.image_format else source.suffix
+        stem = source.stem if number == 1 else f"{source.stem}_{number}"
+        return str(Path(self.output_dir) / f"{stem}{suffix}")
+
+class BatchResult:
+    """Итоги пакетной обработки"""
+    def __init__(self):
+        self.processed = 0
+        self.failed = []  # (путь, сообщение)
+        self.elapsed = 0.0
+
+    @property
+    def images_per_sec(self) -> float:
+        return self.processed / self.elapsed if self.elapsed > 0 else 0.0
+
+def iter_input_files(source: str):
+    """
+    Ленивый перебор входных файлов: директория или glob-шаблон.
+    Список целиком в память не собирается
+    """
+    if os.path.isdir(source):
+        with os.scandir(source) as entries:
+            for entry in entries:
+                if entry.is_file() and Path(entry.name).suffix.lower() in IMAGE_EXTENSIONS:
+                    yield entry.path
+    else:
+        for path in glob.iglob(source, recursive=True):
+            if os.path.isfile(path):
+                yield path
+
+def process_file(path: str, output: str, job: BatchJob):
+    """
+    Обработка одного файла (выполняется в рабочем процессе).
+    Возвращает (путь, сообщение об ошибке или None)
+    """
+    image = QImage(path)
+    if image.isNull():
+        return path, "не удалось загрузить изображение"
+
+    if job.size:
+        image = resize_canvas(image, *job.size)
+    else:
+        image = to_canvas_format(image)
+    image = apply_filters(image, job.filters)
+
+    if not image.save(output, None, job.quality):
+        return path, f"не удалось сохранить {output}"
+    return path, None
+
+def run_batch(files, job: BatchJob, workers=None, max_pending=None) -> BatchResult:
+    """
+    Обработать файлы в пуле процессов.
+    Одновременно в работе не больше max_pending файлов, поэтому память
+    ограничена независимо от длины списка (кроме множества имен результатов).
+    Файлы с одинаковым именем из разных директорий получают номер: img.png, img_2.png.
+    Исключение при обработке файла записывается в его ошибки и не прерывает пакет
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or workers * 2
+    Path(job.output_dir).mkdir(parents=True, exist_ok=True)
+
+    result = BatchResult()
+    start = time.perf_counter()
+    outputs = set()  # Уже назначенные выходные файлы
+
+    def assign_output(path):
+        number = 1
+        output = job.output_path(path)
+        while output in outputs:
+            number += 1
+            output = job.output_path(path, number)
+        if number > 1:
+            logger.warning(f"Имя результата {path} уже занято, файл сохраняется как {output}")
+        outputs.add(output)
+        return output
+
+    def fail(path, error):
+        result.failed.append((path, error))
+        logger.error(f"Ошибка обработки {path}: {error}")
+
+    def collect(done):
+        for future in done:
+            path = pending.pop(future)
+            try:
+                _, error = future.result()
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            if error:
+                fail(path, error)
+            else:
+                result.processed += 1
+                logger.debug(f"Обработан файл: {path}")
+
+    pending = {}  # future -> входной файл
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for path in files:
+            if len(pending) >= max_pending:
+                collect(wait(pending, return_when=FIRST_COMPLETED).done)
+            try:
+                pending[executor.submit(process_file, path, assign_output(path), job)] = path
+            except BrokenProcessPool as e:
+                fail(path, f"{type(e).__name__}: {e}")
+        collect(wait(pending).done)
+
+    result.elapsed = time.perf_counter() - start
+    logger.info(
+        f"Пакетная обработка завершена: {result.processed} изображений, "
+        f"ошибок: {len(result.failed)}, {result.elapsed:.2f} сек. "
+        f"({result.images_per_sec:.1f} изобр./сек.)"
+    )
+    return result
+
+def parse_size(value: str):
+    """Разбор размера в виде ШИРИНАxВЫСОТА"""
+    try:
+        width, height = (int(part) for part in value.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Неверный размер: {value} (ожидается 800x600)")
+    return width, height
+
+def main(argv=None) -> int:
+    """Точка входа пакетного режима"""
+    parser = argparse.ArgumentParser(prog="rastro --batch", description="Пакетная обработка изображений")
+    parser.add_argument("source", help="директория или glob-шаблон входных файлов")
+    parser.add_argument("-o", "--output", required=True, help="директория для результатов")
+    parser.add_argument("--size", type=parse_size, help="размер холста, например 800x600")
+    parser.add_argument("--format", dest="image_format", help="формат результата (png, jpg, bmp)")
+    parser.add_argument("--filter", dest="filters", action="append", default=[],
+                        choices=sorted(FILTERS), help="фильтр (можно указать несколько раз)")
+    parser.add_argument("--quality", type=int, default=-1, help="качество сжатия 0-100")
+    parser.add_argument("--workers", type=int, help="число рабочих процессов")
+    args = parser.parse_args(argv)
+
+    job = BatchJob(args.output, args.size, args.image_format, args.filters, args.quality)
+    result = run_batch(iter_input_files(args.source), job, workers=args.workers)
+
+    print(f"Обработано: {result.processed}, ошибок: {len(result.failed)}, "
+          f"{result.images_per_sec:.1f} изобр./сек.")
+    return 0 if not result.failed else 1
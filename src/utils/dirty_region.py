@@ -0,0 +1,51 @@
+from PyQt6.QtGui import QImage
+from PyQt6.QtCore import QRect, QPoint
+from utils.pixel_format import blit
+
+class DirtyRegion:
+    """
+    Накопление измененной области во время правки.
+    Перед рисованием запоминает исходное содержимое затрагиваемых плиток,
+    поэтому прежнее состояние области можно получить без копии всего изображения
+    """
+    TILE_SIZE = 64
+
+    def __init__(self):
+        self.rect = QRect()
+        self.tiles = {}  # (столбец, строка) -> исходное содержимое плитки
+
+    def is_empty(self) -> bool:
+        return self.rect.isEmpty()
+
+    def touch(self, image: QImage, rect: QRect):
+        """Отметить область, которая сейчас будет изменена"""
+        rect = rect.intersected(image.rect())
+        if rect.isEmpty():
+            return
+        size = self.TILE_SIZE
+        for row in range(rect.top() // size, rect.bottom() // size + 1):
+            for col in range(rect.left() // size, rect.right() // size + 1):
+                if (col, row) not in self.tiles:
+                    self.tiles[(col, row)] = image.copy(col * size, row * size, size, size)
+        self.rect = self.rect.united(rect)
+
+    def before_image(self, image: QImage) -> QImage:
+        """Содержимое накопленной области до изменения"""
+        region = image.copy(self.rect)
+        size = self.TILE_SIZE
+        for (col, row), tile in self.tiles.items():
+            blit(region, QPoint(col * size - self.rect.left(), row * size - self.rect.top()), tile)
+        return region
+
+    def restore(self, image: QImage, rect: QRect):
+        """Вернуть исходное содержимое в пределах rect"""
+        rect = rect.intersected(self.rect)
+        if rect.isEmpty():
+            return
+        size = self.TILE_SIZE
+        for (col, row), tile in self.tiles.items():
+            blit(image, QPoint(col * size, row * size), tile, rect)
+
+    def reset(self):
+        self.rect = QRect()
+        self.tiles = {}
@@ -0,0 +1,174 @@
+import tempfile
+import zlib
+from collections import OrderedDict
+from PyQt6.QtGui import QImage
+from utils.history_manager import RegionPatch, ImageOperation, SharedState
+from utils.tile_pool import TiledState
+import logging
+
+logger = logging.getLogger(__name__)
+
+class PackedImage:
+    """Сжатые пиксели изображения; сжатые данные можно вынести во временный файл"""
+    def __init__(self, image: QImage, level: int = 1):
+        self.width = image.width()
+        self.height = image.height()
+        self.format = image.format()
+        self.bytes_per_line = image.bytesPerLine()
+        self.color_table = image.colorTable()
+        bits = image.constBits()
+        bits.setsize(image.sizeInBytes())
+        self.data = zlib.compress(bits, level)
+        self.file = None
+        self.offset = 0
+        self.length = len(self.data)
+
+    def nbytes(self) -> int:
+        """Занимаемая память (ноль, если данные на диске)"""
+        return 0 if self.data is None else self.length
+
+    def spill(self, file):
+        """Перенести сжатые данные в файл"""
+        if self.data is None:
+            return
+        file.seek(0, 2)
+        self.file = file
+        self.offset = file.tell()
+        file.write(self.data)
+        self.data = None
+
+    def unpack(self) -> QImage:
+        data = self.data
+        if data is None:
+            self.file.seek(self.offset)
+            data = self.file.read(self.length)
+        raw = zlib.decompress(data)
+        # Копия отвязывает изображение от временного буфера raw
+        image = QImage(raw, self.width, self.height, self.bytes_per_line, self.format).copy()
+        image.setColorTable(self.color_table)
+        return image
+
+class SuspendedDocument:
+    """
+    Неактивный документ в упакованном виде: текущее изображение и история.
+    Плитки, общие для нескольких снимков, упаковываются один раз.
+    На диск документ выносится в собственный временный файл, который
+    закрывается (и удаляется) при восстановлении
+    """
+    def __init__(self, image: QImage, history):
+        packed = {}  # id(изображение) -> PackedImage
+
+        def pack(item):
+            if id(item) not in packed:
+                packed[id(item)] = PackedImage(item)
+            return packed[id(item)]
+
+        def pack_entry(entry):
+            if isinstance(entry, TiledState):
+                return ("tiles", entry.size(), entry.format(), [pack(tile) for tile in entry.tiles])
+            if isinstance(entry, SharedState):
+                return ("image", pack(entry.image))
+            if isinstance(entry, ImageOperation):
+                return ("operation", entry.name)
+            return ("patch", entry.rects, [pack(region) for region in entry.before],
+                    [pack(region) for region in entry.after])
+
+        self.image = pack(image)
+        self.undo = [pack_entry(entry) for entry in history.undo_stack]
+        self.redo = [pack_entry(entry) for entry in history.redo_stack]
+        self.packed = list(packed.values())
+        self.file = None
+
+    def nbytes(self) -> int:
+        return sum(item.nbytes() for item in self.packed)
+
+    def spill(self):
+        if self.file is None:
+            self.file = tempfile.TemporaryFile(prefix="rastro-")
+        for item in self.packed:
+            item.spill(self.file)
+
+    def close(self):
+        """Освободить временный файл"""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def restore(self, history) -> QImage:
+        """Вернуть историю на место и получить текущее изображение"""
+        unpacked = {}
+
+        def unpack(item):
+            if id(item) not in unpacked:
+                unpacked[id(item)] = item.unpack()
+            return unpacked[id(item)]
+
+        def unpack_entry(entry):
+            if entry[0] == "tiles":
+                _, size, image_format, tiles = entry
+                return TiledState.from_tiles(size, image_format, [unpack(tile) for tile in tiles])
+            if entry[0] == "image":
+                return SharedState(unpack(entry[1]))
+            if entry[0] == "operation":
+                return ImageOperation(entry[1])
+            _, rects, before, after = entry
+            return RegionPatch.from_regions(rects, [unpack(region) for region in before],
+                                            [unpack(region) for region in after])
+
+        history.undo_stack = [unpack_entry(entry) for entry in self.undo]
+        history.redo_stack = [unpack_entry(entry) for entry in self.redo]
+        image = unpack(self.image)
+        self.close()
+        return image
+
+class DocumentMemory:
+    """
+    Общий бюджет памяти открытых документов.
+    Когда сумма превышает бюджет, неактивные документы в порядке давности
+    использования сначала сжимаются в памяти, затем выносятся на диск.
+    При активации документ восстанавливается
+    """
+    def __init__(self, budget_bytes: int = 2 * 1024 ** 3):
+        self.budget_bytes = budget_bytes
+        self.documents = OrderedDict()  # холст -> None, последний - активный
+
+    def add(self, canvas):
+        self.documents[canvas] = None
+        self.activate(canvas)
+
+    def remove(self, canvas):
+        self.documents.pop(canvas, None)
+        if canvas.is_suspended():
+            canvas.suspended.close()
+
+    def activate(self, canvas):
+        """Сделать документ активным (восстановить, если он упакован)"""
+        if canvas.is_suspended():
+            canvas.resume()
+        self.documents.move_to_end(canvas)
+        self.enforce()
+
+    def usage(self) -> int:
+        return sum(canvas.memory_bytes() for canvas in self.documents)
+
+    def enforce(self):
+        """Упаковать давно неиспользуемые документы, пока не уложимся в бюджет"""
+        # Загружаемый или масштабируемый документ еще получит изображение - не трогаем
+        inactive = [canvas for canvas in list(self.documents)[:-1] if not canvas.is_busy()]
+        total = self.usage()
+        for canvas in inactive:
+            if total <= self.budget_bytes:
+                return
+            if not canvas.is_suspended():
+                before = canvas.memory_bytes()
+                canvas.suspend()
+                total -= before - canvas.memory_bytes()
+                logger.info(f"Документ сжат: {before // 1024} КБ -> {canvas.memory_bytes() // 1024} КБ")
+        for canvas in inactive:
+            if total <= self.budget_bytes:
+                return
+            before = canvas.memory_bytes()
+            if before:
+                canvas.suspended.spill()
+                total -= before
+                logger.info(f"Документ вынесен на диск: {before // 1024} КБ")
@@ -0,0 +1,131 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from PyQt6.QtGui import QImage, QImageWriter
+from PyQt6.QtCore import QThread, QSize, Qt, pyqtSignal
+from utils.quantize import quantize
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Форматы, доступные для экспорта
+EXPORT_FORMATS = ("png", "jpg", "webp", "bmp", "tiff")
+
+class ExportTarget:
+    """
+    Одна цель экспорта.
+    max_side - наибольшая сторона результата (None - исходный размер),
+    quality - качество 0..100 (JPEG, WebP), compression - степень сжатия 0..9 (PNG, TIFF);
+    -1 оставляет значение кодировщика по умолчанию.
+    colors - размер палитры для 8-битного индексного файла (0 - полноцветный),
+    dither - упорядоченное сглаживание при переходе к палитре
+    """
+    def __init__(self, suffix: str, max_side=None, image_format="png", quality=-1, compression=-1,
+                 colors=0, dither=False):
+        self.suffix = suffix
+        self.max_side = max_side
+        self.image_format = image_format
+        self.quality = quality
+        self.compression = compression
+        self.colors = colors
+        self.dither = dither
+
+    def target_size(self, size: QSize) -> QSize:
+        """Размер результата с сохранением пропорций, без увеличения"""
+        if not self.max_side or max(size.width(), size.height()) <= self.max_side:
+            return QSize(size)
+        return size.scaled(QSize(self.max_side, self.max_side), Qt.AspectRatioMode.KeepAspectRatio)
+
+    def output_path(self, directory: str, stem: str) -> str:
+        name = f"{stem}_{self.suffix}" if self.suffix else stem
+        return os.path.join(directory, f"{name}.{self.image_format}")
+
+def default_profile():
+    """Набор целей по умолчанию: полный PNG, JPEG для веба и миниатюра"""
+    return [
+        ExportTarget("full", None, "png", compression=6),
+        ExportTarget("web", 1920, "jpg", quality=85),
+        ExportTarget("thumb", 256, "jpg", quality=80),
+    ]
+
+def halve(image: QImage) -> QImage:
+    """Уменьшение ровно вдвое"""
+    return image.scaled(max(1, image.width() // 2), max(1, image.height() // 2),
+                        Qt.AspectRatioMode.IgnoreAspectRatio, Qt.TransformationMode.SmoothTransformation)
+
+def downscale_chain(image: QImage, sizes):
+    """
+    Построить уменьшенные копии для всех размеров за один проход.
+    Размеры обходятся по убыванию, каждая ступень получается делением
+    предыдущей пополам, а до точного размера доводится только последний шаг.
+    Возвращает словарь размер -> изображение
+    """
+    results = {}
+    level = image
+    for size in sorted({(s.width(), s.height()) for s in sizes}, reverse=True):
+        width, height = size
+        while level.width() // 2 >= width and level.height() // 2 >= height:
+            level = halve(level)
+        if (level.width(), level.height()) == size:
+            results[size] = level
+        else:
+            results[size] = level.scaled(width, height, Qt.AspectRatioMode.IgnoreAspectRatio,
+                                         Qt.TransformationMode.SmoothTransformation)
+    return results
+
+def encode(image: QImage, path: str, target: ExportTarget):
+    """Записать изображение в файл. Возвращает сообщение об ошибке или None"""
+    writer = QImageWriter(path, target.image_format.encode())
+    if target.quality >= 0:
+        writer.setQuality(target.quality)
+    if target.compression >= 0:
+        writer.setCompression(target.compression)
+    if target.colors:
+        image = quantize(image, target.colors, target.dither)
+    if not writer.write(image):
+        return writer.errorString()
+    return None
+
+def export_all(image: QImage, directory: str, stem: str, targets, workers=None):
+    """
+    Экспорт во все цели за одну операцию: общая цепочка уменьшения,
+    затем параллельное кодирование. Возвращает список (путь, ошибка или None)
+    """
+    start = time.perf_counter()
+    os.makedirs(directory, exist_ok=True)
+    sizes = {id(target): target.target_size(image.size()) for target in targets}
+    scaled = downscale_chain(image, sizes.values())
+
+    def run(target):
+        size = sizes[id(target)]
+        path = target.output_path(directory, stem)
+        return path, encode(scaled[(size.width(), size.height())], path, target)
+
+    workers = workers or min(len(targets), os.cpu_count() or 1) or 1
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(run, targets))
+
+    for path, error in results:
+        if error:
+            logger.error(f"Ошибка экспорта {path}: {error}")
+    logger.info(f"Экспорт {len(targets)} целей за {time.perf_counter() - start:.2f} с")
+    return results
+
+class ExportThread(QThread):
+    """Экспорт в фоновом потоке"""
+    finished_export = pyqtSignal(list)
+    failed = pyqtSignal(str)
+
+    def __init__(self, image: QImage, directory: str, stem: str, targets, parent=None):
+        super().__init__(parent)
+        self.image = QImage(image)
+        self.directory = directory
+        self.stem = stem
+        self.targets = targets
+
+    def run(self):
+        try:
+            self.finished_export.emit(export_all(self.image, self.directory, self.stem, self.targets))
+        except Exception as e:
+            logger.error(f"Ошибка экспорта: {str(e)}")
+            self.failed.emit(str(e))
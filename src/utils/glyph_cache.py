@@ -0,0 +1,84 @@
+import math
+import re
+import threading
+from collections import OrderedDict
+from PyQt6.QtGui import QImage, QPainter, QFont, QFontMetricsF, QColor
+from PyQt6.QtCore import Qt, QPointF
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Отрезки строки, растрируемые отдельно: слово вместе с пробелами после него
+RUN_PATTERN = re.compile(r"\S+\s*|\s+")
+
+class GlyphRun:
+    """Растр отрезка текста. offset - смещение растра от точки начала отрезка на базовой линии"""
+    def __init__(self, image: QImage, offset: QPointF, advance: float):
+        self.image = image
+        self.offset = offset
+        self.advance = advance
+
+class GlyphRunCache:
+    """
+    Кэш растров отрезков текста по (шрифт, цвет, текст).
+    Отрезки - слова, поэтому при наборе заново формируется и растрируется
+    только изменяемое слово. Объем ограничен max_bytes, вытесняются давно
+    не использованные растры
+    """
+    def __init__(self, max_bytes: int = 16 * 1024 ** 2):
+        self.max_bytes = max_bytes
+        self.runs = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, font: QFont, color: QColor, text: str) -> GlyphRun:
+        key = (font.key(), color.rgba(), text)
+        with self._lock:
+            run = self.runs.get(key)
+            if run is not None:
+                self.runs.move_to_end(key)
+                self.hits += 1
+                return run
+        run = self.rasterize(font, color, text)
+        with self._lock:
+            self.misses += 1
+            self.runs[key] = run
+            self.nbytes += run.image.sizeInBytes()
+            while self.nbytes > self.max_bytes and len(self.runs) > 1:
+                _, evicted = self.runs.popitem(last=False)
+                self.nbytes -= evicted.image.sizeInBytes()
+        return run
+
+    @staticmethod
+    def rasterize(font: QFont, color: QColor, text: str) -> GlyphRun:
+        """Сформировать и растрировать отрезок с полупрозрачными краями"""
+        metrics = QFontMetricsF(font)
+        advance = metrics.horizontalAdvance(text)
+        bounds = metrics.tightBoundingRect(text) if text.strip() else metrics.boundingRect(text)
+        # Запас на выступы глифов за пределы ширины и высоты строки
+        pad = math.ceil(metrics.height() / 4) + 1
+        left = math.floor(min(0.0, bounds.left())) - pad
+        top = math.floor(-metrics.ascent()) - pad
+        width = max(1, math.ceil(max(advance, bounds.right())) - left + pad)
+        height = max(1, math.ceil(metrics.descent()) - top + pad)
+        image = QImage(width, height, QImage.Format.Format_ARGB32_Premultiplied)
+        image.fill(Qt.GlobalColor.transparent)
+        if text.strip():
+            painter = QPainter(image)
+            painter.setRenderHint(QPainter.RenderHint.TextAntialiasing)
+            painter.setFont(font)
+            painter.setPen(color)
+            painter.drawText(QPointF(-left, -top), text)
+            painter.end()
+        return GlyphRun(image, QPointF(left, top), advance)
+
+    def clear(self):
+        with self._lock:
+            self.runs.clear()
+            self.nbytes = 0
+
+def split_runs(line: str):
+    """Разбить строку на отрезки для кэша"""
+    return RUN_PATTERN.findall(line)
@@ -0,0 +1,109 @@
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PyQt6.QtGui import QColor, QImage
+from utils.image_array import image_view
+import logging
+
+logger = logging.getLogger(__name__)
+
+MODES = {
+    "linear": "Линейный",
+    "radial": "Радиальный",
+    "angular": "Угловой",
+}
+
+# Число уровней таблицы цветов вдоль градиента
+LUT_SIZE = 1024
+
+# Матрица упорядоченного сглаживания Байера 4x4, пороги 0..15
+BAYER_4 = np.array([
+    [0, 8, 2, 10],
+    [12, 4, 14, 6],
+    [3, 11, 1, 9],
+    [15, 7, 13, 5],
+], np.uint16)
+
+def parse_stops(text: str):
+    """Разобрать опорные цвета из строки вида '0:#000000, 0.5:#ff0000, 1:#ffffff'"""
+    stops = []
+    for item in text.split(","):
+        position, _, name = item.strip().partition(":")
+        color = QColor(name.strip())
+        if not color.isValid():
+            raise ValueError(f"Неверный цвет: {name.strip()}")
+        stops.append((min(max(float(position), 0.0), 1.0), color))
+    if len(stops) < 2:
+        raise ValueError("Нужно не меньше двух опорных цветов")
+    return sorted(stops, key=lambda stop: stop[0])
+
+def format_stops(stops) -> str:
+    return ", ".join(f"{position:g}:{color.name()}" for position, color in stops)
+
+def color_lut(stops, size: int = LUT_SIZE, dither: bool = True) -> np.ndarray:
+    """
+    Таблица упакованных цветов Format_RGB32 вдоль градиента.
+    Со сглаживанием - 16 таблиц подряд, по одной на порог Байера:
+    таблица d округляет уровень вверх, если его дробная часть больше (16 - d) / 16
+    """
+    positions = np.array([position for position, _ in stops])
+    channels = np.array([[color.blue(), color.green(), color.red(), 255] for _, color in stops], np.float64)
+    samples = np.linspace(0.0, 1.0, size)
+    levels = np.stack([np.interp(samples, positions, channels[:, channel]) for channel in range(4)], axis=1)
+    # Уровни в 1/16 долях: младшие 4 бита - дробная часть
+    levels = np.round(levels * 16).astype(np.uint16)
+    thresholds = np.arange(16, dtype=np.uint16) if dither else np.array([8], np.uint16)
+    lut = np.minimum((levels[np.newaxis] + thresholds[:, np.newaxis, np.newaxis]) >> 4, 255)
+    lut[..., 3] = 255
+    return lut.astype(np.uint8).view(np.uint32).reshape(-1)
+
+def gradient_parameter(mode: str, x: np.ndarray, y: np.ndarray, start, end) -> np.ndarray:
+    """
+    Положение точек вдоль градиента (0 - начало, 1 - конец).
+    x - строка координат формы (1, w), y - столбец формы (h, 1)
+    """
+    dx, dy = end[0] - start[0], end[1] - start[1]
+    length2 = dx * dx + dy * dy or 1.0
+    x = x - np.float32(start[0])
+    y = y - np.float32(start[1])
+    if mode == "linear":
+        # Линейная функция координат: строка и столбец складываются без полной сетки
+        return x * np.float32(dx / length2) + y * np.float32(dy / length2)
+    if mode == "radial":
+        return np.hypot(x, y) * np.float32(1.0 / math.sqrt(length2))
+    if mode == "angular":
+        angle = np.arctan2(y, x) - np.float32(math.atan2(dy, dx))
+        return (angle * np.float32(0.5 / math.pi)) % np.float32(1.0)
+    raise ValueError(f"Неизвестный тип градиента: {mode}")
+
+def render_gradient(width: int, height: int, start, end, stops, mode: str = "linear",
+                    dither: bool = True, scale: float = 1.0, workers: int = None,
+                    band_rows: int = 64) -> QImage:
+    """
+    Градиент в новом изображении Format_RGB32.
+    start и end - точки в координатах полного изображения; scale > 1 строит
+    уменьшенную копию (предпросмотр), где пиксель покрывает scale исходных.
+    Полосы строк считаются параллельно; цвет каждого пикселя - одна выборка
+    из таблицы с учетом порога Байера, чтобы не было ступенек
+    """
+    image = QImage(width, height, QImage.Format.Format_RGB32)
+    output = image_view(image, writable=True).view(np.uint32)[..., 0]
+    lut = color_lut(stops, dither=dither)
+    xs = ((np.arange(width, dtype=np.float32) + 0.5) * np.float32(scale))[np.newaxis, :]
+    # Смещение в таблице по порогу Байера для каждой из 4 строк узора
+    bayer_offsets = (BAYER_4[:, np.arange(width) % 4].astype(np.int32) * LUT_SIZE) if dither else None
+
+    def render_band(top):
+        bottom = min(top + band_rows, height)
+        ys = ((np.arange(top, bottom, dtype=np.float32) + 0.5) * np.float32(scale))[:, np.newaxis]
+        position = gradient_parameter(mode, xs, ys, start, end)
+        index = np.clip(position * np.float32(LUT_SIZE - 1) + np.float32(0.5), 0, LUT_SIZE - 1).astype(np.int32)
+        if dither:
+            index += bayer_offsets[np.arange(top, bottom) % 4]
+        np.take(lut, index, out=output[top:bottom])
+
+    workers = workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(render_band, range(0, height, band_rows)))
+    return image
@@ -1,75 +1,321 @@
-from PyQt6.QtGui import QImage, QPainter
-from PyQt6.QtCore import Qt, QPoint
+from PyQt6.QtGui import QImage
+from PyQt6.QtCore import Qt, QRect
+from PyQt6.QtGui import QTransform
+from utils.image_ops import resize_canvas
+from utils.pixel_format import blit, is_indexed
+from utils.tile_pool import TilePool, TiledState
+import time
 import logging
 
 logger = logging.getLogger(__name__)
 
+class RegionPatch:
+    """
+    Шаг истории, затрагивающий только прямоугольные области изображения.
+    Хранит содержимое областей до и после изменения
+    """
+    def __init__(self, image: QImage, rects):
+        bounds = image.rect()
+        self.rects = [rect.intersected(bounds) for rect in rects]
+        self.rects = [rect for rect in self.rects if not rect.isEmpty()]
+        self.before = [image.copy(rect) for rect in self.rects]
+        self.after = []
+
+    @classmethod
+    def from_regions(cls, rects, before, after):
+        """Собрать изменение из готовых областей"""
+        patch = cls.__new__(cls)
+        patch.rects = list(rects)
+        patch.before = list(before)
+        patch.after = list(after)
+        return patch
+
+    def finish(self, image: QImage):
+        """Запомнить содержимое областей после изменения"""
+        self.after = [image.copy(rect) for rect in self.rects]
+        return self
+
+    def bounding_rect(self) -> QRect:
+        """Общий прямоугольник всех областей"""
+        result = QRect()
+        for rect in self.rects:
+            result = result.united(rect)
+        return result
+
+    def content_before(self, image: QImage) -> QImage:
+        """
+        Содержимое общего прямоугольника до изменения.
+        image - изображение в состоянии после изменения
+        """
+        return self._compose(image, reversed(list(zip(self.rects, self.before))))
+
+    def content_after(self, image: QImage) -> QImage:
+        """
+        Содержимое общего прямоугольника после изменения.
+        image - изображение в состоянии до изменения
+        """
+        return self._compose(image, zip(self.rects, self.after))
+
+    def _compose(self, image: QImage, regions) -> QImage:
+        bounds = self.bounding_rect()
+        result = image.copy(bounds)
+        for rect, region in regions:
+            blit(result, rect.topLeft() - bounds.topLeft(), region)
+        return result
+
+    def _paint(self, image: QImage, regions) -> QImage:
+        for rect, region in regions:
+            blit(image, rect.topLeft(), region)
+        return image
+
+    def apply(self, image: QImage) -> QImage:
+        """Повторить изменение на изображении (на месте)"""
+        return self._paint(image, zip(self.rects, self.after))
+
+    def revert(self, image: QImage) -> QImage:
+        """Отменить изменение на изображении (на месте)"""
+        return self._paint(image, reversed(list(zip(self.rects, self.before))))
+
+class ImageOperation:
+    """
+    Шаг истории - обратимое преобразование всего изображения.
+    Пиксели не хранятся: отмена выполняет обратное преобразование
+    """
+    # Имя -> имя обратного преобразования
+    INVERSES = {
+        "flip_horizontal": "flip_horizontal",
+        "flip_vertical": "flip_vertical",
+        "rotate_180": "rotate_180",
+        "invert": "invert",
+        "rotate_cw": "rotate_ccw",
+        "rotate_ccw": "rotate_cw",
+    }
+
+    def __init__(self, name: str):
+        if name not in self.INVERSES:
+            raise ValueError(f"Неизвестное преобразование: {name}")
+        self.name = name
+
+    @staticmethod
+    def perform(name: str, image: QImage) -> QImage:
+        """Выполнить преобразование. Отражения и инверсия меняют image на месте"""
+        if name == "flip_horizontal":
+            image.flip(Qt.Orientation.Horizontal)
+        elif name == "flip_vertical":
+            image.flip(Qt.Orientation.Vertical)
+        elif name == "rotate_180":
+            image.flip(Qt.Orientation.Horizontal | Qt.Orientation.Vertical)
+        elif name == "invert":
+            if is_indexed(image):
+                # Номера цветов остаются, инвертируется палитра
+                image.setColorTable([color ^ 0xFFFFFF for color in image.colorTable()])
+            else:
+                image.invertPixels()
+        else:
+            # Поворот на 90 градусов меняет размеры, нужен новый буфер
+            return image.transformed(QTransform().rotate(90 if name == "rotate_cw" else -90))
+        return image
+
+    def apply(self, image: QImage) -> QImage:
+        """Повторить преобразование"""
+        return self.perform(self.name, image)
+
+    def revert(self, image: QImage) -> QImage:
+        """Отменить преобразование обратным"""
+        return self.perform(self.INVERSES[self.name], image)
+
+class SharedState:
+    """
+    Полный снимок без копирования - неявно разделяемая копия QImage поверх
+    внешнего буфера (например, отображенного в память файла).
+    owner держит буфер живым, пока снимок в истории
+    """
+    def __init__(self, image: QImage, owner=None):
+        self.image = QImage(image)
+        self.owner = owner if owner is not None else image
+
+    def copy(self) -> QImage:
+        return self.image.copy()
+
+    def size(self):
+        return self.image.size()
+
+def is_snapshot(entry) -> bool:
+    """Элемент истории - полный снимок (а не изменение областей или преобразование)"""
+    return not isinstance(entry, (RegionPatch, ImageOperation))
+
 class HistoryManager:
     def __init__(self, max_steps=30):
+        # Элемент стека - полный снимок (TiledState или SharedState), изменение областей (RegionPatch)
+        # или преобразование всего изображения (ImageOperation)
         self.undo_stack = []
         self.redo_stack = []
         self.max_steps = max_steps
+        self.pool = TilePool()
+        self.deferred = []  # снимки с еще не скопированными плитками
         logger.info(f"Инициализирован менеджер истории (макс. шагов: {max_steps})")
-    
-    def push_state(self, image: QImage):
-        """Сохранить новое состояние"""
-        # Создаем полную копию изображения с сохранением размера
-        state = QImage(image.size(), image.format())
-        state.fill(Qt.GlobalColor.white)
-        
-        painter = QPainter(state)
-        painter.drawImage(QPoint(0, 0), image)
-        painter.end()
-        
+
+    def push_state(self, image: QImage, changed: QRect = None, deferred=False):
+        """
+        Сохранить новое состояние.
+        changed - область, измененная с предыдущего состояния: если он тоже
+        снимок, копируются только плитки этой области, остальные берутся по ссылке.
+        deferred - копирование плиток выполнит finalize(); до этого image
+        нельзя менять
+        """
+        base = self.undo_stack[-1] if self.undo_stack else None
+        if not isinstance(base, TiledState):
+            base = None
+        state = TiledState(image, base, changed, deferred)
+        if deferred:
+            self.deferred.append(state)
+
         self.undo_stack.append(state)
         self.redo_stack.clear()
-        
-        if len(self.undo_stack) > self.max_steps:
-            self.undo_stack.pop(0)
-        
+        self._trim()
+
         logger.debug(f"Сохранено новое состояние (всего: {len(self.undo_stack)}, размер: {state.size()})")
-    
-    def undo(self) -> QImage:
-        """Отменить последнее действие"""
+
+    def push_shared(self, image: QImage, owner=None):
+        """
+        Сохранить состояние без копирования - неявно разделяемой копией QImage.
+        Подходит для изображения поверх отображенного файла: холст получит
+        собственную копию пикселей только при первой правке.
+        owner - объект, владеющий буфером (по умолчанию сам image)
+        """
+        self.undo_stack.append(SharedState(image, owner))
+        self.redo_stack.clear()
+        self._trim()
+
+    def push_patch(self, patch: RegionPatch):
+        """Сохранить изменение отдельных областей без полного снимка"""
+        self.undo_stack.append(patch)
+        self.redo_stack.clear()
+        self._trim()
+
+        logger.debug(f"Сохранено изменение областей (всего: {len(self.undo_stack)}, область: {patch.bounding_rect()})")
+
+    def push_operation(self, operation: ImageOperation):
+        """Сохранить преобразование всего изображения (без пикселей)"""
+        self.undo_stack.append(operation)
+        self.redo_stack.clear()
+        self._trim()
+
+        logger.debug(f"Сохранено преобразование {operation.name} (всего: {len(self.undo_stack)})")
+
+    def _trim(self):
+        """Удалить самые старые шаги сверх лимита"""
+        while len(self.undo_stack) > self.max_steps:
+            # Нижний элемент стека всегда должен быть полным снимком
+            entry = self.undo_stack[1]
+            if isinstance(entry, RegionPatch):
+                # Плитки берутся по ссылке только у мозаичного снимка
+                base = self.undo_stack[0] if isinstance(self.undo_stack[0], TiledState) else None
+                self.undo_stack[1] = TiledState(self.materialize(1), base, entry.bounding_rect())
+            elif not is_snapshot(entry):
+                self.undo_stack[1] = TiledState(self.materialize(1))
+            self.undo_stack.pop(0)
+
+    def materialize(self, index: int) -> QImage:
+        """Восстановить полное изображение состояния с номером index"""
+        base = index
+        while not is_snapshot(self.undo_stack[base]):
+            base -= 1
+        image = self.undo_stack[base].copy()
+        for entry in self.undo_stack[base + 1:index + 1]:
+            image = entry.apply(image)
+        return image
+
+    def resize_states(self, width: int, height: int):
+        """Привести все состояния истории к новому размеру холста"""
+        self.undo_stack = [
+            TiledState(resize_canvas(self.materialize(index), width, height))
+            for index in range(len(self.undo_stack))
+        ]
+        self.redo_stack.clear()
+
+    def finalize(self, time_budget: float = None) -> bool:
+        """
+        Скопировать плитки отложенных снимков.
+        Без time_budget выполняется полностью. Возвращает True, если работа осталась
+        """
+        deadline = time.perf_counter() + time_budget if time_budget is not None else None
+        while self.deferred:
+            if not self.deferred[0].fill(deadline):
+                return True
+            self.deferred.pop(0)
+        return False
+
+    def compact(self, time_budget: float = None) -> bool:
+        """
+        Объединить одинаковые плитки снимков через общий пул.
+        Хеширование выполняется здесь, а не при сохранении состояния, чтобы
+        его можно было вызывать порциями в простое. Возвращает True, если
+        работа осталась
+        """
+        deadline = time.perf_counter() + time_budget if time_budget is not None else None
+        for entry in self.undo_stack + self.redo_stack:
+            if isinstance(entry, TiledState) and not entry.intern_pending(self.pool, deadline):
+                return True
+        self.pool.end_pass()
+        return False
+
+    def memory_bytes(self) -> int:
+        """Объем пикселей, занятый историей (общие плитки учитываются один раз)"""
+        seen = {}
+        for entry in self.undo_stack + self.redo_stack:
+            if isinstance(entry, TiledState):
+                images = entry.tiles
+            elif isinstance(entry, RegionPatch):
+                images = entry.before + entry.after
+            elif isinstance(entry, ImageOperation):
+                images = []
+            else:
+                images = [entry.image]
+            for image in images:
+                seen[id(image)] = image.sizeInBytes()
+        return sum(seen.values())
+
+    def undo(self, current: QImage = None) -> QImage:
+        """
+        Отменить последнее действие.
+        Если передано текущее изображение, изменение областей отменяется
+        прямо на нем, без восстановления полного снимка
+        """
+        self.finalize()
         if len(self.undo_stack) > 1:
-            current_state = self.undo_stack.pop()
-            self.redo_stack.append(current_state)
-            previous_state = self.undo_stack[-1]
-            
-            # Создаем копию предыдущего состояния
-            restored_state = QImage(previous_state.size(), previous_state.format())
-            restored_state.fill(Qt.GlobalColor.white)
-            
-            painter = QPainter(restored_state)
-            painter.drawImage(QPoint(0, 0), previous_state)
-            painter.end()
-            
+            entry = self.undo_stack.pop()
+            self.redo_stack.append(entry)
+
+            if is_snapshot(entry) or current is None:
+                restored_state = self.materialize(len(self.undo_stack) - 1)
+            else:
+                restored_state = entry.revert(current)
+
             logger.info(f"Отмена действия (размер: {restored_state.size()})")
             return restored_state
         return None
-    
-    def redo(self) -> QImage:
+
+    def redo(self, current: QImage = None) -> QImage:
         """Повторить отмененное действие"""
+        self.finalize()
         if self.redo_stack:
-            state = self.redo_stack.pop()
-            
-            # Создаем копию состояния
-            restored_state = QImage(state.size(), state.format())
-            restored_state.fill(Qt.GlobalColor.white)
-            
-            painter = QPainter(restored_state)
-            painter.drawImage(QPoint(0, 0), state)
-            painter.end()
-            
-            self.undo_stack.append(restored_state)
+            entry = self.redo_stack.pop()
+            self.undo_stack.append(entry)
+
+            if is_snapshot(entry) or current is None:
+                restored_state = self.materialize(len(self.undo_stack) - 1)
+            else:
+                restored_state = entry.apply(current)
+
             logger.info(f"Повтор действия (размер: {restored_state.size()})")
             return restored_state
         return None
-    
+
     def can_undo(self) -> bool:
         """Проверка возможности отмены"""
         return len(self.undo_stack) > 1
-    
+
     def can_redo(self) -> bool:
         """Проверка возможности повтора"""
-        return len(self.redo_stack) > 0
\ No newline at end of file
+        return len(self.redo_stack) > 0
@@ -0,0 +1,109 @@
+import itertools
+import time
+from PyQt6.QtCore import QObject, QTimer
+from utils.perf import measure
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты: меньше - раньше
+HIGH = 0    # Работа, зависящая от текущего изображения: завершается до следующей правки
+NORMAL = 1
+LOW = 2     # Фоновая работа: сжатие истории, автосохранение
+
+class IdleJob:
+    """
+    Отложенная работа.
+    step(deadline) выполняет порцию до deadline (time.perf_counter) или всю,
+    если deadline равен None, и возвращает True, если работа осталась
+    """
+    def __init__(self, name: str, step, priority: int, ready_at: float, order: int):
+        self.name = name
+        self.step = step
+        self.priority = priority
+        self.ready_at = ready_at
+        self.order = order
+
+class IdleScheduler(QObject):
+    """
+    Планировщик работы в простое.
+    Таймер с нулевым интервалом срабатывает только после того, как обработаны
+    все ожидающие события, поэтому работа не задерживает ввод. За одно
+    срабатывание задачи выполняются по приоритету не дольше slice_time секунд.
+    finish() выполняет задачу сразу и полностью - когда ее результат нужен
+    """
+    def __init__(self, parent=None, slice_time: float = 0.005):
+        super().__init__(parent)
+        self.slice_time = slice_time
+        self.jobs = {}  # имя -> IdleJob
+        self._order = itertools.count()
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.run_slice)
+
+    def schedule(self, name: str, step, priority: int = NORMAL, delay: float = 0.0):
+        """
+        Запланировать задачу. Задача с тем же именем заменяется
+        (повторный запрос того же обновления не удваивает работу)
+        """
+        self.jobs[name] = IdleJob(name, step, priority, time.perf_counter() + delay, next(self._order))
+        self._wake()
+
+    def cancel(self, name: str = None):
+        """Отменить задачу (или все задачи)"""
+        if name is None:
+            self.jobs.clear()
+        else:
+            self.jobs.pop(name, None)
+        self._wake()
+
+    def is_pending(self, name: str) -> bool:
+        return name in self.jobs
+
+    def finish(self, name: str = None, priority: int = None):
+        """
+        Выполнить задачу name полностью прямо сейчас.
+        Без имени - все задачи с приоритетом не ниже priority (по умолчанию все)
+        """
+        if name is not None:
+            names = [name] if name in self.jobs else []
+        else:
+            names = [job.name for job in sorted(self.jobs.values(), key=lambda job: (job.priority, job.order))
+                     if priority is None or job.priority <= priority]
+        for job_name in names:
+            job = self.jobs.pop(job_name, None)
+            while job is not None and self._run(job, None):
+                pass
+        self._wake()
+
+    def run_slice(self):
+        """Одно срабатывание: готовые задачи по приоритету в пределах slice_time"""
+        now = time.perf_counter()
+        deadline = now + self.slice_time
+        ready = sorted((job for job in self.jobs.values() if job.ready_at <= now),
+                       key=lambda job: (job.priority, job.order))
+        for job in ready:
+            if time.perf_counter() > deadline:
+                break
+            if self.jobs.get(job.name) is not job:
+                continue  # Задачу заменили или отменили из другой задачи
+            if not self._run(job, deadline) and self.jobs.get(job.name) is job:
+                del self.jobs[job.name]
+        self._wake()
+
+    def _run(self, job: IdleJob, deadline) -> bool:
+        """Выполнить порцию задачи. Ошибка снимает задачу, но не останавливает остальные"""
+        try:
+            with measure(f"idle.{job.name}"):
+                return bool(job.step(deadline))
+        except Exception as e:
+            logger.error(f"Ошибка фоновой задачи {job.name}: {str(e)}")
+            return False
+
+    def _wake(self):
+        """Перезапустить таймер к ближайшей готовой задаче"""
+        if not self.jobs:
+            self.timer.stop()
+            return
+        delay = min(job.ready_at for job in self.jobs.values()) - time.perf_counter()
+        self.timer.start(max(0, int(delay * 1000)))
@@ -0,0 +1,29 @@
+import numpy as np
+from PyQt6.QtGui import QImage
+
+class _ImageBuffer:
+    """Описание буфера QImage для NumPy; держит изображение, пока жив массив"""
+    def __init__(self, image: QImage, writable: bool):
+        channels = image.depth() // 8
+        # bits() отсоединяет общий буфер, поэтому запись не затронет копии изображения
+        ptr = image.bits() if writable else image.constBits()
+        if channels == 1:
+            shape, strides = (image.height(), image.width()), (image.bytesPerLine(), 1)
+        else:
+            shape = (image.height(), image.width(), channels)
+            strides = (image.bytesPerLine(), channels, 1)
+        self.image = image
+        self.__array_interface__ = {
+            "version": 3, "typestr": "|u1", "shape": shape, "strides": strides,
+            "data": (int(ptr), not writable),
+        }
+
+def image_view(image: QImage, writable: bool = False) -> np.ndarray:
+    """
+    Массив NumPy поверх буфера QImage без копирования.
+    Для 32-битных форматов форма (высота, ширина, 4), порядок байт в памяти
+    для Format_RGB32 - B, G, R, A. Для 8-битных форматов форма (высота, ширина).
+    Учитывает выравнивание строк (bytesPerLine).
+    Массив держит ссылку на image, поэтому изображение не удаляется раньше массива
+    """
+    return np.asarray(_ImageBuffer(image, writable))
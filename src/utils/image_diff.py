@@ -0,0 +1,206 @@
+import math
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PyQt6.QtGui import QImage, qRgba
+from PyQt6.QtCore import QThread, QRect, pyqtSignal
+from utils.image_array import image_view
+from utils.image_ops import to_canvas_format
+from utils.image_loader import decode
+from utils.raw_io import is_raw_file, open_raw
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Сторона клетки, по которой ищутся измененные области
+CELL_SIZE = 32
+# Форматы, пиксели которых читаются без преобразования (B, G, R, A в памяти)
+_DIRECT_FORMATS = (QImage.Format.Format_RGB32, QImage.Format.Format_ARGB32,
+                   QImage.Format.Format_ARGB32_Premultiplied)
+
+def overlay_colors():
+    """Палитра наложения: без отличий - прозрачно, чем больше отличие, тем ярче красный"""
+    return [qRgba(0, 0, 0, 0)] + [qRgba(255, 0, 0, 96 + value * 159 // 255) for value in range(1, 256)]
+
+class DiffResult:
+    """
+    Результат сравнения.
+    mask - наибольшее отличие по каналам для каждого пикселя (uint8),
+    один байт на пиксель вместо третьего полноцветного изображения
+    """
+    def __init__(self, mask: np.ndarray, changed: int, histogram: np.ndarray, boxes):
+        self.mask = mask
+        self.changed = changed        # Пикселей, отличающихся больше порога
+        self.histogram = histogram    # Число значений каналов с отличием 0..255
+        self.boxes = boxes            # Прямоугольники измененных областей
+        self._overlay = None
+
+    @property
+    def pixels(self) -> int:
+        return self.mask.size
+
+    @property
+    def max_delta(self) -> int:
+        nonzero = np.flatnonzero(self.histogram)
+        return int(nonzero[-1]) if nonzero.size else 0
+
+    @property
+    def mean_delta(self) -> float:
+        """Среднее отличие канала"""
+        total = int(self.histogram.sum())
+        return float(self.histogram @ np.arange(256)) / total if total else 0.0
+
+    @property
+    def mse(self) -> float:
+        total = int(self.histogram.sum())
+        return float(self.histogram @ np.arange(256) ** 2) / total if total else 0.0
+
+    @property
+    def psnr(self) -> float:
+        """Пиковое отношение сигнал/шум в дБ; для одинаковых изображений - бесконечность"""
+        mse = self.mse
+        return math.inf if mse == 0 else 10 * math.log10(255 ** 2 / mse)
+
+    def overlay(self) -> QImage:
+        """Наложение отличий поверх маски без копирования (Indexed8 с палитрой)"""
+        if self._overlay is None:
+            height, width = self.mask.shape
+            self._overlay = QImage(self.mask.data, width, height, self.mask.strides[0],
+                                   QImage.Format.Format_Indexed8)
+            self._overlay.setColorTable(overlay_colors())
+        return self._overlay
+
+    def summary(self) -> str:
+        share = 100 * self.changed / self.pixels if self.pixels else 0.0
+        psnr = "∞" if math.isinf(self.psnr) else f"{self.psnr:.2f} дБ"
+        return (f"Отличающихся пикселей: {self.changed} ({share:.3f}%)\n"
+                f"Наибольшее отличие: {self.max_delta}, среднее: {self.mean_delta:.3f}\n"
+                f"PSNR: {psnr}\n"
+                f"Измененных областей: {len(self.boxes)}")
+
+def _band_pixels(image: QImage, top: int, bottom: int) -> np.ndarray:
+    """Пиксели полосы строк в раскладке B, G, R, A; копия только для других форматов"""
+    if image.format() in _DIRECT_FORMATS:
+        return image_view(image)[top:bottom]
+    band = to_canvas_format(image.copy(0, top, image.width(), bottom - top))
+    return image_view(band).copy()
+
+def _compare_band(first, second, top, bottom, mask, threshold):
+    """Сравнить полосу: записать маску, вернуть гистограмму, число отличий и клетки"""
+    a = _band_pixels(first, top, bottom)
+    b = _band_pixels(second, top, bottom)
+    # Модуль разности в uint8 без расширения типа, по всем четырем байтам подряд:
+    # непрерывные строки обрабатываются быстрее, чем срез трех каналов
+    delta = np.maximum(a, b)
+    delta -= np.minimum(a, b)
+    band_mask = mask[top:bottom]
+    np.maximum(delta[..., 0], delta[..., 1], out=band_mask)
+    np.maximum(band_mask, delta[..., 2], out=band_mask)
+    # Гистограмма строится только по отличающимся пикселям, нули добавляются счетом
+    different = band_mask != 0
+    values = delta[different][:, :3]
+    histogram = np.bincount(values.ravel(), minlength=256)
+    histogram[0] += (band_mask.size - values.shape[0]) * 3
+    changed = band_mask > threshold if threshold else different
+    cells = np.logical_or.reduceat(changed, np.arange(0, changed.shape[0], CELL_SIZE), axis=0)
+    cells = np.logical_or.reduceat(cells, np.arange(0, changed.shape[1], CELL_SIZE), axis=1)
+    return histogram, int(np.count_nonzero(changed)), cells
+
+def _label_cells(cells: np.ndarray):
+    """Связные (с соседями по диагонали) группы измененных клеток: списки (строка, столбец)"""
+    seen = np.zeros_like(cells)
+    rows, cols = cells.shape
+    groups = []
+    for start in zip(*np.nonzero(cells)):
+        if seen[start]:
+            continue
+        seen[start] = True
+        queue = deque([start])
+        group = []
+        while queue:
+            row, col = queue.popleft()
+            group.append((row, col))
+            for r in range(max(0, row - 1), min(rows, row + 2)):
+                for c in range(max(0, col - 1), min(cols, col + 2)):
+                    if cells[r, c] and not seen[r, c]:
+                        seen[r, c] = True
+                        queue.append((r, c))
+        groups.append(group)
+    return groups
+
+def _boxes(cells: np.ndarray, mask: np.ndarray, threshold: int):
+    """Прямоугольники измененных областей, уточненные до пикселя по маске"""
+    boxes = []
+    height, width = mask.shape
+    for group in _label_cells(cells):
+        group = np.array(group)
+        top, left = group.min(axis=0) * CELL_SIZE
+        bottom = min(height, (group[:, 0].max() + 1) * CELL_SIZE)
+        right = min(width, (group[:, 1].max() + 1) * CELL_SIZE)
+        changed = mask[top:bottom, left:right] > threshold
+        rows = np.flatnonzero(changed.any(axis=1))
+        cols = np.flatnonzero(changed.any(axis=0))
+        boxes.append(QRect(int(left + cols[0]), int(top + rows[0]),
+                           int(cols[-1] - cols[0] + 1), int(rows[-1] - rows[0] + 1)))
+    return boxes
+
+def compare_images(first: QImage, second: QImage, threshold: int = 0, workers: int = None,
+                   band_rows: int = 256) -> DiffResult:
+    """
+    Сравнить два изображения одного размера.
+    Обработка идет полосами строк в нескольких потоках: кроме маски отличий
+    (байт на пиксель) память нужна только на одну полосу в каждом потоке.
+    Пиксель считается измененным, если отличие хотя бы одного канала больше threshold
+    """
+    if first.size() != second.size():
+        raise ValueError(f"Размеры изображений различаются: {first.width()}x{first.height()} "
+                         f"и {second.width()}x{second.height()}")
+    width, height = first.width(), first.height()
+    mask = np.empty((height, width), np.uint8)
+    band_rows = max(CELL_SIZE, band_rows // CELL_SIZE * CELL_SIZE)
+    bands = [(top, min(height, top + band_rows)) for top in range(0, height, band_rows)]
+    workers = workers or min(len(bands), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        results = list(pool.map(lambda band: _compare_band(first, second, *band, mask, threshold), bands))
+
+    histogram = np.zeros(256, np.int64)
+    changed = 0
+    for band_histogram, band_changed, _ in results:
+        histogram += band_histogram
+        changed += band_changed
+    cells = np.vstack([cells for _, _, cells in results]) if results else np.zeros((0, 0), bool)
+    result = DiffResult(mask, changed, histogram, _boxes(cells, mask, threshold))
+    logger.debug(f"Сравнение {width}x{height}: {changed} отличающихся пикселей, "
+                 f"{len(result.boxes)} областей")
+    return result
+
+def load_for_compare(filename: str, size=None) -> QImage:
+    """
+    Открыть второе изображение. Несжатые файлы отображаются в память без чтения целиком;
+    для .raw без заголовка берется размер size (раскладка холста)
+    """
+    if is_raw_file(filename):
+        width, height = (size.width(), size.height()) if size is not None else (None, None)
+        return open_raw(filename, width, height)
+    return decode(filename)
+
+class CompareThread(QThread):
+    """Загрузка второго изображения и сравнение в фоновом потоке"""
+    finished_result = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, image: QImage, filename: str, threshold: int = 0, parent=None):
+        super().__init__(parent)
+        # Неявно разделяемая копия: холст при рисовании отсоединит свой буфер
+        self.image = QImage(image)
+        self.filename = filename
+        self.threshold = threshold
+
+    def run(self):
+        try:
+            other = load_for_compare(self.filename, self.image.size())
+            self.finished_result.emit(compare_images(self.image, other, self.threshold))
+        except Exception as e:
+            logger.error(f"Ошибка сравнения: {str(e)}")
+            self.failed.emit(str(e))
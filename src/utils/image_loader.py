@@ -0,0 +1,88 @@
+from PyQt6.QtGui import QImage, QImageReader, QImageIOHandler
+from PyQt6.QtCore import QThread, QRect, QSize, Qt, pyqtSignal
+from utils.image_ops import to_canvas_format_inplace
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Предел памяти декодера Qt (по умолчанию 256 МБ не хватает для больших снимков)
+ALLOCATION_LIMIT_MB = 4096
+# Начиная с этого числа пикселей изображение загружается поэтапно
+PROGRESSIVE_PIXELS = 4_000_000
+# Наибольшая сторона быстрого эскиза
+PREVIEW_SIZE = 1024
+
+class ImageInfo:
+    """Параметры файла, прочитанные из заголовка без декодирования пикселей"""
+    def __init__(self, filename: str):
+        reader = QImageReader(filename)
+        self.filename = filename
+        self.size = reader.size()
+        self.format = bytes(reader.format()).decode()
+        self.can_clip = reader.supportsOption(QImageIOHandler.ImageOption.ClipRect)
+        self.can_scale = reader.supportsOption(QImageIOHandler.ImageOption.ScaledSize)
+        self.error = "" if self.size.isValid() else reader.errorString()
+
+    def is_valid(self) -> bool:
+        return self.size.isValid()
+
+    def is_large(self) -> bool:
+        return self.size.width() * self.size.height() > PROGRESSIVE_PIXELS
+
+    def preview_size(self) -> QSize:
+        """Размер эскиза с сохранением пропорций"""
+        return self.size.scaled(QSize(PREVIEW_SIZE, PREVIEW_SIZE), Qt.AspectRatioMode.KeepAspectRatio)
+
+def decode(filename: str, scaled_size: QSize = None, clip_rect: QRect = None) -> QImage:
+    """
+    Декодировать файл сразу в формат холста.
+    clip_rect и scaled_size передаются декодеру, если формат их поддерживает
+    """
+    QImageReader.setAllocationLimit(ALLOCATION_LIMIT_MB)
+    reader = QImageReader(filename)
+    if clip_rect is not None:
+        reader.setClipRect(clip_rect)
+    if scaled_size is not None:
+        reader.setScaledSize(scaled_size)
+    image = reader.read()
+    if image.isNull():
+        raise ValueError(f"Не удалось прочитать {filename}: {reader.errorString()}")
+    return to_canvas_format_inplace(image)
+
+class ImageLoadThread(QThread):
+    """
+    Поэтапная загрузка в фоновом потоке: сначала уменьшенный эскиз,
+    затем видимая область в полном разрешении, затем изображение целиком.
+    Эскиз и область выдаются только для форматов, которые умеют декодировать их
+    без разбора всего файла (например, JPEG).
+    Изображение целиком декодируется сразу, а не по требованию: холст рисует
+    и хранит историю только по полному изображению, поэтому эскиз и область
+    лишь сокращают время до первого показа
+    """
+    preview_ready = pyqtSignal(QImage, QSize)
+    region_ready = pyqtSignal(QRect, QImage)
+    finished_image = pyqtSignal(QImage)
+    failed = pyqtSignal(str)
+
+    def __init__(self, filename: str, visible_rect: QRect = QRect(), parent=None):
+        super().__init__(parent)
+        self.filename = filename
+        self.visible_rect = QRect(visible_rect)
+
+    def run(self):
+        try:
+            info = ImageInfo(self.filename)
+            if not info.is_valid():
+                raise ValueError(f"Не удалось прочитать {self.filename}: {info.error}")
+            logger.info(f"Загрузка {self.filename}: {info.size.width()}x{info.size.height()}, {info.format}")
+
+            if info.is_large() and info.can_scale:
+                self.preview_ready.emit(decode(self.filename, scaled_size=info.preview_size()), info.size)
+            visible = self.visible_rect.intersected(QRect(0, 0, info.size.width(), info.size.height()))
+            if info.is_large() and info.can_clip and not visible.isEmpty():
+                self.region_ready.emit(visible, decode(self.filename, clip_rect=visible))
+
+            self.finished_image.emit(decode(self.filename))
+        except Exception as e:
+            logger.error(f"Ошибка загрузки: {str(e)}")
+            self.failed.emit(str(e))
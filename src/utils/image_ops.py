@@ -0,0 +1,121 @@
+from PyQt6.QtGui import QImage, QPainter, qRgb, qRed, qGreen, qBlue, qAlpha
+from PyQt6.QtCore import Qt, QSize, QPoint
+from utils.pixel_format import blank_image, blit
+from utils.quantize import quantize, remap
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Форматы документа, которые сохраняются при правках размера и загрузке
+COMPACT_FORMATS = (QImage.Format.Format_Grayscale8, QImage.Format.Format_Indexed8)
+
+def _rgb32_on_white(image: QImage, width: int, height: int) -> QImage:
+    """Изображение Format_RGB32 заданного размера: содержимое слева сверху, остальное белое"""
+    new_image = QImage(QSize(width, height), QImage.Format.Format_RGB32)
+    new_image.fill(Qt.GlobalColor.white)
+    painter = QPainter(new_image)
+    painter.drawImage(0, 0, image)
+    painter.end()
+    return new_image
+
+def resize_canvas(image: QImage, width: int, height: int) -> QImage:
+    """
+    Изменить размер холста без масштабирования содержимого.
+    Изображение обрезается или дополняется белым справа и снизу.
+    Оттенки серого и палитра сохраняются, остальные форматы приводятся к RGB32
+    """
+    if image.format() in COMPACT_FORMATS:
+        new_image = blank_image(QSize(width, height), image.format(), image.colorTable())
+        blit(new_image, QPoint(0, 0), image)
+        return new_image
+    return _rgb32_on_white(image, width, height)
+
+def to_canvas_format(image: QImage) -> QImage:
+    """Привести изображение к цветному формату холста (прозрачность заменяется белым)"""
+    return _rgb32_on_white(image, image.width(), image.height())
+
+def _opaque_color_table(color_table):
+    """Палитра, где полупрозрачные цвета наложены на белый"""
+    def over_white(color):
+        alpha = qAlpha(color)
+        return qRgb(*(255 - (255 - channel) * alpha // 255 for channel in (qRed(color), qGreen(color), qBlue(color))))
+    return [over_white(color) for color in color_table]
+
+def to_canvas_format_inplace(image: QImage) -> QImage:
+    """
+    Привести изображение к формату холста без второго буфера:
+    прозрачность заливается белым прямо в изображении, затем формат меняется на месте.
+    Оттенки серого и палитровые изображения остаются 8-битными, 1-битные
+    становятся палитровыми, 16-битные серые - 8-битными
+    """
+    if image.format() in (QImage.Format.Format_Mono, QImage.Format.Format_MonoLSB):
+        image.convertTo(QImage.Format.Format_Indexed8)
+    if image.format() == QImage.Format.Format_Grayscale16:
+        image.convertTo(QImage.Format.Format_Grayscale8)
+    if image.format() == QImage.Format.Format_Indexed8:
+        image.setColorTable(_opaque_color_table(image.colorTable()))
+        return image
+    if image.format() == QImage.Format.Format_Grayscale8:
+        return image
+    if image.hasAlphaChannel():
+        if image.format() not in (QImage.Format.Format_ARGB32, QImage.Format.Format_ARGB32_Premultiplied):
+            image.convertTo(QImage.Format.Format_ARGB32_Premultiplied)
+        painter = QPainter(image)
+        painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_DestinationOver)
+        painter.fillRect(image.rect(), Qt.GlobalColor.white)
+        painter.end()
+    image.convertTo(QImage.Format.Format_RGB32)
+    return image
+
+def to_document_format(image: QImage, image_format, color_table=None) -> QImage:
+    """
+    Привести изображение к формату пикселей документа.
+    Для палитры без color_table она строится по изображению (до 256 цветов),
+    иначе каждый пиксель получает ближайший цвет color_table
+    """
+    if image.format() == image_format and (image_format != QImage.Format.Format_Indexed8
+                                           or not color_table or image.colorTable() == color_table):
+        return image
+    if image_format == QImage.Format.Format_Grayscale8:
+        if image.format() != QImage.Format.Format_RGB32:
+            image = to_canvas_format(image)
+        return image.convertToFormat(QImage.Format.Format_Grayscale8)
+    if image_format == QImage.Format.Format_Indexed8:
+        image = to_canvas_format(image)
+        return remap(image, color_table) if color_table else quantize(image, 256)
+    return to_canvas_format(image)
+
+def grayscale(image: QImage) -> QImage:
+    """Оттенки серого"""
+    gray = image.convertToFormat(QImage.Format.Format_Grayscale8)
+    return gray.convertToFormat(QImage.Format.Format_RGB32)
+
+def invert(image: QImage) -> QImage:
+    """Инверсия цветов"""
+    result = image.copy()
+    result.invertPixels()
+    return result
+
+def mirror_horizontal(image: QImage) -> QImage:
+    """Отражение по горизонтали"""
+    return image.mirrored(True, False)
+
+def mirror_vertical(image: QImage) -> QImage:
+    """Отражение по вертикали"""
+    return image.mirrored(False, True)
+
+# Фильтры, доступные по имени (пакетная обработка)
+FILTERS = {
+    "grayscale": grayscale,
+    "invert": invert,
+    "mirror": mirror_horizontal,
+    "flip": mirror_vertical,
+}
+
+def apply_filters(image: QImage, names) -> QImage:
+    """Последовательно применить фильтры по именам"""
+    for name in names:
+        if name not in FILTERS:
+            raise ValueError(f"Неизвестный фильтр: {name}")
+        image = FILTERS[name](image)
+    return image
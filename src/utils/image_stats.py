@@ -0,0 +1,110 @@
+import numpy as np
+from PyQt6.QtGui import QImage
+from PyQt6.QtCore import QRect
+from utils.image_array import image_view
+from utils.image_ops import to_canvas_format
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Начиная с этого числа пикселей цвета считаются через bincount, а не сортировкой
+_BINCOUNT_THRESHOLD = 1 << 22
+
+# Форматы, пиксели которых считаются без преобразования
+_DIRECT_FORMATS = (QImage.Format.Format_RGB32, QImage.Format.Format_Grayscale8)
+
+def color_counts(pixels: np.ndarray):
+    """
+    Уникальные цвета RGB и число пикселей каждого цвета.
+    pixels - массив (высота, ширина, 4) поверх изображения Format_RGB32
+    или (высота, ширина) поверх Format_Grayscale8
+    """
+    if pixels.ndim == 2:
+        counts = np.bincount(pixels.ravel(), minlength=256)
+        levels = np.flatnonzero(counts)
+        return (levels * 0x010101).astype(np.uint32), counts[levels].astype(np.int64)
+    values = pixels.view(np.uint32)[..., 0].ravel() & 0xFFFFFF
+    if values.size > _BINCOUNT_THRESHOLD:
+        counts = np.bincount(values, minlength=1 << 24)
+        colors = np.flatnonzero(counts)
+        return colors.astype(np.uint32), counts[colors].astype(np.int64)
+    colors, counts = np.unique(values, return_counts=True)
+    return colors.astype(np.uint32), counts.astype(np.int64)
+
+class ImageStats:
+    """
+    Гистограммы каналов, число уникальных цветов и средний цвет.
+    Полный пересчет выполняется только при загрузке и смене размера,
+    после правок статистика обновляется по измененным областям:
+    вычитаются старые значения области и добавляются новые
+    """
+    def __init__(self):
+        self.colors = np.empty(0, np.uint32)  # отсортированные цвета 0xRRGGBB
+        self.counts = np.empty(0, np.int64)
+        self.channels = np.zeros((3, 256), np.int64)  # R, G, B
+        self.pixels = 0
+
+    def rescan(self, image: QImage):
+        """Полный пересчет по всему изображению"""
+        if image.format() not in _DIRECT_FORMATS:
+            image = to_canvas_format(image)
+        self.colors, self.counts = color_counts(image_view(image))
+        self.pixels = int(self.counts.sum())
+        self.channels[:] = 0
+        self._add_channels(self.colors, self.counts)
+        logger.debug(f"Статистика пересчитана: {self.unique_colors} цветов")
+
+    def update_region(self, rect: QRect, before: QImage, image: QImage):
+        """Обновить статистику по области rect, before - ее прежнее содержимое"""
+        if before.format() not in _DIRECT_FORMATS:
+            before = to_canvas_format(before)
+        rect = rect.intersected(image.rect())
+        if image.format() not in _DIRECT_FORMATS:
+            region = to_canvas_format(image.copy(rect))
+            current = image_view(region)
+        else:
+            current = image_view(image)[rect.top():rect.bottom() + 1, rect.left():rect.right() + 1]
+        old_view = image_view(before)[:rect.height(), :rect.width()]
+
+        self._apply(*color_counts(old_view), sign=-1)
+        self._apply(*color_counts(current), sign=1)
+
+    def _apply(self, colors, counts, sign):
+        """Добавить (sign=1) или вычесть (sign=-1) отсчеты цветов"""
+        index = np.searchsorted(self.colors, colors)
+        known = index < len(self.colors)
+        known[known] = self.colors[index[known]] == colors[known]
+        self.counts[index[known]] += sign * counts[known]
+
+        if sign > 0 and not known.all():
+            # Новые цвета вставляются с сохранением сортировки
+            merged = np.concatenate([self.colors, colors[~known]])
+            order = np.argsort(merged, kind="stable")
+            self.colors = merged[order]
+            self.counts = np.concatenate([self.counts, counts[~known]])[order]
+        elif sign < 0:
+            # Исчезнувшие цвета убираем, чтобы массив не разрастался
+            alive = self.counts > 0
+            if not alive.all():
+                self.colors = self.colors[alive]
+                self.counts = self.counts[alive]
+
+        self.pixels += sign * int(counts.sum())
+        self._add_channels(colors, sign * counts)
+
+    def _add_channels(self, colors, counts):
+        for channel, shift in enumerate((16, 8, 0)):
+            values = (colors >> shift) & 0xFF
+            self.channels[channel] += np.bincount(values, weights=counts, minlength=256).astype(np.int64)
+
+    @property
+    def unique_colors(self) -> int:
+        return len(self.colors)
+
+    @property
+    def mean(self):
+        """Средний цвет (R, G, B)"""
+        if not self.pixels:
+            return 0.0, 0.0, 0.0
+        levels = np.arange(256)
+        return tuple(float(value) for value in self.channels @ levels / self.pixels)
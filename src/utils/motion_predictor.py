@@ -0,0 +1,83 @@
+import math
+from collections import deque
+from PyQt6.QtCore import QPoint
+from utils.perf import counter
+import logging
+
+logger = logging.getLogger(__name__)
+
+class MotionPredictor:
+    """
+    Предсказание положения указателя на короткий срок вперед.
+    Последние события движения хранятся в небольшом кольцевом буфере;
+    положение экстраполируется по скорости и ускорению. Каждое предсказание
+    сверяется с фактическим положением, когда до него доходят события:
+    попадание в пределах tolerance засчитывается как скрытая задержка
+    (счетчик "predictor.hidden_latency")
+    """
+    def __init__(self, capacity=8, horizon=0.016, tolerance=4.0, max_lead=48.0, max_gap=0.1):
+        self.samples = deque(maxlen=capacity)  # (время в секундах, x, y)
+        self.horizon = horizon      # На сколько секунд вперед предсказывать
+        self.tolerance = tolerance  # Допустимая ошибка предсказания в пикселях
+        self.max_lead = max_lead    # Наибольшее расстояние от последней точки
+        self.max_gap = max_gap      # После паузы длиннее этой скорость не известна
+        self.pending = deque()      # Непроверенные предсказания: (время, x, y)
+        self.checked = 0
+        self.error_total = 0.0
+
+    def reset(self):
+        """Начало нового штриха"""
+        self.samples.clear()
+        self.pending.clear()
+
+    def add(self, pos: QPoint, timestamp: float):
+        """Добавить фактическое положение указателя"""
+        while self.samples and self.pending and timestamp >= self.pending[0][0]:
+            self._check(self.pending.popleft(), timestamp, pos.x(), pos.y())
+        self.samples.append((timestamp, pos.x(), pos.y()))
+
+    def _check(self, prediction, timestamp, x, y):
+        """Сравнить предсказание с положением, интерполированным на его момент"""
+        target_time, predicted_x, predicted_y = prediction
+        last_time, last_x, last_y = self.samples[-1]
+        span = timestamp - last_time
+        share = (target_time - last_time) / span if span > 0 else 1.0
+        actual_x = last_x + (x - last_x) * share
+        actual_y = last_y + (y - last_y) * share
+        error = math.hypot(predicted_x - actual_x, predicted_y - actual_y)
+        self.checked += 1
+        self.error_total += error
+        counter("predictor.hidden_latency").add(self.horizon if error <= self.tolerance else 0.0)
+
+    def predict(self) -> QPoint:
+        """Ожидаемое положение через horizon секунд или None, если движения нет"""
+        if len(self.samples) < 2:
+            return None
+        t2, x2, y2 = self.samples[-1]
+        t1, x1, y1 = self.samples[-2]
+        dt = t2 - t1
+        if dt <= 0 or dt > self.max_gap:
+            return None
+        vx, vy = (x2 - x1) / dt, (y2 - y1) / dt
+        ax = ay = 0.0
+        if len(self.samples) >= 3:
+            t0, x0, y0 = self.samples[-3]
+            previous_dt = t1 - t0
+            if 0 < previous_dt <= self.max_gap:
+                # Ускорение по двум последним скоростям
+                middle = (dt + previous_dt) / 2
+                ax = (vx - (x1 - x0) / previous_dt) / middle
+                ay = (vy - (y1 - y0) / previous_dt) / middle
+        h = self.horizon
+        dx = vx * h + ax * h * h / 2
+        dy = vy * h + ay * h * h / 2
+        lead = math.hypot(dx, dy)
+        if lead > self.max_lead:
+            dx, dy = dx * self.max_lead / lead, dy * self.max_lead / lead
+        self.pending.append((t2 + h, x2 + dx, y2 + dy))
+        return QPoint(round(x2 + dx), round(y2 + dy))
+
+    @property
+    def mean_error(self) -> float:
+        """Средняя ошибка проверенных предсказаний в пикселях"""
+        return self.error_total / self.checked if self.checked else 0.0
@@ -0,0 +1,82 @@
+import threading
+import time
+from contextlib import contextmanager
+import logging
+
+logger = logging.getLogger(__name__)
+
+class PerfCounter:
+    """Накопитель времени выполнения однотипной операции"""
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+    @property
+    def average_ms(self) -> float:
+        return self.total / self.count * 1000 if self.count else 0.0
+
+    def __str__(self):
+        return (f"{self.name}: {self.count} раз, среднее {self.average_ms:.3f} мс, "
+                f"максимум {self.max * 1000:.3f} мс")
+
+_counters = {}
+_counters_lock = threading.Lock()
+
+def counter(name: str) -> PerfCounter:
+    """Счетчик по имени (создается при первом обращении)"""
+    with _counters_lock:
+        if name not in _counters:
+            _counters[name] = PerfCounter(name)
+        return _counters[name]
+
+@contextmanager
+def measure(name: str):
+    """Замер времени блока кода в счетчик name"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        counter(name).add(time.perf_counter() - start)
+
+def report() -> str:
+    """Текстовый отчет по всем счетчикам"""
+    with _counters_lock:
+        counters = sorted(_counters.values(), key=lambda item: item.name)
+    return "\n".join(str(item) for item in counters) or "Нет данных"
+
+def reset():
+    """Сбросить все счетчики"""
+    with _counters_lock:
+        _counters.clear()
+
+def blit_cost(image, frames: int = 20):
+    """
+    Сравнить стоимость вывода кадра: drawImage с преобразованием QImage
+    в формат экрана на каждом кадре и drawPixmap из готового QPixmap.
+    Возвращает (мс на кадр для QImage, мс на кадр для QPixmap)
+    """
+    from PyQt6.QtGui import QPainter, QPixmap
+
+    target = QPixmap(image.size())
+    backing = QPixmap.fromImage(image)
+    results = []
+    for draw in (lambda painter: painter.drawImage(0, 0, image),
+                 lambda painter: painter.drawPixmap(0, 0, backing)):
+        painter = QPainter(target)
+        start = time.perf_counter()
+        for _ in range(frames):
+            draw(painter)
+        painter.end()
+        results.append((time.perf_counter() - start) / frames * 1000)
+    logger.info(f"Вывод кадра {image.width()}x{image.height()}: QImage {results[0]:.3f} мс, "
+                f"QPixmap {results[1]:.3f} мс")
+    return tuple(results)
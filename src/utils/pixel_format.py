@@ -0,0 +1,92 @@
+from contextlib import contextmanager
+import numpy as np
+from PyQt6.QtGui import QImage, QPainter, QColor
+from PyQt6.QtCore import Qt, QRect, QPoint, QSize
+from utils.image_array import image_view
+from utils.quantize import remap
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Форматы пикселей документа: имя -> (формат QImage, название)
+PIXEL_FORMATS = {
+    "rgb32": (QImage.Format.Format_RGB32, "Цветное (RGB, 32 бита)"),
+    "gray8": (QImage.Format.Format_Grayscale8, "Оттенки серого (8 бит)"),
+    "indexed8": (QImage.Format.Format_Indexed8, "Палитра (до 256 цветов, 8 бит)"),
+}
+
+def pixel_format(image: QImage) -> str:
+    """Имя формата пикселей изображения; прочие форматы считаются цветными"""
+    for name, (image_format, _) in PIXEL_FORMATS.items():
+        if image.format() == image_format:
+            return name
+    return "rgb32"
+
+def is_document_format(image: QImage) -> bool:
+    """Формат изображения - один из форматов пикселей документа"""
+    return any(image.format() == image_format for image_format, _ in PIXEL_FORMATS.values())
+
+def is_indexed(image: QImage) -> bool:
+    return image.format() == QImage.Format.Format_Indexed8
+
+def nearest_index(color_table, color: QColor) -> int:
+    """Номер ближайшего к color цвета палитры"""
+    table = np.array(color_table, np.uint32)
+    channels = np.stack([table >> 16 & 0xFF, table >> 8 & 0xFF, table & 0xFF], axis=1).astype(np.int32)
+    target = np.array([color.red(), color.green(), color.blue()], np.int32)
+    return int(np.argmin(((channels - target) ** 2).sum(axis=1)))
+
+def blank_image(size: QSize, image_format=QImage.Format.Format_RGB32, color_table=None) -> QImage:
+    """Новое изображение, залитое белым (для палитры - ближайшим к белому цветом)"""
+    image = QImage(size, image_format)
+    if image_format == QImage.Format.Format_Indexed8:
+        image.setColorTable(color_table)
+        image.fill(nearest_index(color_table, QColor(Qt.GlobalColor.white)))
+    else:
+        image.fill(Qt.GlobalColor.white)
+    return image
+
+def blit(target: QImage, pos: QPoint, source: QImage, clip: QRect = None):
+    """
+    Скопировать пиксели source в target с точкой pos без смешивания.
+    Форматы должны совпадать. В отличие от QPainter работает и для
+    Format_Indexed8 (копируются номера цветов общей палитры)
+    """
+    if source.format() != target.format():
+        raise ValueError(f"Форматы не совпадают: {source.format().name} и {target.format().name}")
+    area = QRect(pos, source.size()).intersected(target.rect())
+    if clip is not None:
+        area = area.intersected(clip)
+    if area.isEmpty():
+        return
+    top, left = area.top() - pos.y(), area.left() - pos.x()
+    pixels = image_view(source)[top:top + area.height(), left:left + area.width()]
+    image_view(target, writable=True)[area.top():area.bottom() + 1, area.left():area.right() + 1] = pixels
+
+@contextmanager
+def painting(image: QImage, rect: QRect = None):
+    """
+    QPainter для рисования в изображении документа в координатах изображения.
+    На Format_Indexed8 QPainter рисовать не умеет: область rect рисуется
+    в цветной копии и затем отображается обратно в палитру изображения
+    """
+    if not is_indexed(image):
+        painter = QPainter(image)
+        try:
+            yield painter
+        finally:
+            painter.end()
+        return
+    rect = (rect if rect is not None else image.rect()).intersected(image.rect())
+    if rect.isEmpty():
+        surface = QImage(1, 1, QImage.Format.Format_RGB32)  # Рисунок вне изображения отбрасывается
+    else:
+        surface = image.copy(rect).convertToFormat(QImage.Format.Format_RGB32)
+    painter = QPainter(surface)
+    painter.translate(-rect.x(), -rect.y())
+    try:
+        yield painter
+    finally:
+        painter.end()
+        if not rect.isEmpty():
+            blit(image, rect.topLeft(), remap(surface, image.colorTable()))
@@ -0,0 +1,26 @@
+from PyQt6.QtCore import QSize
+
+class QualityPolicy:
+    """
+    Выбор режима отрисовки штриха при перетаскивании.
+    Крупные кисти и большие холсты рисуются во время движения упрощенно
+    (без сглаживания и скруглений), а после отпускания кнопки область
+    штриха перерисовывается в полном качестве.
+    predict_strokes - дорисовывать предсказанный кончик штриха перед курсором
+    smooth_strokes - рисовать готовый штрих со сглаживанием и скругленными
+    концами (по умолчанию обычное перо инструмента, как раньше)
+    """
+    def __init__(self, min_brush_size=12, min_canvas_pixels=4_000_000, enabled=True, predict_strokes=True,
+                 smooth_strokes=False):
+        self.min_brush_size = min_brush_size
+        self.min_canvas_pixels = min_canvas_pixels
+        self.enabled = enabled
+        self.predict_strokes = predict_strokes
+        self.smooth_strokes = smooth_strokes
+
+    def fast_preview(self, brush_size: int, canvas_size: QSize) -> bool:
+        """Рисовать ли штрих при перетаскивании в упрощенном режиме"""
+        if not self.enabled:
+            return False
+        return (brush_size >= self.min_brush_size
+                or canvas_size.width() * canvas_size.height() >= self.min_canvas_pixels)
@@ -0,0 +1,183 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PyQt6.QtGui import QImage, qRgb
+from utils.image_array import image_view
+from utils.gradient import BAYER_4
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Сколько пикселей берется для построения палитры
+SAMPLE_SIZE = 1 << 18
+
+# Бит на канал в таблице "цвет -> ближайший цвет палитры"
+CELL_BITS = 6
+
+def sample_pixels(pixels: np.ndarray, count: int = SAMPLE_SIZE, seed: int = 0) -> np.ndarray:
+    """Случайная выборка пикселей (B, G, R) из массива формы (h, w, 4)"""
+    height, width = pixels.shape[:2]
+    if height * width <= count:
+        return pixels[..., :3].reshape(-1, 3)
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, height, count)
+    cols = rng.integers(0, width, count)
+    return pixels[rows, cols, :3]
+
+def median_cut(colors: np.ndarray, weights: np.ndarray, size: int) -> np.ndarray:
+    """
+    Палитра из не более size цветов методом медианного сечения.
+    colors - различные цвета формы (m, 3), weights - сколько раз каждый встретился.
+    Каждый раз делится ящик с наибольшим (разброс * вес) по медиане самого
+    широкого канала; цвет ящика - взвешенное среднее
+    """
+    def make_box(indices):
+        """Ящик: (оценка для деления, канал с наибольшим разбросом, номера цветов)"""
+        if len(indices) < 2:
+            return 0, 0, indices
+        spread = colors[indices].max(axis=0).astype(np.int32) - colors[indices].min(axis=0)
+        channel = int(np.argmax(spread))
+        return int(spread[channel]) * int(weights[indices].sum()), channel, indices
+
+    boxes = [make_box(np.arange(len(colors)))]
+    while len(boxes) < size:
+        best = max(range(len(boxes)), key=lambda number: boxes[number][0])
+        if not boxes[best][0]:
+            break
+        _, channel, box = boxes.pop(best)
+        ordered = box[np.argsort(colors[box, channel], kind="stable")]
+        cumulative = np.cumsum(weights[ordered])
+        split = int(np.searchsorted(cumulative, cumulative[-1] / 2))
+        split = min(max(split + 1, 1), len(ordered) - 1)
+        boxes += [make_box(ordered[:split]), make_box(ordered[split:])]
+    return np.array([
+        np.round(np.average(colors[box], axis=0, weights=weights[box])) for _, _, box in boxes
+    ], np.uint8)
+
+def build_palette(pixels: np.ndarray, size: int):
+    """
+    Палитра изображения по выборке пикселей.
+    Возвращает (палитра формы (k, 3) в порядке B, G, R; True, если в выборке
+    не больше size цветов и палитра их повторяет точно)
+    """
+    sample = sample_pixels(pixels)
+    packed = sample[:, 0].astype(np.uint32) | sample[:, 1].astype(np.uint32) << 8 \
+        | sample[:, 2].astype(np.uint32) << 16
+    keys, counts = np.unique(packed, return_counts=True)
+    colors = np.stack([keys & 0xFF, keys >> 8 & 0xFF, keys >> 16], axis=1).astype(np.uint8)
+    if len(colors) <= size:
+        return colors, True
+    return median_cut(colors, counts, size), False
+
+def cell_table(palette: np.ndarray, bits: int = CELL_BITS) -> np.ndarray:
+    """Номер ближайшего цвета палитры для каждой ячейки цветового куба"""
+    levels = (np.arange(1 << bits) << (8 - bits)) + (1 << (7 - bits))
+    # Номер ячейки - (R << 2 * bits) | (G << bits) | B, столбцы сетки - B, G, R как в палитре
+    grid = np.stack(np.meshgrid(levels, levels, levels, indexing="ij"), axis=-1).reshape(-1, 3)[:, ::-1]
+    # |c - p|^2 = |c|^2 - 2 c.p + |p|^2, где |c|^2 не влияет на выбор
+    grid = grid.astype(np.float32)
+    palette = palette.astype(np.float32)
+    norms = (palette * palette).sum(axis=1)
+    table = np.empty(len(grid), np.uint8)
+    chunk = 16384
+    for start in range(0, len(grid), chunk):
+        distances = norms - 2 * (grid[start:start + chunk] @ palette.T)
+        table[start:start + chunk] = np.argmin(distances, axis=1)
+    return table
+
+def dither_spread(size: int) -> int:
+    """Размах порога сглаживания: примерно шаг между соседними цветами палитры"""
+    return max(4, int(256 / max(size, 2) ** (1 / 3)))
+
+def quantize(image: QImage, colors: int = 256, dither: bool = False,
+             workers: int = None, band_rows: int = 128) -> QImage:
+    """
+    Изображение Format_Indexed8 с палитрой не более colors цветов.
+    Палитра строится по выборке пикселей; если цветов в рисунке не больше
+    colors, они переносятся без потерь. Иначе каждый пиксель отображается
+    в ближайший цвет через таблицу ячеек цветового куба, с необязательным
+    упорядоченным сглаживанием. Полосы строк обрабатываются параллельно
+    """
+    if image.format() != QImage.Format.Format_RGB32:
+        image = image.convertToFormat(QImage.Format.Format_RGB32)
+    pixels = image_view(image)
+    colors = min(max(colors, 2), 256)
+    palette, exact = build_palette(pixels, colors)
+
+    result = QImage(image.width(), image.height(), QImage.Format.Format_Indexed8)
+    result.setColorTable([qRgb(int(r), int(g), int(b)) for b, g, r in palette])
+    indices = image_view(result, writable=True)
+
+    keys = palette[:, 0].astype(np.uint32) | palette[:, 1].astype(np.uint32) << 8 \
+        | palette[:, 2].astype(np.uint32) << 16
+    order = np.argsort(keys)
+    sorted_keys = keys[order]
+    shift = 8 - CELL_BITS
+    table = None
+    offsets = None
+
+    def map_exact(top, bottom):
+        """Точное отображение; False, если встретился цвет вне палитры"""
+        packed = pixels[top:bottom].view(np.uint32)[..., 0] & np.uint32(0xFFFFFF)
+        position = np.minimum(np.searchsorted(sorted_keys, packed), len(sorted_keys) - 1)
+        if not np.array_equal(sorted_keys[position], packed):
+            return False
+        indices[top:bottom] = order[position]
+        return True
+
+    def map_nearest(top, bottom):
+        band = pixels[top:bottom, :, :3].astype(np.int16)
+        if offsets is not None:
+            band += offsets[np.arange(top, bottom) % 4]
+            np.clip(band, 0, 255, out=band)
+        band >>= shift
+        cell = (band[..., 2].astype(np.int32) << (2 * CELL_BITS)) \
+            | (band[..., 1].astype(np.int32) << CELL_BITS) | band[..., 0]
+        np.take(table, cell, out=indices[top:bottom])
+
+    bands = range(0, image.height(), band_rows)
+    workers = workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        if exact and all(executor.map(lambda top: map_exact(top, min(top + band_rows, image.height())), bands)):
+            return result
+        # В выборку попали не все цвета - отображаем приближенно
+        table = cell_table(palette)
+        if dither:
+            spread = dither_spread(len(palette))
+            threshold = (BAYER_4.astype(np.int16) * 2 - 15) * spread // 32
+            offsets = np.repeat(threshold[:, np.arange(image.width()) % 4, np.newaxis], 3, axis=2)
+        list(executor.map(lambda top: map_nearest(top, min(top + band_rows, image.height())), bands))
+    return result
+
+def remap(image: QImage, color_table) -> QImage:
+    """
+    Изображение Format_Indexed8 с заданной палитрой: каждый пиксель получает
+    ближайший цвет палитры, без сглаживания. Цвета, которые есть в палитре,
+    находятся точным поиском; расстояния считаются только для остальных
+    (после рисования их обычно немного - края сглаженных линий)
+    """
+    if image.format() != QImage.Format.Format_RGB32:
+        image = image.convertToFormat(QImage.Format.Format_RGB32)
+    packed = image_view(image).view(np.uint32)[..., 0] & np.uint32(0xFFFFFF)
+    keys = np.array(color_table, np.uint32) & np.uint32(0xFFFFFF)
+    order = np.argsort(keys)
+    sorted_keys = keys[order]
+    position = np.minimum(np.searchsorted(sorted_keys, packed), len(sorted_keys) - 1)
+    indices = order[position].astype(np.uint8)
+    missing = sorted_keys[position] != packed
+    if missing.any():
+        colors, inverse = np.unique(packed[missing], return_inverse=True)
+        palette = np.stack([keys & 0xFF, keys >> 8 & 0xFF, keys >> 16], axis=1).astype(np.float32)
+        wanted = np.stack([colors & 0xFF, colors >> 8 & 0xFF, colors >> 16], axis=1).astype(np.float32)
+        norms = (palette * palette).sum(axis=1)
+        nearest = np.empty(len(colors), np.uint8)
+        chunk = 16384
+        for start in range(0, len(colors), chunk):
+            distances = norms - 2 * (wanted[start:start + chunk] @ palette.T)
+            nearest[start:start + chunk] = np.argmin(distances, axis=1)
+        indices[missing] = nearest[inverse.ravel()]
+
+    result = QImage(image.width(), image.height(), QImage.Format.Format_Indexed8)
+    result.setColorTable(list(color_table))
+    image_view(result, writable=True)[:] = indices
+    return result
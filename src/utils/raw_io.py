@@ -0,0 +1,202 @@
+import mmap
+import os
+import numpy as np
+from PyQt6.QtGui import QImage
+from utils.image_array import image_view
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Несжатые форматы, которые открываются отображением файла в память
+RAW_EXTENSIONS = (".ppm", ".pgm", ".pam", ".raw", ".npy")
+
+# Раскладка пикселей файла без заголовка -> формат QImage
+RAW_FORMATS = {
+    "rgb32": QImage.Format.Format_RGB32,      # B, G, R, 0xff (как в холсте)
+    "argb32": QImage.Format.Format_ARGB32,    # B, G, R, A
+    "rgb888": QImage.Format.Format_RGB888,    # R, G, B
+    "rgba8888": QImage.Format.Format_RGBA8888,  # R, G, B, A
+    "gray8": QImage.Format.Format_Grayscale8,
+}
+
+# Типы кортежей PAM
+PAM_FORMATS = {
+    "RGB": QImage.Format.Format_RGB888,
+    "RGB_ALPHA": QImage.Format.Format_RGBA8888,
+    "GRAYSCALE": QImage.Format.Format_Grayscale8,
+}
+
+def is_raw_file(filename: str) -> bool:
+    return os.path.splitext(filename)[1].lower() in RAW_EXTENSIONS
+
+def _map(filename: str):
+    """
+    Отобразить файл в память. Страницы читаются по мере обращения,
+    а запись в них не попадает в файл (ACCESS_COPY)
+    """
+    with open(filename, "rb") as file:
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+
+def _wrap(mapped, offset: int, width: int, height: int, image_format, stride: int = None) -> QImage:
+    """
+    QImage поверх отображенных байт без копирования.
+    Изображение держит ссылку на буфер; Qt скопирует пиксели только при первой записи
+    """
+    bpp = QImage(1, 1, image_format).depth() // 8
+    stride = stride or width * bpp
+    needed = offset + stride * (height - 1) + width * bpp
+    if width <= 0 or height <= 0 or len(mapped) < needed:
+        raise ValueError(f"Размер файла не соответствует изображению {width}x{height}")
+    return QImage(memoryview(mapped)[offset:], width, height, stride, image_format)
+
+def _pnm_tokens(mapped, count: int):
+    """Первые count чисел заголовка P5/P6 и смещение пикселей"""
+    tokens = []
+    pos = 2
+    size = len(mapped)
+    while len(tokens) < count:
+        if pos >= size:
+            raise ValueError("Заголовок PNM обрывается до конца")
+        char = mapped[pos:pos + 1]
+        if char == b"#":
+            pos = mapped.find(b"\n", pos) + 1
+            if pos == 0:
+                raise ValueError("Заголовок PNM обрывается до конца")
+        elif char.isspace():
+            pos += 1
+        else:
+            end = pos
+            while end < size and not mapped[end:end + 1].isspace():
+                end += 1
+            try:
+                tokens.append(int(mapped[pos:end]))
+            except ValueError:
+                raise ValueError(f"Неверное число в заголовке PNM: {bytes(mapped[pos:end])!r}")
+            pos = end
+    # После последнего числа - ровно один пробельный символ
+    return tokens, pos + 1
+
+def _open_pnm(mapped) -> QImage:
+    magic = mapped[:2]
+    if magic in (b"P5", b"P6"):
+        (width, height, maxval), offset = _pnm_tokens(mapped, 3)
+        image_format = QImage.Format.Format_RGB888 if magic == b"P6" else QImage.Format.Format_Grayscale8
+    elif magic == b"P7":
+        end = mapped.find(b"ENDHDR\n")
+        if end < 0:
+            raise ValueError("Нет конца заголовка PAM")
+        fields = {}
+        for line in mapped[3:end].decode("ascii").splitlines():
+            if line and not line.startswith("#"):
+                key, _, value = line.partition(" ")
+                fields[key] = value.strip()
+        try:
+            width, height = int(fields["WIDTH"]), int(fields["HEIGHT"])
+            maxval = int(fields["MAXVAL"])
+        except KeyError as e:
+            raise ValueError(f"В заголовке PAM нет поля {e.args[0]}")
+        tupltype = fields.get("TUPLTYPE", "RGB")
+        if tupltype not in PAM_FORMATS:
+            raise ValueError(f"Неподдерживаемый тип PAM: {tupltype}")
+        image_format = PAM_FORMATS[tupltype]
+        offset = end + len(b"ENDHDR\n")
+    else:
+        raise ValueError("Поддерживаются только двоичные PGM, PPM и PAM")
+    if maxval != 255:
+        raise ValueError("Поддерживается только 8 бит на канал (MAXVAL 255)")
+    return _wrap(mapped, offset, width, height, image_format)
+
+def _open_npy(mapped) -> QImage:
+    stream = _MappedStream(mapped)
+    version = np.lib.format.read_magic(stream)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(stream)
+    else:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(stream)
+    if fortran_order:
+        raise ValueError("Массив должен храниться построчно (C-порядок)")
+    if len(shape) == 2 and dtype == np.dtype("<u4"):
+        image_format = QImage.Format.Format_RGB32  # упакованные 0xAARRGGBB
+    elif len(shape) == 2 and dtype == np.uint8:
+        image_format = QImage.Format.Format_Grayscale8
+    elif len(shape) == 3 and dtype == np.uint8 and shape[2] in (3, 4):
+        image_format = QImage.Format.Format_RGB888 if shape[2] == 3 else QImage.Format.Format_RGBA8888
+    else:
+        raise ValueError(f"Неподдерживаемый массив: {shape}, {dtype}")
+    return _wrap(mapped, stream.pos, shape[1], shape[0], image_format)
+
+class _MappedStream:
+    """Минимальный файловый интерфейс над отображением для чтения заголовка .npy"""
+    def __init__(self, mapped):
+        self.mapped = mapped
+        self.pos = 0
+
+    def read(self, size: int) -> bytes:
+        data = self.mapped[self.pos:self.pos + size]
+        self.pos += len(data)
+        return data
+
+def open_raw(filename: str, width: int = None, height: int = None,
+             raw_format: str = "rgb32", stride: int = None) -> QImage:
+    """
+    Открыть несжатый файл без декодирования.
+    Для .raw без заголовка нужно задать размер, раскладку и (при выравнивании) длину строки
+    """
+    mapped = _map(filename)
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == ".npy":
+        image = _open_npy(mapped)
+    elif extension == ".raw":
+        if not width or not height:
+            raise ValueError("Для файла .raw нужно указать ширину и высоту")
+        image = _wrap(mapped, 0, width, height, RAW_FORMATS[raw_format], stride)
+    else:
+        image = _open_pnm(mapped)
+    logger.info(f"Файл {filename} отображен в память: {image.width()}x{image.height()}, {image.format().name}")
+    return image
+
+def _pixels(image: QImage) -> np.ndarray:
+    """Пиксели без выравнивания строк (копия делается, только если строки дополнены)"""
+    return np.ascontiguousarray(image_view(image))
+
+def save_raw(image: QImage, filename: str):
+    """
+    Сохранить буфер изображения одной последовательной записью.
+    В PPM/PAM пиксели хранятся как R, G, B, поэтому RGB32 для них преобразуется;
+    .npy и .raw пишутся в формате буфера как есть (палитровые - цветами RGB32)
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if image.format() == QImage.Format.Format_Indexed8:
+        # Номера цветов без палитры ничего не значат - пишем цвета
+        image = image.convertToFormat(QImage.Format.Format_RGB32)
+    if extension == ".npy":
+        if image.format() == QImage.Format.Format_RGB32:
+            array = _pixels(image).view("<u4")[..., 0]
+        else:
+            array = _pixels(image)
+        with open(filename, "wb") as file:
+            np.lib.format.write_array(file, array, allow_pickle=False)
+        return
+
+    if extension == ".raw":
+        header = b""
+    else:
+        if image.format() == QImage.Format.Format_Grayscale8:
+            tupltype, depth = "GRAYSCALE", 1
+        elif image.format() == QImage.Format.Format_RGBA8888 and extension == ".pam":
+            tupltype, depth = "RGB_ALPHA", 4
+        else:
+            image = image.convertToFormat(QImage.Format.Format_RGB888)
+            tupltype, depth = "RGB", 3
+        if extension == ".pam":
+            header = (f"P7\nWIDTH {image.width()}\nHEIGHT {image.height()}\nDEPTH {depth}\n"
+                      f"MAXVAL 255\nTUPLTYPE {tupltype}\nENDHDR\n").encode("ascii")
+        else:
+            if extension == ".pgm" and depth != 1:
+                image = image.convertToFormat(QImage.Format.Format_Grayscale8)
+            magic = "P5" if image.format() == QImage.Format.Format_Grayscale8 else "P6"
+            header = f"{magic}\n{image.width()} {image.height()}\n255\n".encode("ascii")
+    with open(filename, "wb") as file:
+        file.write(header)
+        file.write(_pixels(image))
+    logger.info(f"Сохранено без сжатия: {filename} ({image.format().name})")
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+from PyQt6.QtGui import QImage
+from PyQt6.QtCore import QThread, QSize, Qt, pyqtSignal
+from utils.image_loader import ImageInfo, decode
+from utils.raw_io import is_raw_file, open_raw
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Каталог настроек и кэша миниатюр
+CONFIG_DIR = os.path.join(os.path.expanduser("~"), ".rastro")
+# Наибольшая сторона миниатюры
+THUMBNAIL_SIZE = 128
+
+class RecentFiles:
+    """Список недавно открытых файлов (последний - первым), хранится в JSON"""
+    def __init__(self, path: str = None, limit: int = 10):
+        self.path = path or os.path.join(CONFIG_DIR, "recent.json")
+        self.limit = limit
+        self.files = []
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                self.files = [name for name in json.load(file) if isinstance(name, str)][:limit]
+        except (OSError, ValueError):
+            pass
+
+    def add(self, filename: str):
+        filename = os.path.abspath(filename)
+        self.files = [filename] + [name for name in self.files if name != filename]
+        del self.files[self.limit:]
+        self.save()
+
+    def remove(self, filename: str):
+        self.files = [name for name in self.files if name != filename]
+        self.save()
+
+    def existing(self):
+        """Файлы списка, которые еще есть на диске"""
+        return [name for name in self.files if os.path.isfile(name)]
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as file:
+                json.dump(self.files, file, ensure_ascii=False, indent=1)
+        except OSError as e:
+            logger.error(f"Не удалось сохранить список недавних файлов: {str(e)}")
+
+class ThumbnailCache:
+    """
+    Кэш миниатюр на диске. Ключ - путь, время изменения и размер файла,
+    поэтому измененный файл получает новую миниатюру, а старая вытесняется.
+    Общий объем ограничен max_bytes; вытесняются давно не использованные
+    (время доступа хранится как время изменения файла миниатюры)
+    """
+    def __init__(self, directory: str = None, max_bytes: int = 32 * 1024 ** 2):
+        self.directory = directory or os.path.join(CONFIG_DIR, "thumbnails")
+        self.max_bytes = max_bytes
+
+    def key(self, filename: str) -> str:
+        """Ключ миниатюры; None, если файла нет"""
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return None
+        source = f"{os.path.abspath(filename)}|{stat.st_mtime_ns}|{stat.st_size}".encode()
+        return hashlib.blake2b(source, digest_size=16).hexdigest()
+
+    def entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.png")
+
+    def get(self, filename: str) -> QImage:
+        """Миниатюра из кэша или None. Читается только маленький файл миниатюры"""
+        key = self.key(filename)
+        if key is None:
+            return None
+        path = self.entry_path(key)
+        # Поток миниатюр может вытеснить файл в любой момент между проверкой и отметкой
+        try:
+            if not os.path.exists(path):
+                return None
+            image = QImage(path)
+            if image.isNull():
+                return None
+            os.utime(path)  # Отметка использования для вытеснения
+        except OSError:
+            return None
+        return image
+
+    def put(self, filename: str, thumbnail: QImage):
+        key = self.key(filename)
+        if key is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.entry_path(key)
+        # Запись через временный файл: читатель не увидит половину миниатюры
+        temporary = f"{path}.{os.getpid()}.tmp"
+        if thumbnail.save(temporary, "png"):
+            os.replace(temporary, path)
+            self.evict()
+
+    def evict(self):
+        """Удалить давно не использованные миниатюры сверх max_bytes"""
+        try:
+            found = [entry for entry in os.scandir(self.directory) if entry.name.endswith(".png")]
+        except OSError:
+            return
+        entries = []
+        for entry in found:
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue  # Удален другим потоком
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort(reverse=True)
+        total = 0
+        for _, size, path in entries:
+            total += size
+            if total > self.max_bytes:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def usage(self) -> int:
+        try:
+            return sum(entry.stat().st_size for entry in os.scandir(self.directory))
+        except OSError:
+            return 0
+
+def make_thumbnail(filename: str, size: int = THUMBNAIL_SIZE) -> QImage:
+    """
+    Построить миниатюру файла.
+    Декодер уменьшает при чтении, если формат это умеет (JPEG);
+    несжатые файлы отображаются в память и уменьшаются без копии
+    """
+    box = QSize(size, size)
+    if is_raw_file(filename):
+        image = open_raw(filename)
+    else:
+        info = ImageInfo(filename)
+        if not info.is_valid():
+            raise ValueError(f"Не удалось прочитать {filename}: {info.error}")
+        scaled = info.size.scaled(box, Qt.AspectRatioMode.KeepAspectRatio) if info.can_scale else None
+        image = decode(filename, scaled_size=scaled)
+    return image.scaled(box, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
+
+class ThumbnailThread(QThread):
+    """Построение недостающих миниатюр в фоновом потоке"""
+    thumbnail_ready = pyqtSignal(str, QImage)
+
+    def __init__(self, cache: ThumbnailCache, filenames, parent=None):
+        super().__init__(parent)
+        self.cache = cache
+        self.filenames = list(filenames)
+
+    def run(self):
+        for filename in self.filenames:
+            # Ошибка одного файла не прерывает построение остальных
+            try:
+                thumbnail = make_thumbnail(filename)
+                self.cache.put(filename, thumbnail)
+            except Exception as e:
+                logger.warning(f"Миниатюра {filename} не построена: {str(e)}")
+                continue
+            self.thumbnail_ready.emit(filename, thumbnail)
@@ -0,0 +1,156 @@
+import queue
+import threading
+from PyQt6.QtCore import QObject, QPoint, QRect, QSize, pyqtSignal
+from PyQt6.QtGui import QImage
+from utils.pixel_format import painting
+import logging
+
+logger = logging.getLogger(__name__)
+
+class StrokeContext:
+    """Снимок состояния холста, который нужен инструменту при рисовании в потоке"""
+    def __init__(self, last_point: QPoint, size: QSize):
+        self.lastPoint = QPoint(last_point)
+        self._size = QSize(size)
+
+    def width(self) -> int:
+        return self._size.width()
+
+    def height(self) -> int:
+        return self._size.height()
+
+class StrokeSegment:
+    """
+    Команда рисования одного участка штриха.
+    Инструмент передается копией, чтобы поток не видел последующих изменений
+    """
+    def __init__(self, tool, last_point: QPoint, pos: QPoint, size: QSize, dirty, preview=False):
+        self.tool = tool
+        self.context = StrokeContext(last_point, size)
+        self.pos = QPoint(pos)
+        self.dirty = dirty
+        # Предпросмотр (линия) перерисовывается целиком от исходного состояния
+        self.preview = preview
+
+    def supersedes(self, other) -> bool:
+        """Можно ли пропустить команду other, если за ней в очереди идет эта"""
+        return self.preview and isinstance(other, StrokeSegment) and other.preview
+
+    def __call__(self, image: QImage) -> QRect:
+        changed = QRect()
+        if self.preview:
+            # Стираем прежний предпросмотр по сохраненным исходным плиткам
+            changed = QRect(self.dirty.rect)
+            self.dirty.restore(image, changed)
+        rect = self.tool.dirty_rect(self.context, self.pos)
+        self.dirty.touch(image, rect)
+        with painting(image, rect) as painter:
+            self.tool.draw(self.context, self.pos, painter)
+        return changed.united(rect)
+
+class StrokeFinish:
+    """
+    Финальный проход: область штриха восстанавливается до исходного
+    состояния и штрих перерисовывается целиком в полном качестве
+    """
+    def __init__(self, tool, points, size: QSize, dirty):
+        self.tool = tool
+        self.points = [QPoint(point) for point in points]
+        self.context = StrokeContext(self.points[0], size)
+        self.dirty = dirty
+
+    def __call__(self, image: QImage) -> QRect:
+        changed = QRect(self.dirty.rect)
+        self.dirty.restore(image, changed)
+        for previous, pos in zip(self.points, self.points[1:]):
+            self.context.lastPoint = previous
+            rect = self.tool.dirty_rect(self.context, pos)
+            self.dirty.touch(image, rect)
+            changed = changed.united(rect)
+        with painting(image, changed) as painter:
+            self.tool.draw_stroke(self.context, self.points, painter)
+        return changed
+
+class RenderWorker(QObject):
+    """
+    Поток растеризации. Владеет рабочим изображением и выполняет очередь
+    команд рисования, а готовые области публикует для вывода на экран.
+    Пока поток рисует, интерфейс продолжает принимать события ввода
+    """
+    regions_ready = pyqtSignal()
+
+    def __init__(self, image: QImage):
+        super().__init__()
+        self.image = image
+        self.commands = queue.Queue()
+        self._published = []
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="rastro-render", daemon=True)
+        self._thread.start()
+
+    def submit(self, command):
+        """Поставить команду в очередь. command(image) рисует и возвращает измененную область"""
+        self.commands.put(command)
+
+    def sync(self):
+        """Дождаться выполнения всех поставленных команд"""
+        self.commands.join()
+
+    def stop(self):
+        """Завершить поток после выполнения очереди"""
+        if self._thread.is_alive():
+            self.commands.put(None)
+            self._thread.join()
+
+    def publish(self, rect: QRect):
+        """Передать содержимое области для вывода на экран"""
+        rect = rect.intersected(self.image.rect())
+        if rect.isEmpty():
+            return
+        with self._lock:
+            self._published.append((rect, self.image.copy(rect)))
+        self.regions_ready.emit()
+
+    def take_published(self):
+        """Забрать опубликованные области в порядке публикации"""
+        with self._lock:
+            regions, self._published = self._published, []
+        return regions
+
+    def discard_published(self):
+        """Отбросить неотображенные области (изображение заменено целиком)"""
+        self.take_published()
+
+    def _next_batch(self):
+        """Первая команда ждет, остальные забираются из очереди без ожидания"""
+        batch = [self.commands.get()]
+        while batch[-1] is not None:
+            try:
+                batch.append(self.commands.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            changed = QRect()
+            try:
+                for index, command in enumerate(batch):
+                    if command is None:
+                        break
+                    following = batch[index + 1] if index + 1 < len(batch) else None
+                    # Устаревший предпросмотр не рисуем, если за ним уже есть новый
+                    if following is not None and getattr(following, "supersedes", None) \
+                            and following.supersedes(command):
+                        continue
+                    changed = changed.united(command(self.image))
+                if not changed.isEmpty():
+                    self.publish(changed)
+            except Exception as e:
+                logger.error(f"Ошибка растеризации: {str(e)}")
+            finally:
+                for _ in batch:
+                    self.commands.task_done()
+            if batch[-1] is None:
+                break
@@ -0,0 +1,143 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PyQt6.QtCore import QThread, pyqtSignal
+from PyQt6.QtGui import QImage
+from utils.image_array import image_view
+from utils.image_ops import to_canvas_format
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _triangle(x):
+    return np.maximum(0.0, 1.0 - np.abs(x))
+
+def _bicubic(x, a=-0.5):
+    x = np.abs(x)
+    near = ((a + 2) * x - (a + 3)) * x * x + 1
+    far = ((a * x - 5 * a) * x + 8 * a) * x - 4 * a
+    return np.where(x < 1, near, np.where(x < 2, far, 0.0))
+
+def _lanczos(x, lobes=3):
+    return np.where(np.abs(x) < lobes, np.sinc(x) * np.sinc(x / lobes), 0.0)
+
+# Фильтр: (ядро, радиус). Ближайший сосед обрабатывается отдельно
+FILTERS = {
+    "nearest": (None, 0.5),
+    "bilinear": (_triangle, 1.0),
+    "bicubic": (_bicubic, 2.0),
+    "lanczos": (_lanczos, 3.0),
+}
+
+# Названия фильтров для интерфейса
+FILTER_NAMES = {
+    "nearest": "Ближайший сосед",
+    "bilinear": "Билинейный",
+    "bicubic": "Бикубический",
+    "lanczos": "Ланцош",
+}
+
+def _weights(in_size: int, out_size: int, kernel, radius: float):
+    """
+    Индексы исходных пикселей и веса для каждого выходного пикселя.
+    Возвращает два массива формы (out_size, число отсчетов)
+    """
+    scale = in_size / out_size
+    centers = (np.arange(out_size) + 0.5) * scale
+    if kernel is None:
+        index = np.minimum(centers.astype(np.intp), in_size - 1)[:, None]
+        return index, np.ones((out_size, 1), np.float32)
+
+    # При уменьшении ядро растягивается, иначе появляется алиасинг
+    stretch = max(scale, 1.0)
+    support = radius * stretch
+    taps = int(np.ceil(support * 2)) + 1
+    first = np.floor(centers - support).astype(np.intp)
+    index = first[:, None] + np.arange(taps)[None, :]
+    weights = kernel((index + 0.5 - centers[:, None]) / stretch)
+    weights /= weights.sum(axis=1, keepdims=True)
+    return np.clip(index, 0, in_size - 1), weights.astype(np.float32)
+
+def resample(image: QImage, width: int, height: int, method: str = "bilinear",
+             workers: int = None, band_rows: int = 64) -> QImage:
+    """
+    Масштабирование изображения с выбранным фильтром.
+    Результат считается полосами строк в пуле потоков; для каждой полосы
+    горизонтальный проход выполняется только над нужными ей исходными
+    строками, поэтому полноразмерных промежуточных буферов нет.
+    При уменьшении больше чем вдвое исходник предварительно усредняется блоками
+    """
+    if method not in FILTERS:
+        raise ValueError(f"Неизвестный фильтр масштабирования: {method}")
+    if image.format() != QImage.Format.Format_RGB32:
+        image = to_canvas_format(image)
+
+    source = image_view(image)
+    result = QImage(width, height, QImage.Format.Format_RGB32)
+    target = image_view(result, writable=True)
+
+    kernel, radius = FILTERS[method]
+    # При сильном уменьшении исходник сначала сжимается усреднением целых блоков,
+    # чтобы фильтр работал с запасом не больше двукратного
+    block_x = max(1, image.width() // (width * 2)) if kernel else 1
+    block_y = max(1, image.height() // (height * 2)) if kernel else 1
+    reduced_width = image.width() // block_x
+    reduced_height = image.height() // block_y
+
+    col_index, col_weights = _weights(reduced_width, width, kernel, radius)
+    row_index, row_weights = _weights(reduced_height, height, kernel, radius)
+
+    def reduced_rows(first, last):
+        """Строки исходника [first, last) после блочного усреднения"""
+        rows = source[first * block_y:last * block_y, :reduced_width * block_x]
+        if block_x == block_y == 1:
+            return rows.astype(np.float32)
+        blocks = rows.reshape(last - first, block_y, reduced_width, block_x, 4)
+        return blocks.sum(axis=(1, 3), dtype=np.float32) / (block_x * block_y)
+
+    def process_band(top):
+        bottom = min(top + band_rows, height)
+        rows = row_index[top:bottom]
+        if kernel is None:
+            target[top:bottom] = source[rows[:, 0]][:, col_index[:, 0]]
+            return
+
+        first, last = rows.min(), rows.max() + 1
+        band_source = reduced_rows(first, last)
+        horizontal = np.zeros((last - first, width, 4), np.float32)
+        for tap in range(col_index.shape[1]):
+            horizontal += band_source[:, col_index[:, tap]] * col_weights[:, tap, None]
+
+        band = np.zeros((bottom - top, width, 4), np.float32)
+        for tap in range(rows.shape[1]):
+            band += horizontal[rows[:, tap] - first] * row_weights[top:bottom, tap, None, None]
+
+        np.clip(band + 0.5, 0, 255, out=band)
+        target[top:bottom] = band.astype(np.uint8)
+        target[top:bottom, :, 3] = 255
+
+    workers = workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(process_band, range(0, height, band_rows)))
+
+    logger.debug(f"Масштабирование {image.width()}x{image.height()} -> {width}x{height} ({method})")
+    return result
+
+class ResampleThread(QThread):
+    """Масштабирование в фоновом потоке, чтобы не блокировать интерфейс"""
+    finished_image = pyqtSignal(QImage)
+    failed = pyqtSignal(str)
+
+    def __init__(self, image: QImage, width: int, height: int, method: str, parent=None):
+        super().__init__(parent)
+        # Неявно разделяемая копия: холст при рисовании отсоединит свой буфер
+        self.image = QImage(image)
+        self.target_size = (width, height)
+        self.method = method
+
+    def run(self):
+        try:
+            self.finished_image.emit(resample(self.image, *self.target_size, self.method))
+        except Exception as e:
+            logger.error(f"Ошибка масштабирования: {str(e)}")
+            self.failed.emit(str(e))
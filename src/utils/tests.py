@@ -1,4 +1,7 @@
+import gc
+import os
 import sys
+import time
 from pathlib import Path
 
 # Добавляем корневую директорию проекта в PYTHONPATH
@@ -7,16 +10,40 @@ project_root = current_dir.parent    # src/
 sys.path.insert(0, str(project_root))
 
 import pytest
+import numpy as np
 from PyQt6.QtWidgets import QApplication
-from PyQt6.QtGui import QImage, QColor, QPainter, QMouseEvent
-from PyQt6.QtCore import Qt, QPoint, QEvent, QPointF
-from gui.main_window import MainWindow
+from PyQt6.QtGui import QImage, QColor, QPainter, QPen, QMouseEvent, QKeyEvent
+from PyQt6.QtCore import Qt, QPoint, QEvent, QPointF, QRect, QSize
+from gui.main_window import MainWindow, ExportDialog
 from gui.canvas import Canvas
+from gui.navigator import Navigator
 from tools.brush import BrushTool
 from tools.eraser import EraserTool
 from tools.line import LineTool
 from tools.fill import FillTool
-from utils.history_manager import HistoryManager
+from tools.selection import SelectionTool
+from tools.gradient import GradientTool
+from tools.text import TextTool
+from utils.history_manager import HistoryManager, RegionPatch, ImageOperation, is_snapshot
+from utils.image_ops import resize_canvas
+from utils.batch import BatchJob, run_batch, iter_input_files
+from utils.resample import resample, FILTERS as RESAMPLE_FILTERS
+from utils.image_stats import ImageStats
+from utils import perf
+from utils.image_loader import ImageInfo, ImageLoadThread, PREVIEW_SIZE
+from utils.export import ExportTarget, export_all, downscale_chain
+from utils.quantize import quantize
+from utils.gradient import render_gradient
+from utils.image_array import image_view
+from utils.motion_predictor import MotionPredictor
+from utils.idle_scheduler import IdleScheduler, HIGH, LOW
+from utils.raw_io import open_raw
+from utils import recent_files
+from utils.recent_files import RecentFiles, ThumbnailCache, ThumbnailThread
+from utils.image_diff import compare_images
+from utils.watchdog import StallWatchdog
+from utils.timelapse import TimelapseRecorder
+from utils.pixel_format import pixel_format
 import logging
 from utils.logger import rastro_logger as logger
 
@@ -221,5 +248,949 @@ def test_canvas_resize(canvas):
     assert canvas.width() == new_width
     assert canvas.height() == new_height
 
+def test_resize_canvas_semantics():
+    """Изменение размера холста обрезает или дополняет белым"""
+    image = QImage(50, 40, QImage.Format.Format_RGB32)
+    image.fill(Qt.GlobalColor.red)
+
+    larger = resize_canvas(image, 80, 60)
+    assert larger.size().width() == 80 and larger.size().height() == 60
+    assert larger.pixelColor(10, 10).rgb() == QColor(Qt.GlobalColor.red).rgb()
+    assert larger.pixelColor(70, 50).rgb() == QColor(Qt.GlobalColor.white).rgb()
+
+    smaller = resize_canvas(image, 20, 20)
+    assert smaller.width() == 20 and smaller.height() == 20
+
+def test_batch_processing(tmp_path):
+    """Пакетная обработка директории"""
+    source_dir = tmp_path / "in"
+    source_dir.mkdir()
+    for index in range(3):
+        image = QImage(30, 30, QImage.Format.Format_RGB32)
+        image.fill(Qt.GlobalColor.black)
+        image.save(str(source_dir / f"image_{index}.png"))
+
+    job = BatchJob(tmp_path / "out", size=(40, 20), image_format="bmp", filters=["invert"])
+    result = run_batch(iter_input_files(str(source_dir)), job, workers=2)
+
+    assert result.processed == 3
+    assert not result.failed
+    output = QImage(str(tmp_path / "out" / "image_0.bmp"))
+    assert output.width() == 40 and output.height() == 20
+    assert output.pixelColor(5, 5).rgb() == QColor(Qt.GlobalColor.white).rgb()
+    assert output.pixelColor(35, 5).rgb() == QColor(Qt.GlobalColor.black).rgb()
+
+    # Одинаковые имена из разных директорий не перезаписывают друг друга
+    for name in ("a", "b"):
+        (source_dir / name).mkdir()
+        QImage(10, 10, QImage.Format.Format_RGB32).save(str(source_dir / name / "same.png"))
+    job = BatchJob(tmp_path / "same", image_format="png")
+    result = run_batch(iter_input_files(str(source_dir / "**" / "same.png")), job, workers=2)
+    assert result.processed == 2
+    assert sorted(os.listdir(tmp_path / "same")) == ["same.png", "same_2.png"]
+
+    # Исключение в рабочем процессе записывается как ошибка файла
+    job = BatchJob(tmp_path / "bad", filters=["no-such-filter"])
+    result = run_batch(iter_input_files(str(source_dir)), job, workers=2)
+    assert result.processed == 0 and len(result.failed) == 3
+
+@pytest.mark.parametrize("method", sorted(RESAMPLE_FILTERS))
+def test_resample_filters(method):
+    """Масштабирование сохраняет однотонную заливку при любом фильтре"""
+    image = QImage(301, 203, QImage.Format.Format_RGB32)
+    image.fill(QColor(200, 100, 50))
+
+    for width, height in ((97, 61), (640, 480)):
+        scaled = resample(image, width, height, method, band_rows=16)
+        assert scaled.width() == width and scaled.height() == height
+        for x, y in ((0, 0), (width // 2, height // 2), (width - 1, height - 1)):
+            assert scaled.pixelColor(x, y).rgb() == QColor(200, 100, 50).rgb()
+
+def test_scale_is_single_history_step(canvas):
+    """Масштабирование - один шаг истории, отмена возвращает размер"""
+    width, height = canvas.width(), canvas.height()
+    steps = len(canvas.history.undo_stack)
+
+    canvas.set_image(resample(canvas.image, width // 2, height // 2, "lanczos"))
+    assert len(canvas.history.undo_stack) == steps + 1
+    assert canvas.width() == width // 2
+
+    canvas.undo()
+    assert canvas.width() == width and canvas.height() == height
+
+def test_selection_move_is_region_patch(canvas):
+    """Перемещение выделения - один шаг истории только по двум областям"""
+    canvas.image.fill(Qt.GlobalColor.white)
+    canvas.image.setPixelColor(15, 15, QColor(Qt.GlobalColor.red))
+    canvas.history.push_state(canvas.image)
+    canvas.current_tool = SelectionTool()
+
+    # Выделяем область и перетаскиваем ее
+    canvas.mousePressEvent(create_mouse_event(QPoint(10, 10)))
+    canvas.mouseMoveEvent(create_mouse_event(QPoint(30, 30), type=QEvent.Type.MouseMove))
+    canvas.mouseReleaseEvent(create_mouse_event(QPoint(30, 30), type=QEvent.Type.MouseButtonRelease))
+    canvas.mousePressEvent(create_mouse_event(QPoint(20, 20)))
+    canvas.mouseMoveEvent(create_mouse_event(QPoint(120, 70), type=QEvent.Type.MouseMove))
+    canvas.mouseReleaseEvent(create_mouse_event(QPoint(120, 70), type=QEvent.Type.MouseButtonRelease))
+
+    # До фиксации изображение не меняется
+    assert canvas.image.pixelColor(15, 15).rgb() == QColor(Qt.GlobalColor.red).rgb()
+
+    steps = len(canvas.history.undo_stack)
+    canvas.commit_selection()
+    assert len(canvas.history.undo_stack) == steps + 1
+    patch = canvas.history.undo_stack[-1]
+    assert isinstance(patch, RegionPatch)
+    assert len(patch.rects) == 2
+    assert canvas.image.pixelColor(15, 15).rgb() == QColor(Qt.GlobalColor.white).rgb()
+    assert canvas.image.pixelColor(115, 65).rgb() == QColor(Qt.GlobalColor.red).rgb()
+
+    canvas.undo()
+    assert canvas.image.pixelColor(15, 15).rgb() == QColor(Qt.GlobalColor.red).rgb()
+    assert canvas.image.pixelColor(115, 65).rgb() == QColor(Qt.GlobalColor.white).rgb()
+    canvas.redo()
+    assert canvas.image.pixelColor(115, 65).rgb() == QColor(Qt.GlobalColor.red).rgb()
+
+def test_history_trim_keeps_snapshot_base():
+    """После вытеснения старых шагов нижний элемент истории - полный снимок"""
+    history = HistoryManager(max_steps=2)
+    image = QImage(20, 20, QImage.Format.Format_RGB32)
+    image.fill(Qt.GlobalColor.white)
+    history.push_state(image)
+
+    patch = RegionPatch(image, [QRect(0, 0, 5, 5)])
+    image.fill(Qt.GlobalColor.blue)
+    history.push_patch(patch.finish(image))
+    history.push_patch(RegionPatch(image, [QRect(5, 5, 5, 5)]).finish(image))
+
+    assert len(history.undo_stack) == 2
+    assert is_snapshot(history.undo_stack[0])
+    assert history.undo_stack[0].pixelColor(0, 0).rgb() == QColor(Qt.GlobalColor.blue).rgb()
+    assert history.undo_stack[0].pixelColor(10, 10).rgb() == QColor(Qt.GlobalColor.white).rgb()
+
+def test_incremental_stats_match_rescan(canvas):
+    """Статистика, обновленная по областям, совпадает с полным пересчетом"""
+    stats = ImageStats()
+    stats.rescan(canvas.image)
+    canvas.region_changed.connect(lambda rect, before: stats.update_region(rect, before, canvas.image))
+
+    canvas.current_tool.color = QColor(10, 200, 30)
+    canvas.lastPoint = QPoint(20, 20)
+    canvas.mousePressEvent(create_mouse_event(QPoint(20, 20)))
+    canvas.mouseMoveEvent(create_mouse_event(QPoint(150, 90), type=QEvent.Type.MouseMove))
+    canvas.mouseMoveEvent(create_mouse_event(QPoint(300, 40), type=QEvent.Type.MouseMove))
+    canvas.mouseReleaseEvent(create_mouse_event(QPoint(300, 40), type=QEvent.Type.MouseButtonRelease))
+
+    expected = ImageStats()
+    expected.rescan(canvas.image)
+    assert stats.unique_colors == expected.unique_colors > 1
+    assert (stats.channels == expected.channels).all()
+    assert stats.mean == pytest.approx(expected.mean)
+
+def test_navigator_incremental_thumbnail(window):
+    """Миниатюра навигатора обновляется только под измененной областью"""
+    navigator, canvas = window.navigator, window.canvas
+    thumbnail = navigator.thumbnail
+    assert max(thumbnail.width(), thumbnail.height()) <= navigator.max_size
+
+    canvas.edit_regions([QRect(400, 300, 200, 200)],
+                        lambda painter: painter.fillRect(QRect(400, 300, 200, 200), Qt.GlobalColor.blue))
+
+    # Тот же объект миниатюры, изменены только ее пиксели
+    assert navigator.thumbnail is thumbnail
+    x = int(500 * thumbnail.width() / canvas.image.width())
+    y = int(400 * thumbnail.height() / canvas.image.height())
+    assert navigator.thumbnail.pixelColor(x, y).rgb() == QColor(Qt.GlobalColor.blue).rgb()
+    assert navigator.thumbnail.pixelColor(2, 2).rgb() == QColor(Qt.GlobalColor.white).rgb()
+
+    # Маленький палитровый документ: миниатюра в натуральную величину тоже обновляется
+    canvas.set_image(QImage(150, 100, QImage.Format.Format_RGB32), keep_format=False)
+    canvas.set_pixel_format("indexed8", [QColor(Qt.GlobalColor.white).rgb(), QColor(Qt.GlobalColor.blue).rgb()])
+    assert navigator.thumbnail.format() == QImage.Format.Format_RGB32
+    canvas.edit_regions([QRect(10, 10, 20, 20)],
+                        lambda painter: painter.fillRect(QRect(10, 10, 20, 20), Qt.GlobalColor.blue))
+    assert navigator.thumbnail.pixelColor(15, 15).rgb() == QColor(Qt.GlobalColor.blue).rgb()
+
+def test_line_preview_in_render_worker(app, canvas):
+    """Предпросмотр линии в потоке растеризации не оставляет следов"""
+    canvas.current_tool = LineTool()
+    canvas.brush_size = 3
+    canvas.mousePressEvent(create_mouse_event(QPoint(10, 10)))
+    canvas.mouseMoveEvent(create_mouse_event(QPoint(10, 200), type=QEvent.Type.MouseMove))
+    canvas.mouseMoveEvent(create_mouse_event(QPoint(200, 10), type=QEvent.Type.MouseMove))
+    canvas.mouseReleaseEvent(create_mouse_event(QPoint(200, 10), type=QEvent.Type.MouseButtonRelease))
+
+    assert canvas.image.pixelColor(10, 150).rgb() == QColor(Qt.GlobalColor.white).rgb()
+    assert canvas.image.pixelColor(100, 10).rgb() == QColor(Qt.GlobalColor.black).rgb()
+
+    # Экранная копия догоняет рабочее изображение после обработки событий
+    app.processEvents()
+    display = canvas.backing.toImage()
+    assert display.pixelColor(100, 10).rgb() == QColor(Qt.GlobalColor.black).rgb()
+    assert display.pixelColor(10, 150).rgb() == QColor(Qt.GlobalColor.white).rgb()
+
+def test_input_not_blocked_by_rasterization(canvas):
+    """Пока поток растеризации занят, события мыши обрабатываются сразу"""
+    canvas.renderer.submit(lambda image: time.sleep(0.3) or QRect())
+
+    start = time.perf_counter()
+    canvas.mousePressEvent(create_mouse_event(QPoint(20, 20)))
+    canvas.mouseMoveEvent(create_mouse_event(QPoint(60, 60), type=QEvent.Type.MouseMove))
+    assert time.perf_counter() - start < 0.2
+
+    canvas.mouseReleaseEvent(create_mouse_event(QPoint(60, 60), type=QEvent.Type.MouseButtonRelease))
+    assert canvas.image.pixelColor(40, 40).rgb() == QColor(Qt.GlobalColor.black).rgb()
+
+def test_fast_preview_refined_on_release(canvas):
+    """Крупная кисть рисуется без сглаживания, а после отпускания - в полном качестве"""
+    canvas.brush_size = 20
+    canvas.quality.min_brush_size = 10
+    canvas.quality.smooth_strokes = True
+    canvas.mousePressEvent(create_mouse_event(QPoint(50, 50)))
+    canvas.mouseMoveEvent(create_mouse_event(QPoint(150, 80), type=QEvent.Type.MouseMove))
+    canvas.mouseMoveEvent(create_mouse_event(QPoint(250, 50), type=QEvent.Type.MouseMove))
+    assert canvas.current_tool.fast
+
+    # Во время перетаскивания - только чистые цвета без сглаживания
+    preview = canvas.image
+    colors = {preview.pixel(x, y) for x in range(40, 260) for y in range(30, 100)}
+    assert len(colors) == 2
+
+    canvas.mouseReleaseEvent(create_mouse_event(QPoint(250, 50), type=QEvent.Type.MouseButtonRelease))
+    final = canvas.image
+    colors = {final.pixel(x, y) for x in range(40, 260) for y in range(30, 100)}
+    assert len(colors) > 2
+    # Скругленный конец штриха
+    assert final.pixelColor(50 - 9, 50).rgb() == QColor(Qt.GlobalColor.black).rgb()
+    assert final.pixelColor(50 - 9, 50 - 9).rgb() == QColor(Qt.GlobalColor.white).rgb()
+
+def test_default_stroke_keeps_tool_pen(canvas):
+    """Без smooth_strokes готовый штрих рисуется обычным пером кисти"""
+    canvas.brush_size = 20
+    canvas.quality.min_brush_size = 10
+    points = [QPoint(50, 50), QPoint(150, 80), QPoint(250, 50)]
+    canvas.mousePressEvent(create_mouse_event(points[0]))
+    for point in points[1:]:
+        canvas.mouseMoveEvent(create_mouse_event(point, type=QEvent.Type.MouseMove))
+    canvas.mouseReleaseEvent(create_mouse_event(points[-1], type=QEvent.Type.MouseButtonRelease))
+
+    expected = QImage(canvas.image.size(), canvas.image.format())
+    expected.fill(Qt.GlobalColor.white)
+    painter = QPainter(expected)
+    painter.setPen(QPen(QColor(Qt.GlobalColor.black), 20, Qt.PenStyle.SolidLine))
+    for previous, point in zip(points, points[1:]):
+        painter.drawLine(previous, point)
+    painter.end()
+    assert canvas.image == expected
+
+def test_fast_pen_inside_dirty_rect(canvas):
+    """Квадратные концы быстрого пера на диагонали не выходят за изменяемую область"""
+    tool = BrushTool()
+    tool.color = QColor(Qt.GlobalColor.black)
+    tool.size = 60
+    tool.fast = True
+    canvas.lastPoint = QPoint(300, 300)
+    image = QImage(800, 600, QImage.Format.Format_RGB32)
+    image.fill(Qt.GlobalColor.white)
+    painter = QPainter(image)
+    tool.draw(canvas, QPoint(400, 400), painter)
+    painter.end()
+
+    pixels = np.frombuffer(image.constBits().asstring(image.sizeInBytes()), np.uint32).reshape(600, 800)
+    rect = tool.dirty_rect(canvas, QPoint(400, 400))
+    inside = pixels[rect.top():rect.bottom() + 1, rect.left():rect.right() + 1]
+    assert (pixels != 0xFFFFFFFF).sum() == (inside != 0xFFFFFFFF).sum() > 0
+
+def test_backing_pixmap_updated_by_regions(canvas):
+    """Экранная копия обновляется только по измененным областям и выводится без преобразования"""
+    perf.reset()
+    canvas.mousePressEvent(create_mouse_event(QPoint(20, 20)))
+    canvas.mouseMoveEvent(create_mouse_event(QPoint(60, 20), type=QEvent.Type.MouseMove))
+    canvas.mouseReleaseEvent(create_mouse_event(QPoint(60, 20), type=QEvent.Type.MouseButtonRelease))
+    QApplication.processEvents()
+
+    display = canvas.backing.toImage()
+    assert display.pixelColor(40, 20).rgb() == QColor(Qt.GlobalColor.black).rgb()
+    assert display.pixelColor(40, 200).rgb() == QColor(Qt.GlobalColor.white).rgb()
+    assert perf.counter("canvas.backing_upload").count >= 1
+    assert perf.counter("canvas.backing_rebuild").count == 0
+
+    frame = canvas.grab().toImage()
+    assert frame.pixelColor(40, 20).rgb() == QColor(Qt.GlobalColor.black).rgb()
+    assert perf.counter("canvas.paint").count >= 1
+    assert "canvas.paint" in perf.report()
+
+def test_load_image_decodes_into_canvas_format(canvas, tmp_path):
+    """Прозрачность при загрузке заменяется белым, история начинается заново"""
+    source = QImage(40, 30, QImage.Format.Format_ARGB32)
+    source.fill(Qt.GlobalColor.transparent)
+    source.setPixelColor(5, 5, QColor(Qt.GlobalColor.red))
+    path = str(tmp_path / "alpha.png")
+    source.save(path)
+
+    canvas.load_image(path)
+    assert canvas.image.format() == QImage.Format.Format_RGB32
+    assert canvas.image.size() == QSize(40, 30)
+    assert canvas.image.pixelColor(0, 0).rgb() == QColor(Qt.GlobalColor.white).rgb()
+    assert canvas.image.pixelColor(5, 5).rgb() == QColor(Qt.GlobalColor.red).rgb()
+    assert len(canvas.history.undo_stack) == 1
+
+def test_progressive_load(app, canvas, tmp_path):
+    """Большой JPEG: сначала эскиз и видимая область, затем изображение целиком"""
+    source = QImage(2600, 2000, QImage.Format.Format_RGB32)
+    source.fill(QColor(200, 30, 30))
+    path = str(tmp_path / "large.jpg")
+    source.save(path)
+
+    info = ImageInfo(path)
+    assert info.size == QSize(2600, 2000) and info.is_large()
+
+    events = []
+    thread = ImageLoadThread(path, QRect(0, 0, 300, 200))
+    thread.preview_ready.connect(lambda image, size: events.append(("preview", image.size(), size)))
+    thread.region_ready.connect(lambda rect, image: events.append(("region", rect, image.size())))
+    thread.finished_image.connect(lambda image: events.append(("image", image.size())))
+    thread.start()
+    thread.wait()
+    QApplication.processEvents()
+    assert [event[0] for event in events] == ["preview", "region", "image"]
+    assert max(events[0][1].width(), events[0][1].height()) == PREVIEW_SIZE
+    assert events[1][2] == QSize(300, 200)
+
+    # Холст не принимает правки, пока файл загружается
+    thread = canvas.start_loading(path, QRect(0, 0, 300, 200))
+    assert not canvas.isEnabled() and canvas.is_busy()
+    with pytest.raises(RuntimeError):
+        canvas.start_loading(path)
+    thread.wait()
+    QApplication.processEvents()
+    assert canvas.isEnabled()
+    assert canvas.image.size() == QSize(2600, 2000)
+    assert canvas.image.format() == QImage.Format.Format_RGB32
+
+def test_document_actions_disabled_while_loading(window, tmp_path):
+    """Пока файл загружается, правки документа из меню и панели недоступны"""
+    path = str(tmp_path / "image.png")
+    QImage(300, 200, QImage.Format.Format_RGB32).save(path)
+    window.open_file(path)
+    canvas = window.canvas
+    assert canvas.is_busy()
+    assert not any(action.isEnabled() for action in window.document_actions)
+
+    canvas.load_thread.wait()
+    QApplication.processEvents()
+    assert not canvas.is_busy()
+    assert all(action.isEnabled() for action in window.document_actions)
+
+def test_export_profile(tmp_path):
+    """Все цели профиля записываются за одну операцию с нужными размерами и форматами"""
+    image = QImage(1000, 600, QImage.Format.Format_RGB32)
+    image.fill(QColor(10, 120, 200))
+    targets = [
+        ExportTarget("full", None, "png", compression=9),
+        ExportTarget("web", 480, "jpg", quality=70),
+        ExportTarget("thumb", 100, "jpg", quality=50),
+    ]
+    results = export_all(image, str(tmp_path), "asset", targets)
+    assert [error for _, error in results] == [None, None, None]
+    assert QImage(str(tmp_path / "asset_full.png")).size() == QSize(1000, 600)
+    assert QImage(str(tmp_path / "asset_web.jpg")).size() == QSize(480, 288)
+    thumb = QImage(str(tmp_path / "asset_thumb.jpg"))
+    assert thumb.size() == QSize(100, 60)
+    assert abs(thumb.pixelColor(50, 30).blue() - 200) < 10
+
+    # Размер, кратный половине, берется из цепочки без дополнительного масштабирования
+    chain = downscale_chain(image, [QSize(500, 300), QSize(250, 150)])
+    assert chain[(250, 150)].size() == QSize(250, 150)
+
+def test_export_dialog_skips_duplicate_targets(app):
+    """Две цели с одним файлом результата не попадают в экспорт"""
+    targets = [ExportTarget("web", 1920, "jpg"), ExportTarget("web", 800, "jpg"), ExportTarget("web", 800, "png")]
+    dialog = ExportDialog(targets)
+    result = dialog.get_targets()
+    assert [(target.suffix, target.image_format, target.max_side) for target in result] == \
+        [("web", "jpg", 1920), ("web", "png", 800)]
+
+def test_palette_export(tmp_path):
+    """Рисунок из нескольких цветов переходит в палитру без потерь, сложный - в ближайшие цвета"""
+    image = QImage(640, 480, QImage.Format.Format_RGB32)
+    image.fill(Qt.GlobalColor.white)
+    painter = QPainter(image)
+    for index in range(12):
+        painter.fillRect(index * 40, index * 30, 200, 150, QColor.fromHsv(index * 30, 200, 220))
+    painter.end()
+    indexed = quantize(image, 64)
+    assert indexed.format() == QImage.Format.Format_Indexed8
+    assert indexed.colorCount() == 13
+    assert indexed.convertToFormat(QImage.Format.Format_RGB32) == image
+
+    stops = [(0.0, QColor(0, 0, 0)), (0.5, QColor(255, 0, 0)), (1.0, QColor(0, 255, 255))]
+    gradient = render_gradient(640, 480, (0, 0), (640, 480), stops, "radial")
+    for dither in (False, True):
+        indexed = quantize(gradient, 32, dither=dither)
+        assert indexed.colorCount() <= 32
+        restored = indexed.convertToFormat(QImage.Format.Format_RGB32)
+        error = np.abs(image_view(restored)[..., :3].astype(int) - image_view(gradient)[..., :3]).mean()
+        assert error < 12
+
+    targets = [ExportTarget("full", None, "png"), ExportTarget("indexed", None, "png", colors=256)]
+    export_all(gradient, str(tmp_path), "gradient", targets)
+    assert QImage(str(tmp_path / "gradient_indexed.png")).format() == QImage.Format.Format_Indexed8
+    assert (tmp_path / "gradient_indexed.png").stat().st_size < (tmp_path / "gradient_full.png").stat().st_size
+
+def test_history_shares_unchanged_tiles(canvas):
+    """Сто мелких правок большого холста занимают в истории около одного холста"""
+    canvas.history.max_steps = 120
+    canvas.change_size(2048, 2048)
+    canvas_bytes = canvas.image.sizeInBytes()
+    for step in range(100):
+        x = 20 + (step % 10) * 190
+        y = 20 + (step // 10) * 190
+        canvas.mousePressEvent(create_mouse_event(QPoint(x, y)))
+        canvas.mouseMoveEvent(create_mouse_event(QPoint(x + 10, y + 10), type=QEvent.Type.MouseMove))
+        canvas.mouseReleaseEvent(create_mouse_event(QPoint(x + 10, y + 10), type=QEvent.Type.MouseButtonRelease))
+    # Новые плитки каждого шага - только под штрихом
+    previous, last = canvas.history.undo_stack[-2:]
+    assert sum(a is not b for a, b in zip(previous.tiles, last.tiles)) <= 4
+
+    while canvas.history.compact(time_budget=0.05):
+        pass
+    # Белые плитки исходного холста сводятся к одной общей
+    assert canvas.history.memory_bytes() < canvas_bytes
+
+    canvas.undo()
+    assert canvas.image.pixelColor(1730, 1730).rgb() == QColor(Qt.GlobalColor.white).rgb()
+    assert canvas.image.pixelColor(1545, 1545).rgb() == QColor(Qt.GlobalColor.black).rgb()
+    canvas.redo()
+    assert canvas.image.pixelColor(1735, 1735).rgb() == QColor(Qt.GlobalColor.black).rgb()
+
+def test_documents_suspended_over_budget(window):
+    """Неактивный документ сверх бюджета упаковывается и восстанавливается при активации"""
+    first = window.canvas
+    first.edit_regions([QRect(10, 10, 50, 50)],
+                       lambda painter: painter.fillRect(QRect(10, 10, 50, 50), Qt.GlobalColor.red))
+    window.memory.budget_bytes = first.memory_bytes()
+
+    second = window.new_document()
+    assert window.canvas is second and window.tabs.count() == 2
+    assert window.navigator.canvas is second and window.stats_panel.canvas is second
+    assert first.is_suspended()
+    assert first.memory_bytes() < first.width() * first.height()
+
+    # Вынос на диск, если сжатия не хватает
+    window.memory.budget_bytes = 0
+    window.memory.enforce()
+    assert first.memory_bytes() == 0
+    spill_file = first.suspended.file
+
+    # Временный файл документа удаляется при восстановлении, а не растет от вкладки к вкладке
+    window.tabs.setCurrentIndex(0)
+    assert not first.is_suspended() and second.is_suspended()
+    assert spill_file.closed
+    assert first.image.pixelColor(20, 20).rgb() == QColor(Qt.GlobalColor.red).rgb()
+    first.undo()
+    assert first.image.pixelColor(20, 20).rgb() == QColor(Qt.GlobalColor.white).rgb()
+
+    window.close_document(1)
+    assert window.tabs.count() == 1 and second not in window.memory.documents
+
+def test_loading_document_not_suspended(window, tmp_path):
+    """Документ, который еще загружается, не упаковывается до окончания загрузки"""
+    path = str(tmp_path / "large.png")
+    image = QImage(1500, 1200, QImage.Format.Format_RGB32)
+    image.fill(QColor(Qt.GlobalColor.red))
+    image.save(path)
+    window.memory.budget_bytes = 1
+    window.open_file(path)
+    loading = window.canvas
+    window.new_document()
+    assert not loading.is_suspended()
+
+    loading.load_thread.wait()
+    QApplication.processEvents()
+    assert loading.is_suspended()
+    window.tabs.setCurrentIndex(0)
+    assert loading.image.size() == QSize(1500, 1200)
+    assert loading.image.pixelColor(5, 5).rgb() == QColor(Qt.GlobalColor.red).rgb()
+
+def test_stroke_prediction(canvas):
+    """Предсказание по скорости и ускорению, проверка попаданий и временный кончик штриха"""
+    perf.reset()
+    predictor = MotionPredictor(horizon=0.016)
+    for step in range(4):
+        predictor.add(QPoint(100 + step * 8, 50), step * 0.008)
+    # Равномерное движение 1000 пикс./с: через 16 мс указатель на 16 пикс. дальше
+    assert predictor.predict() == QPoint(140, 50)
+    for step in range(4, 8):
+        predictor.add(QPoint(100 + step * 8, 50), step * 0.008)
+        predictor.predict()
+    assert predictor.checked > 0 and predictor.mean_error < 0.5
+    assert perf.counter("predictor.hidden_latency").average_ms == pytest.approx(16.0)
+    # Ускорение учитывается, долгая пауза отключает предсказание
+    predictor.reset()
+    for step, x in enumerate((0, 10, 30)):
+        predictor.add(QPoint(x, 0), step * 0.01)
+    assert predictor.predict().x() > 30 + 20 * 1.6
+    predictor.add(QPoint(40, 0), 1.0)
+    assert predictor.predict() is None
+
+    canvas.mousePressEvent(create_mouse_event(QPoint(10, 10)))
+    for x in (20, 30, 40):
+        canvas.mouseMoveEvent(create_mouse_event(QPoint(x, 10), type=QEvent.Type.MouseMove))
+    assert canvas.prediction is not None and canvas.prediction[0] == QPoint(40, 10)
+    canvas.grab()
+    canvas.mouseReleaseEvent(create_mouse_event(QPoint(40, 10), type=QEvent.Type.MouseButtonRelease))
+    assert canvas.prediction is None
+
+    canvas.quality.predict_strokes = False
+    canvas.mousePressEvent(create_mouse_event(QPoint(10, 50)))
+    for x in (20, 30, 40):
+        canvas.mouseMoveEvent(create_mouse_event(QPoint(x, 50), type=QEvent.Type.MouseMove))
+    assert canvas.prediction is None
+    canvas.mouseReleaseEvent(create_mouse_event(QPoint(40, 50), type=QEvent.Type.MouseButtonRelease))
+
+def test_idle_scheduler_priorities_and_slicing(app):
+    """Задачи выполняются по приоритету порциями, finish() завершает сразу"""
+    scheduler = IdleScheduler()
+    log = []
+
+    def slow(deadline):
+        log.append("slow")
+        return len(log) < 5
+
+    scheduler.schedule("slow", slow, LOW)
+    scheduler.schedule("quick", lambda deadline: log.append("quick"), HIGH)
+    scheduler.schedule("later", lambda deadline: log.append("later"), HIGH, delay=60)
+    scheduler.run_slice()
+    assert log[0] == "quick" and scheduler.is_pending("slow") and "later" not in log
+    scheduler.finish("slow")
+    assert log.count("slow") == 4 and not scheduler.is_pending("slow")
+    scheduler.finish(priority=HIGH)
+    assert log[-1] == "later" and not scheduler.jobs
+
+def test_deferred_history_and_autosave(canvas, tmp_path):
+    """Снимок штриха копируется в простое, а правка или отмена завершают его сразу"""
+    canvas.autosave_path = str(tmp_path / "autosave.npy")
+    canvas.color = QColor(Qt.GlobalColor.red)
+    for y in (50, 100):
+        canvas.mousePressEvent(create_mouse_event(QPoint(50, y)))
+        canvas.mouseMoveEvent(create_mouse_event(QPoint(150, y), type=QEvent.Type.MouseMove))
+        canvas.mouseReleaseEvent(create_mouse_event(QPoint(150, y), type=QEvent.Type.MouseButtonRelease))
+        state = canvas.history.undo_stack[-1]
+        # Плитки еще не скопированы, но новая правка начинается с их копирования
+        assert state.unfilled and canvas.idle.is_pending("history")
+    assert not canvas.history.undo_stack[-2].unfilled
+
+    canvas.idle.run_slice()
+    assert not state.unfilled and not canvas.history.deferred
+    assert state.pixelColor(100, 100).rgb() == QColor(Qt.GlobalColor.red).rgb()
+    canvas.undo()
+    assert canvas.image.pixelColor(100, 100).rgb() == QColor(Qt.GlobalColor.white).rgb()
+
+    # В простое файл пишется в фоновом потоке
+    canvas.autosave(deadline=time.perf_counter())
+    canvas.autosave_thread.join()
+    assert os.path.exists(canvas.autosave_path)
+    canvas.idle.finish("autosave")
+    assert open_raw(canvas.autosave_path).pixelColor(100, 50).rgb() == QColor(Qt.GlobalColor.red).rgb()
+    canvas.discard_autosave()
+    assert not (tmp_path / "autosave.npy").exists()
+
+def test_recent_files_thumbnail_cache(app, tmp_path, monkeypatch):
+    """Миниатюры строятся один раз, ключ зависит от изменения файла, объем кэша ограничен"""
+    recent = RecentFiles(str(tmp_path / "recent.json"), limit=3)
+    files = []
+    for index in range(4):
+        image = QImage(400 + index * 100, 300, QImage.Format.Format_RGB32)
+        image.fill(QColor(index * 60, 0, 0))
+        files.append(str(tmp_path / f"image{index}.png"))
+        image.save(files[-1])
+        recent.add(files[-1])
+    recent.add(files[1])
+    assert RecentFiles(str(tmp_path / "recent.json")).files == [files[1], files[3], files[2]]
+
+    cache = ThumbnailCache(str(tmp_path / "thumbnails"))
+    assert cache.get(files[1]) is None
+    thread = ThumbnailThread(cache, [files[0]] + recent.existing())
+    ready = []
+    thread.thumbnail_ready.connect(lambda name, thumbnail: ready.append(name))
+    # Любая ошибка декодирования одного файла не прерывает остальные
+    build = recent_files.make_thumbnail
+    monkeypatch.setattr(recent_files, "make_thumbnail",
+                        lambda name: build(name) if name != files[0] else 1 / 0)
+    thread.run()
+    monkeypatch.undo()
+    assert ready == recent.files
+    thumbnail = cache.get(files[3])
+    assert thumbnail.size() == QSize(128, 54) and thumbnail.pixelColor(10, 10).red() == 180
+
+    # Измененный файл получает новый ключ
+    key = cache.key(files[3])
+    os.utime(files[3], ns=(0, 10 ** 9))
+    assert cache.key(files[3]) != key and cache.get(files[3]) is None
+
+    # Вытесняется давно не использованная миниатюра
+    entries = sorted(os.listdir(cache.directory))
+    cache.max_bytes = cache.usage() - 1
+    os.utime(cache.entry_path(cache.key(files[2])), (0, 0))
+    cache.evict()
+    assert cache.get(files[2]) is None and cache.get(files[1]) is not None
+    assert len(os.listdir(cache.directory)) == len(entries) - 1
+
+    # Миниатюра вытеснена фоновым потоком между чтением и отметкой использования
+    def evicted(path, *args, **kwargs):
+        raise FileNotFoundError(path)
+    monkeypatch.setattr(os, "utime", evicted)
+    assert cache.get(files[1]) is None
+
+def test_recent_menu_enabled_after_first_file(window, tmp_path):
+    """Подменю недавних файлов, открытое пустым, включается после открытия файла"""
+    window.recent = RecentFiles(str(tmp_path / "recent.json"))
+    window.thumbnails = ThumbnailCache(str(tmp_path / "thumbnails"))
+    window.refresh_recent()
+    window.rebuild_recent_menu()
+    assert not window.recent_menu.menuAction().isEnabled()
+
+    path = str(tmp_path / "image.png")
+    QImage(20, 20, QImage.Format.Format_RGB32).save(path)
+    window.add_recent(path)
+    assert window.recent_menu.menuAction().isEnabled()
+    window.thumbnail_thread.wait()
+
+def test_transforms_recorded_without_pixels(canvas):
+    """Отражения, повороты и инверсия записываются в историю без пикселей и точно отменяются"""
+    canvas.edit_regions([QRect(10, 20, 30, 40)],
+                        lambda painter: painter.fillRect(QRect(10, 20, 30, 40), Qt.GlobalColor.red))
+    original = canvas.image.copy()
+    history_bytes = canvas.history.memory_bytes()
+
+    canvas.transform("rotate_cw")
+    assert canvas.size() == QSize(600, 800) and canvas.image.size() == QSize(600, 800)
+    assert canvas.image.pixelColor(600 - 1 - 25, 15).rgb() == QColor(Qt.GlobalColor.red).rgb()
+    for name in ("flip_horizontal", "flip_vertical", "rotate_180", "invert", "rotate_ccw"):
+        canvas.transform(name)
+    assert isinstance(canvas.history.undo_stack[-1], ImageOperation)
+    assert not is_snapshot(canvas.history.undo_stack[-1])
+    assert canvas.history.memory_bytes() == history_bytes
+    # Два отражения и поворот на 180 взаимно уничтожаются, остается инверсия
+    assert canvas.image.size() == original.size()
+    assert canvas.image.pixelColor(15, 25).rgb() == QColor(0, 255, 255).rgb()
+
+    for _ in range(6):
+        canvas.undo()
+    assert canvas.image == original and canvas.size() == QSize(800, 600)
+    canvas.redo()
+    assert canvas.image.size() == QSize(600, 800)
+
+    # При вытеснении за лимит нижним элементом становится полный снимок
+    canvas.history.max_steps = 2
+    canvas.transform("invert")
+    assert is_snapshot(canvas.history.undo_stack[0]) and len(canvas.history.undo_stack) == 2
+    assert canvas.history.materialize(1) == canvas.image
+
+@pytest.mark.parametrize("extension", [".ppm", ".pam", ".npy", ".raw"])
+def test_raw_roundtrip_memory_mapped(canvas, tmp_path, extension):
+    """Несжатые форматы сохраняются и открываются отображением файла без декодирования"""
+    canvas.edit_regions([QRect(10, 10, 30, 20)],
+                        lambda painter: painter.fillRect(QRect(10, 10, 30, 20), QColor(250, 120, 10)))
+    path = str(tmp_path / f"image{extension}")
+    canvas.save_image(path)
+
+    geometry = {"width": 800, "height": 600, "raw_format": "rgb32"} if extension == ".raw" else {}
+    canvas.load_image(path, **geometry)
+    image = canvas.image
+    assert image.size() == QSize(800, 600)
+    assert image.pixelColor(20, 20).rgb() == QColor(250, 120, 10).rgb()
+    assert image.pixelColor(5, 5).rgb() == QColor(Qt.GlobalColor.white).rgb()
+    # PPM/PAM хранят R, G, B - они копируются в формат документа
+    assert image.format() == QImage.Format.Format_RGB32
+
+    # Правка не попадает в файл, отмена возвращает исходные пиксели
+    canvas.mousePressEvent(create_mouse_event(QPoint(100, 100)))
+    canvas.mouseMoveEvent(create_mouse_event(QPoint(150, 100), type=QEvent.Type.MouseMove))
+    canvas.mouseReleaseEvent(create_mouse_event(QPoint(150, 100), type=QEvent.Type.MouseButtonRelease))
+    assert canvas.image.pixelColor(125, 100).rgb() == QColor(Qt.GlobalColor.black).rgb()
+    canvas.undo()
+    assert canvas.image.pixelColor(125, 100).rgb() == QColor(Qt.GlobalColor.white).rgb()
+    assert open_raw(path, **geometry).pixelColor(125, 100).rgb() == QColor(Qt.GlobalColor.white).rgb()
+
+@pytest.mark.parametrize("header", [b"P6\n10", b"P5\n# comment", b"P7\nHEIGHT 2\nENDHDR\n"])
+def test_raw_truncated_header(tmp_path, header):
+    """Оборванный или неполный заголовок - ValueError, а не зависание"""
+    path = tmp_path / ("broken.pam" if header.startswith(b"P7") else "broken.ppm")
+    path.write_bytes(header)
+    with pytest.raises(ValueError):
+        open_raw(str(path))
+
+def test_mapped_history_outlives_replaced_image(canvas, tmp_path):
+    """Снимок истории поверх отображенного файла остается действительным после замены изображения"""
+    path = str(tmp_path / "mapped.npy")
+    np.save(path, np.full((300, 400), 0xFFFA780A, np.uint32))
+    canvas.load_image(path)
+    canvas.set_image(canvas.image.scaled(200, 150))
+    gc.collect()
+    canvas.undo()
+    assert canvas.image.size() == QSize(400, 300)
+    assert canvas.image.pixelColor(5, 5).rgb() == QColor(250, 120, 10).rgb()
+
+    # Размер холста пересобирает все снимки истории, включая отображенный
+    canvas.redo()
+    gc.collect()
+    canvas.change_size(250, 200)
+    canvas.undo()
+    assert canvas.image.pixelColor(5, 5).rgb() == QColor(250, 120, 10).rgb()
+
+    # Вытеснение за лимит: нижний снимок без плиток не используется как основа
+    canvas.load_image(path)
+    canvas.history.max_steps = 3
+    for x in range(0, 50, 10):
+        canvas.edit_regions([QRect(x, 0, 5, 5)],
+                            lambda painter, x=x: painter.fillRect(QRect(x, 0, 5, 5), Qt.GlobalColor.black))
+    assert len(canvas.history.undo_stack) == 3 and is_snapshot(canvas.history.undo_stack[0])
+    assert canvas.history.materialize(2) == canvas.image
+
+def test_canvas_numpy_interop(canvas):
+    """Просмотр пикселей без копирования и запись массива одним шагом по измененной области"""
+    view = canvas.pixels()
+    assert view.shape == (600, 800, 4) and not view.flags.writeable
+    bits = canvas.image.constBits()
+    assert view.ctypes.data == int(bits)
+
+    steps = len(canvas.history.undo_stack)
+    array = canvas.pixels(QRect(100, 100, 200, 200)).copy()
+    array[50:60, 20:90] = (0, 0, 255, 255)  # B, G, R, A - красный
+    patch = canvas.commit_array(array, QPoint(100, 100))
+    assert len(canvas.history.undo_stack) == steps + 1
+    assert patch.bounding_rect() == QRect(120, 150, 70, 10)
+    assert canvas.image.pixelColor(150, 155).rgb() == QColor(Qt.GlobalColor.red).rgb()
+    assert canvas.commit_array(array, QPoint(100, 100)) is None
+
+    canvas.undo()
+    assert canvas.image.pixelColor(150, 155).rgb() == QColor(Qt.GlobalColor.white).rgb()
+    with pytest.raises(ValueError):
+        canvas.commit_array(np.zeros((10, 10, 3), np.uint8))
+
+    # Устаревший массив остается действительным после правок и отмены
+    canvas.transform("rotate_cw")
+    canvas.undo()
+    gc.collect()
+    assert view.shape == (600, 800, 4) and view[155, 150, 2] == 255
+
+def test_gradient_tool(canvas):
+    """Градиент: предпросмотр при перетаскивании, один шаг истории, сглаживание без полос"""
+    canvas.current_tool = GradientTool()
+    canvas.color = QColor(Qt.GlobalColor.black)
+    steps = len(canvas.history.undo_stack)
+    canvas.mousePressEvent(create_mouse_event(QPoint(0, 0)))
+    canvas.mouseMoveEvent(create_mouse_event(QPoint(400, 0), type=QEvent.Type.MouseMove))
+    assert canvas.current_tool.preview is not None
+    assert len(canvas.history.undo_stack) == steps
+    canvas.mouseReleaseEvent(create_mouse_event(QPoint(799, 0), type=QEvent.Type.MouseButtonRelease))
+    assert len(canvas.history.undo_stack) == steps + 1
+    assert canvas.current_tool.preview is None
+    assert canvas.image.pixelColor(0, 300).red() <= 1
+    assert canvas.image.pixelColor(799, 300).red() >= 254
+    assert abs(canvas.image.pixelColor(400, 300).red() - 128) <= 2
+
+    # Между двумя соседними уровнями: без сглаживания столбец одного цвета,
+    # со сглаживанием в блоке 4x4 смешаны оба уровня
+    stops = [(0.0, QColor(0, 0, 0)), (1.0, QColor(1, 1, 1))]
+    flat = render_gradient(64, 4, (0, 0), (64, 0), stops, dither=False)
+    dithered = render_gradient(64, 4, (0, 0), (64, 0), stops)
+    assert {flat.pixelColor(32, y).red() for y in range(4)} == {1}
+    assert {dithered.pixelColor(x, y).red() for x in range(30, 34) for y in range(4)} == {0, 1}
+    stops = [(0.0, QColor(0, 0, 0)), (1.0, QColor(255, 255, 255))]
+    radial = render_gradient(64, 64, (32, 32), (64, 32), stops, "radial")
+    assert radial.pixelColor(32, 32).red() < 10 and radial.pixelColor(63, 32).red() > 240
+    # Угол отсчитывается от направления на конечную точку
+    angular = render_gradient(64, 64, (32, 32), (64, 32), stops, "angular")
+    assert angular.pixelColor(60, 32).red() < 10 and angular.pixelColor(60, 31).red() > 240
+
+def test_text_tool_glyph_cache(canvas):
+    """Текст: набор в наложении, растрируется только изменяемое слово, фиксация одним шагом"""
+    tool = TextTool()
+    tool.cache.clear()
+    canvas.current_tool = tool
+    canvas.color = QColor(Qt.GlobalColor.black)
+    steps = len(canvas.history.undo_stack)
+    canvas.mousePressEvent(create_mouse_event(QPoint(50, 50)))
+    canvas.mouseReleaseEvent(create_mouse_event(QPoint(50, 50), type=QEvent.Type.MouseButtonRelease))
+    assert tool.editing
+    for char in "hello world":
+        canvas.keyPressEvent(QKeyEvent(QEvent.Type.KeyPress, Qt.Key.Key_A, Qt.KeyboardModifier.NoModifier, char))
+    assert tool.text == "hello world"
+    assert len(canvas.history.undo_stack) == steps
+    assert canvas.image.pixelColor(tool.block_rect().center()) == QColor(Qt.GlobalColor.white)
+
+    # Перемещение блока не растрирует заново
+    misses = tool.cache.misses
+    rect = tool.block_rect()
+    canvas.mousePressEvent(create_mouse_event(rect.center()))
+    canvas.mouseMoveEvent(create_mouse_event(rect.center() + QPoint(30, 20), type=QEvent.Type.MouseMove))
+    canvas.mouseReleaseEvent(create_mouse_event(rect.center() + QPoint(30, 20), type=QEvent.Type.MouseButtonRelease))
+    assert tool.block_rect() == rect.translated(30, 20)
+    assert tool.cache.misses == misses
+    # Новая буква растрирует одно слово, остальные берутся из кэша
+    tool.insert("s")
+    assert tool.cache.misses == misses + 1
+
+    # Пока идет набор, буквы не уходят в сочетания клавиш окна
+    override = QKeyEvent(QEvent.Type.ShortcutOverride, Qt.Key.Key_B, Qt.KeyboardModifier.NoModifier, "b")
+    assert canvas.is_typing(override)
+    canvas.keyPressEvent(QKeyEvent(QEvent.Type.KeyPress, Qt.Key.Key_Return, Qt.KeyboardModifier.ControlModifier))
+    assert not tool.editing
+    assert len(canvas.history.undo_stack) == steps + 1
+    rect = rect.translated(30, 20)
+    assert isinstance(canvas.history.undo_stack[-1], RegionPatch)
+    dark = [x for x in range(rect.left(), rect.right()) for y in range(rect.top(), rect.bottom())
+            if canvas.image.pixelColor(x, y).red() < 128]
+    assert dark
+    canvas.undo()
+    assert all(canvas.image.pixelColor(x, rect.center().y()).red() == 255 for x in range(rect.left(), rect.right()))
+
+def test_compare_images(canvas):
+    """Сравнение полосами: маска, метрики и рамки измененных областей"""
+    first = QImage(300, 200, QImage.Format.Format_RGB32)
+    first.fill(QColor(10, 20, 30))
+    second = first.copy()
+    painter = QPainter(second)
+    painter.fillRect(QRect(5, 7, 10, 4), QColor(10, 20, 130))
+    painter.fillRect(QRect(250, 190, 3, 3), QColor(12, 20, 30))
+    painter.end()
+
+    result = compare_images(first, second, band_rows=64)
+    assert result.changed == 40 + 9
+    assert result.max_delta == 100
+    assert result.boxes == [QRect(5, 7, 10, 4), QRect(250, 190, 3, 3)]
+    assert result.mask[8, 6] == 100 and result.mask[0, 0] == 0
+    expected_mse = (40 * 100 ** 2 + 9 * 2 ** 2) / (300 * 200 * 3)
+    assert abs(result.mse - expected_mse) < 1e-9
+    assert result.overlay().pixelColor(6, 8).red() == 255
+    assert result.overlay().pixelColor(0, 0).alpha() == 0
+
+    # Порог отсекает слабые отличия; другой формат сравнивается по цвету
+    assert compare_images(first, second, threshold=5).boxes == [QRect(5, 7, 10, 4)]
+    assert compare_images(first, second.convertToFormat(QImage.Format.Format_RGB888)).changed == 49
+    assert compare_images(first, first.copy()).psnr == float("inf")
+    with pytest.raises(ValueError):
+        compare_images(first, first.copy(0, 0, 10, 10))
+
+    # Наложение убирается, когда изображение холста заменяется
+    canvas.show_diff(compare_images(canvas.image, canvas.image.copy()))
+    canvas.transform("rotate_cw")
+    assert canvas.diff is None
+
+def test_stall_watchdog(app, caplog):
+    """Сторож зависаний: стек заблокированного потока интерфейса и длительность"""
+
+    def blocking_operation():
+        time.sleep(0.4)
+
+    watchdog = StallWatchdog(threshold=0.1)
+    watchdog.start()
+    try:
+        deadline = time.monotonic() + 1
+        while watchdog.last_beat is None and time.monotonic() < deadline:
+            app.processEvents()
+        stalls = perf.counter("watchdog.stall").count
+        with caplog.at_level(logging.WARNING, logger="rastro.watchdog"):
+            blocking_operation()
+            deadline = time.monotonic() + 1
+            while perf.counter("watchdog.stall").count == stalls and time.monotonic() < deadline:
+                app.processEvents()
+                time.sleep(0.01)
+    finally:
+        watchdog.stop()
+    assert watchdog.stalls == 1
+    assert "blocking_operation" in watchdog.last_stack
+    assert perf.counter("watchdog.stall").max >= 0.3
+    assert any("blocking_operation" in record.getMessage() for record in caplog.records)
+
+def test_timelapse_from_dirty_regions(canvas, tmp_path):
+    """Таймлапс: первый кадр целиком, дальше только измененные области"""
+    recorder = TimelapseRecorder(canvas, str(tmp_path), interval=60)
+    recorder.start()
+    recorder.capture()  # Изменений нет - кадр не нужен
+    canvas.edit_regions([QRect(10, 10, 20, 20)], lambda painter: painter.fillRect(QRect(10, 10, 20, 20), Qt.GlobalColor.red))
+    canvas.edit_regions([QRect(100, 50, 5, 5)], lambda painter: painter.fillRect(QRect(100, 50, 5, 5), Qt.GlobalColor.blue))
+    recorder.capture()
+    assert recorder.frame_number == 2
+    canvas.edit_regions([QRect(200, 200, 3, 3)], lambda painter: painter.fillRect(QRect(200, 200, 3, 3), Qt.GlobalColor.green))
+    frames = recorder.stop()
+    assert frames == 3
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["frame_00000.png", "frame_00001.png", "frame_00002.png"]
+    first, second, last = (QImage(str(tmp_path / f"frame_{number:05d}.png")) for number in range(3))
+    assert first.pixelColor(15, 15) == QColor(Qt.GlobalColor.white)
+    assert second.pixelColor(15, 15) == QColor(Qt.GlobalColor.red)
+    assert second.pixelColor(101, 51) == QColor(Qt.GlobalColor.blue)
+    assert second.pixelColor(201, 201) == QColor(Qt.GlobalColor.white)
+    assert last.pixelColor(201, 201) == QColor(Qt.GlobalColor.green)
+    assert last.pixelColor(15, 15) == QColor(Qt.GlobalColor.red)
+
+    # Пока очередь писателя полна, области копятся для следующего кадра
+    recorder = TimelapseRecorder(canvas, str(tmp_path), queue_depth=1)
+    recorder.writer.offer(None)
+    recorder.on_region_changed(QRect(0, 0, 4, 4), None)
+    recorder.capture()
+    assert recorder.skipped == 1 and recorder.frame_number == 0
+    assert recorder.pending == [QRect(0, 0, 4, 4)]
+
+def test_document_pixel_formats(canvas, tmp_path):
+    """Документы в оттенках серого и с палитрой рисуются и отменяются без перевода в RGB32"""
+    def patch_bytes():
+        before = canvas.history.memory_bytes()
+        canvas.edit_regions([QRect(10, 10, 100, 100)],
+                            lambda painter: painter.fillRect(QRect(10, 10, 100, 100), Qt.GlobalColor.red))
+        return canvas.history.memory_bytes() - before
+
+    rgb_bytes = patch_bytes()
+
+    # Оттенки серого: кисть и история работают в 8 битах
+    canvas.set_pixel_format("gray8")
+    assert canvas.pixel_format == "gray8" and canvas.pixels().shape == (600, 800)
+    assert patch_bytes() == rgb_bytes // 4
+    canvas.undo()
+    canvas.mousePressEvent(create_mouse_event(QPoint(100, 100)))
+    canvas.mouseMoveEvent(create_mouse_event(QPoint(200, 100), type=QEvent.Type.MouseMove))
+    canvas.mouseReleaseEvent(create_mouse_event(QPoint(200, 100), type=QEvent.Type.MouseButtonRelease))
+    assert canvas.image.format() == QImage.Format.Format_Grayscale8
+    assert canvas.image.pixelColor(150, 100).rgb() == QColor(Qt.GlobalColor.black).rgb()
+    canvas.undo()
+    assert canvas.image.pixelColor(150, 100).rgb() == QColor(Qt.GlobalColor.white).rgb()
+
+    # Палитра: рисунок отображается в ближайшие цвета палитры, инверсия меняет только палитру
+    palette = [QColor(Qt.GlobalColor.white).rgb(), QColor(Qt.GlobalColor.black).rgb(),
+               QColor(Qt.GlobalColor.blue).rgb()]
+    canvas.set_pixel_format("indexed8", palette)
+    assert canvas.pixel_format == "indexed8" and canvas.image.colorTable() == palette
+    canvas.edit_regions([QRect(250, 250, 10, 10)],
+                        lambda painter: painter.fillRect(QRect(250, 250, 10, 10), QColor(10, 20, 230)))
+    assert canvas.image.pixelIndex(255, 255) == 2
+    canvas.transform("invert")
+    assert canvas.image.pixelIndex(255, 255) == 2
+    assert canvas.image.pixelColor(255, 255).rgb() == QColor(Qt.GlobalColor.yellow).rgb()
+    canvas.undo()
+    canvas.undo()
+    assert canvas.image.pixelIndex(255, 255) == 0 and canvas.image.colorTable() == palette
+
+    # Вставка полноцветного изображения приводится к формату документа
+    canvas.set_image(resize_canvas(canvas.image.convertToFormat(QImage.Format.Format_RGB32), 400, 300))
+    assert canvas.pixel_format == "indexed8" and canvas.image.colorTable() == palette
+    # Упакованный документ восстанавливается вместе с палитрой
+    canvas.suspend()
+    canvas.resume()
+    assert canvas.image.colorTable() == palette and canvas.image.pixelIndex(255, 255) == 0
+
+    # Отмена возвращает прежний формат
+    canvas.undo()
+    canvas.undo()
+    assert canvas.pixel_format == "gray8"
+
+    # Серый PNG открывается без расширения до 32 бит
+    path = str(tmp_path / "gray.png")
+    canvas.image.save(path)
+    canvas.load_image(path)
+    assert pixel_format(canvas.image) == "gray8"
+
 if __name__ == '__main__':
-    pytest.main([__file__, '-v'])
\ No newline at end of file
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,180 @@
+import hashlib
+import time
+import weakref
+from PyQt6.QtGui import QImage
+from PyQt6.QtCore import QRect
+from utils.pixel_format import blit
+import logging
+
+logger = logging.getLogger(__name__)
+
+class TilePool:
+    """
+    Пул плиток по содержимому. Одинаковые плитки разных состояний истории
+    заменяются одним общим объектом; плитка живет, пока на нее ссылается
+    хотя бы одно состояние (подсчет ссылок - обычные ссылки Python)
+    """
+    def __init__(self):
+        self.tiles = weakref.WeakValueDictionary()  # хеш содержимого -> плитка
+        # Уже сверенные плитки текущего прохода: одна и та же плитка
+        # может ждать сверки сразу в нескольких состояниях
+        self._seen = {}  # id(плитка) -> (плитка, общая плитка)
+
+    @staticmethod
+    def digest(tile: QImage) -> bytes:
+        bits = tile.constBits()
+        bits.setsize(tile.sizeInBytes())
+        header = f"{tile.width()}x{tile.height()}:{tile.format().value}:".encode()
+        digest = hashlib.blake2b(header, digest_size=16)
+        # Одинаковые номера цветов с разной палитрой - разные плитки
+        digest.update(str(tile.colorTable()).encode())
+        digest.update(bits)
+        return digest.digest()
+
+    def intern(self, tile: QImage) -> QImage:
+        """Вернуть общую плитку с таким же содержимым (или запомнить эту)"""
+        seen = self._seen.get(id(tile))
+        if seen is not None and seen[0] is tile:
+            return seen[1]
+        key = self.digest(tile)
+        shared = self.tiles.get(key)
+        if shared is None:
+            self.tiles[key] = shared = tile
+        self._seen[id(tile)] = (tile, shared)
+        return shared
+
+    def end_pass(self):
+        """Забыть сверенные плитки после прохода по всем состояниям"""
+        self._seen.clear()
+
+class TiledState:
+    """
+    Полный снимок состояния, хранящийся как сетка ссылок на плитки.
+    Плитки, не изменившиеся с предыдущего снимка, берутся из него по ссылке.
+    Новые плитки сначала хранятся как есть, а поиск одинаковых по хешу
+    выполняется позже (intern_pending), вне обработки ввода.
+    С deferred=True даже копирование измененных плиток откладывается до fill():
+    до этого image нельзя менять (обращение к плиткам заполняет их само)
+    """
+    TILE_SIZE = 64
+
+    def __init__(self, image: QImage, base=None, rect: QRect = None, deferred=False):
+        self._size = image.size()
+        self._format = image.format()
+        self._color_table = image.colorTable()
+        size = self.TILE_SIZE
+        self.cols = (image.width() + size - 1) // size
+        self.rows = (image.height() + size - 1) // size
+        self.pending = []  # номера плиток, еще не сверенных с пулом
+        self.unfilled = []  # номера плиток, еще не скопированных из _source
+        self._source = None
+
+        if base is not None and rect is not None and base.compatible(image):
+            self._tiles = list(base.tiles)
+            # Плитки, взятые у снимка до их сверки, тоже нужно будет заменить общими
+            self.pending = list(base.pending)
+            rect = rect.intersected(image.rect())
+            indices = [
+                row * self.cols + col
+                for row in range(rect.top() // size, rect.bottom() // size + 1)
+                for col in range(rect.left() // size, rect.right() // size + 1)
+            ] if not rect.isEmpty() else []
+        else:
+            self._tiles = [None] * (self.cols * self.rows)
+            indices = range(len(self._tiles))
+
+        pending = set(self.pending)
+        for index in indices:
+            if index not in pending:
+                self.pending.append(index)
+        if deferred:
+            self._source = image
+            self.unfilled = list(indices)
+        else:
+            for index in indices:
+                self._tiles[index] = image.copy(self.tile_rect(index))
+
+    @classmethod
+    def from_tiles(cls, size, image_format, tiles):
+        """Собрать снимок из готовых плиток (плитки заново сверяются с пулом)"""
+        state = cls.__new__(cls)
+        state._size = size
+        state._format = image_format
+        state._color_table = tiles[0].colorTable() if tiles else []
+        state.cols = (size.width() + cls.TILE_SIZE - 1) // cls.TILE_SIZE
+        state.rows = (size.height() + cls.TILE_SIZE - 1) // cls.TILE_SIZE
+        state._tiles = list(tiles)
+        state.pending = list(range(len(state._tiles)))
+        state.unfilled = []
+        state._source = None
+        return state
+
+    @property
+    def tiles(self):
+        """Плитки снимка (отложенные копируются при первом обращении)"""
+        self.fill()
+        return self._tiles
+
+    def fill(self, deadline: float = None) -> bool:
+        """
+        Скопировать отложенные плитки из исходного изображения.
+        Возвращает True, если до deadline (time.perf_counter) скопированы все
+        """
+        while self.unfilled:
+            if deadline is not None and time.perf_counter() > deadline:
+                return False
+            index = self.unfilled.pop()
+            self._tiles[index] = self._source.copy(self.tile_rect(index))
+        self._source = None
+        return True
+
+    def compatible(self, image: QImage) -> bool:
+        return (self._size == image.size() and self._format == image.format()
+                and self._color_table == image.colorTable())
+
+    def tile_rect(self, index: int) -> QRect:
+        size = self.TILE_SIZE
+        row, col = divmod(index, self.cols)
+        return QRect(col * size, row * size, size, size).intersected(QRect(0, 0, self.width(), self.height()))
+
+    def intern_pending(self, pool: TilePool, deadline: float = None) -> bool:
+        """
+        Заменить новые плитки общими из пула.
+        Возвращает True, если до deadline (time.perf_counter) обработаны все
+        """
+        if not self.fill(deadline):
+            return False
+        while self.pending:
+            if deadline is not None and time.perf_counter() > deadline:
+                return False
+            index = self.pending.pop()
+            self._tiles[index] = pool.intern(self._tiles[index])
+        return True
+
+    def size(self):
+        return self._size
+
+    def width(self) -> int:
+        return self._size.width()
+
+    def height(self) -> int:
+        return self._size.height()
+
+    def format(self):
+        return self._format
+
+    def pixelColor(self, x, y=None):
+        """Цвет пикселя без сборки полного изображения"""
+        if y is None:
+            x, y = x.x(), x.y()
+        size = self.TILE_SIZE
+        tile = self.tiles[(y // size) * self.cols + x // size]
+        return tile.pixelColor(x % size, y % size)
+
+    def copy(self) -> QImage:
+        """Собрать полное изображение"""
+        image = QImage(self._size, self._format)
+        image.setColorTable(self._color_table)
+        for index, tile in enumerate(self.tiles):
+            blit(image, self.tile_rect(index).topLeft(), tile)
+        return image
@@ -0,0 +1,165 @@
+import os
+import queue
+import threading
+from PyQt6.QtGui import QImage
+from PyQt6.QtCore import QObject, QTimer, QPoint, QRect
+from utils.perf import measure
+from utils.pixel_format import blit
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Больше стольких отдельных областей в кадре - копируется их общий прямоугольник
+MAX_REGIONS = 32
+
+class TimelapseFrame:
+    """
+    Кадр для записи: либо изображение целиком (первый кадр и после замены
+    изображения), либо только области, измененные с прошлого кадра
+    """
+    def __init__(self, number: int, full: QImage = None, patches=()):
+        self.number = number
+        self.full = full
+        self.patches = list(patches)  # (левый верхний угол, содержимое области)
+
+class TimelapseWriter(threading.Thread):
+    """
+    Сборка и запись кадров в фоновом потоке.
+    Писатель держит свою копию кадра и накладывает на нее области,
+    поэтому поток интерфейса копирует только измененные пиксели.
+    Очередь ограничена queue_depth кадрами
+    """
+    def __init__(self, directory: str, queue_depth: int = 4, image_format: str = "png"):
+        super().__init__(name="timelapse-writer", daemon=True)
+        self.directory = directory
+        self.image_format = image_format
+        self.queue = queue.Queue(maxsize=queue_depth)
+        self.frame = None
+        self.written = 0
+        self.error = None
+
+    def offer(self, frame: TimelapseFrame) -> bool:
+        """Поставить кадр в очередь без ожидания. False - очередь заполнена"""
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except queue.Full:
+            return False
+
+    def finish(self):
+        """Дописать очередь и остановить поток"""
+        self.queue.put(None)
+        self.join()
+
+    def run(self):
+        while True:
+            frame = self.queue.get()
+            if frame is None:
+                return
+            if self.error is not None:
+                continue  # После ошибки записи очередь только опустошается
+            try:
+                with measure("timelapse.write"):
+                    self.write(frame)
+            except OSError as e:
+                self.error = str(e)
+                logger.error(f"Запись таймлапса остановлена: {self.error}")
+
+    def write(self, frame: TimelapseFrame):
+        if frame.full is not None:
+            self.frame = frame.full
+        for pos, patch in frame.patches:
+            blit(self.frame, pos, patch)
+        filename = os.path.join(self.directory, f"frame_{frame.number:05d}.{self.image_format}")
+        if not self.frame.save(filename, self.image_format):
+            raise OSError(f"Не удалось записать {filename}")
+        self.written += 1
+
+class TimelapseRecorder(QObject):
+    """
+    Запись таймлапса сеанса рисования последовательностью кадров.
+    Между кадрами накапливаются области из region_changed холста; раз в
+    interval секунд из изображения копируются только они. Если писатель
+    не успевает и очередь заполнена, области переходят в следующий кадр
+    """
+    def __init__(self, canvas, directory: str, interval: float = 1.0, queue_depth: int = 4, parent=None):
+        super().__init__(parent)
+        self.canvas = canvas
+        self.directory = directory
+        self.interval = interval
+        self.writer = TimelapseWriter(directory, queue_depth)
+        self.pending = []          # Измененные области с прошлого кадра
+        self.reset_pending = True  # Следующий кадр - изображение целиком
+        self.frame_number = 0
+        self.skipped = 0           # Срабатываний, отложенных из-за полной очереди
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.capture)
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.writer.start()
+        self.canvas.region_changed.connect(self.on_region_changed)
+        self.canvas.image_reset.connect(self.on_image_reset)
+        self.capture()
+        self.timer.start(max(1, int(self.interval * 1000)))
+        logger.info(f"Запись таймлапса в {self.directory}, кадр раз в {self.interval} с")
+
+    def stop(self) -> int:
+        """Записать последний кадр и дождаться писателя. Возвращает число кадров"""
+        self.timer.stop()
+        self.canvas.region_changed.disconnect(self.on_region_changed)
+        self.canvas.image_reset.disconnect(self.on_image_reset)
+        self.capture(wait=True)
+        self.writer.finish()
+        logger.info(f"Таймлапс записан: {self.writer.written} кадров, отложено {self.skipped}")
+        return self.writer.written
+
+    @property
+    def error(self):
+        return self.writer.error
+
+    def on_region_changed(self, rect, before):
+        # Пересекающиеся области объединяются, чтобы пиксели не копировались дважды
+        rect = QRect(rect)
+        overlapping = [other for other in self.pending if other.intersects(rect)]
+        while overlapping:
+            for other in overlapping:
+                rect = rect.united(other)
+                self.pending.remove(other)
+            overlapping = [other for other in self.pending if other.intersects(rect)]
+        self.pending.append(rect)
+        if len(self.pending) > MAX_REGIONS:
+            bounds = QRect()
+            for other in self.pending:
+                bounds = bounds.united(other)
+            self.pending = [bounds]
+
+    def on_image_reset(self):
+        self.reset_pending = True
+        self.pending = []
+
+    def capture(self, wait: bool = False):
+        """Отправить писателю изменения с прошлого кадра (если они есть)"""
+        if self.canvas.is_suspended() or (not self.reset_pending and not self.pending):
+            return
+        if not wait and self.writer.queue.full():
+            # Писатель не успевает: области остаются в следующем кадре
+            self.skipped += 1
+            return
+        image = self.canvas.image
+        if self.reset_pending:
+            frame = TimelapseFrame(self.frame_number, full=image.copy())
+        else:
+            bounds = image.rect()
+            rects = [rect.intersected(bounds) for rect in self.pending]
+            frame = TimelapseFrame(self.frame_number, patches=[
+                (QPoint(rect.topLeft()), image.copy(rect)) for rect in rects if not rect.isEmpty()
+            ])
+        if wait:
+            self.writer.queue.put(frame)
+        elif not self.writer.offer(frame):
+            self.skipped += 1
+            return
+        self.frame_number += 1
+        self.reset_pending = False
+        self.pending = []
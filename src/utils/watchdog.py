@@ -0,0 +1,81 @@
+import sys
+import threading
+import time
+import traceback
+from PyQt6.QtCore import QObject, QTimer
+from utils.perf import counter
+import logging
+
+# Отчеты о зависаниях идут в журнал приложения (файл и консоль)
+logger = logging.getLogger("rastro.watchdog")
+
+class StallWatchdog(QObject):
+    """
+    Сторож зависаний интерфейса.
+    Таймер в потоке интерфейса отмечает каждый оборот цикла событий;
+    отдельный поток проверяет отметки и, если их нет дольше threshold секунд,
+    записывает в журнал стек потока интерфейса (sys._current_frames) - то место,
+    где он заблокирован. По окончании зависания записывается его длительность
+    (счетчик "watchdog.stall")
+    """
+    def __init__(self, parent=None, threshold: float = 0.5):
+        super().__init__(parent)
+        self.threshold = threshold
+        self.stalls = 0           # Число зависаний с запуска
+        self.last_stack = ""      # Стек последнего зависания
+        self.gui_thread = threading.get_ident()
+        self.last_beat = None     # Время последней отметки; None - цикл событий еще не запущен
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.beat)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def beat(self):
+        self.last_beat = time.monotonic()
+
+    def start(self):
+        """Запустить сторож. Проверка начинается с первой отметки цикла событий"""
+        if self._thread is not None:
+            return
+        interval = max(0.01, self.threshold / 4)
+        self.timer.start(int(interval * 1000))
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, args=(interval,), name="stall-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.timer.stop()
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.last_beat = None
+
+    def _watch(self, interval: float):
+        stalled_since = None  # Отметка, после которой начался текущий простой
+        while not self._stop.wait(interval):
+            beat = self.last_beat
+            if beat is None:
+                continue
+            if stalled_since is not None:
+                if beat != stalled_since:
+                    # Цикл событий ожил: длительность - до первой новой отметки
+                    duration = beat - stalled_since
+                    counter("watchdog.stall").add(duration)
+                    logger.warning(f"Интерфейс не отвечал {duration:.2f} с")
+                    stalled_since = None
+                continue
+            waited = time.monotonic() - beat
+            if waited >= self.threshold:
+                stalled_since = beat
+                self.stalls += 1
+                self.last_stack = self.capture_stack()
+                logger.warning(f"Интерфейс не отвечает {waited:.2f} с (зависание №{self.stalls}), "
+                               f"стек потока интерфейса:\n{self.last_stack}")
+
+    def capture_stack(self) -> str:
+        """Стек потока интерфейса в момент вызова (из другого потока)"""
+        frame = sys._current_frames().get(self.gui_thread)
+        if frame is None:
+            return "(поток интерфейса не найден)"
+        return "".join(traceback.format_stack(frame))